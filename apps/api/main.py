@@ -4,10 +4,11 @@ from pydantic import BaseModel
 import uuid
 import os
 from dotenv import load_dotenv
+from shared.serialization import response_class
 
 load_dotenv()
 
-app = FastAPI(title="Multimodal Fusion API", version="0.1.0")
+app = FastAPI(title="Multimodal Fusion API", version="0.1.0", default_response_class=response_class())
 
 # Lazy import routes to avoid startup issues
 try:
@@ -24,6 +25,20 @@ try:
 except Exception as e:
     print(f"❌ Failed to load envgen router: {e}")
 
+try:
+    from apps.api.routes.metrics import router as metrics_router
+    app.include_router(metrics_router)
+    print("✅ Metrics router loaded successfully")
+except Exception as e:
+    print(f"❌ Failed to load metrics router: {e}")
+
+try:
+    from apps.api.routes.artifacts import router as artifacts_router
+    app.include_router(artifacts_router)
+    print("✅ Artifacts router loaded successfully")
+except Exception as e:
+    print(f"❌ Failed to load artifacts router: {e}")
+
 # Enable CORS for local dev and viewer (adjust origins as needed)
 ALLOWED_ORIGINS = os.getenv("CORS_ALLOW_ORIGINS", "*")
 allow_origins = [o.strip() for o in ALLOWED_ORIGINS.split(",") if o.strip()]
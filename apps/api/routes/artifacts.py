@@ -0,0 +1,182 @@
+"""Serve locally produced artifacts (Celery path) without S3.
+
+Files are looked up through the job's Redis status written by ``run_env`` and
+must live under ``JOB_TMP_DIR``. Supports single-range requests, ETags and
+conditional GETs; full-file responses go through ``FileResponse`` so servers
+with the pathsend/zero-copy extension hand the file to ``sendfile``.
+
+The ETag is the file's SHA-256. A request pinned to it with ``?v=<sha256>``
+names fixed content, so it is cached as immutable; unpinned URLs revalidate
+after ``ARTIFACT_MAX_AGE``.
+"""
+import hashlib
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+from shared import workspace
+from shared.serialization import loads
+
+router = APIRouter(prefix="/v1/artifacts", tags=["artifacts"])
+
+JOB_TMP_DIR = os.getenv("JOB_TMP_DIR", "/app/tmp")
+# Unpinned URLs can be rewritten by a rerun of the job, so revalidate after this
+ARTIFACT_MAX_AGE = int(os.getenv("ARTIFACT_MAX_AGE", "3600"))
+CHUNK = 256 * 1024
+
+_RANGE = re.compile(r"^bytes=\s*(\d*)-(\d*)\s*$")
+_MEDIA_TYPES = {".glb": "model/gltf-binary", ".png": "image/png", ".json": "application/json", ".obj": "text/plain"}
+
+
+@lru_cache(maxsize=None)
+def _status_client():
+    import redis
+    return redis.Redis(
+        host=os.getenv("REDIS_HOST", "127.0.0.1"),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        db=int(os.getenv("REDIS_STATUS_DB", "0")),
+        decode_responses=True,
+    )
+
+
+def _resolve(job_id: str, name: str) -> Path:
+    raw = _status_client().get(job_id)
+    state = loads(raw) if raw else None
+    detail = (state.get("detail") or {}) if isinstance(state, dict) else {}
+    if not isinstance(detail, dict):
+        detail = {}
+    path = None
+    if name in ("scene_glb", "scene.glb"):
+        path = detail.get("scene_glb")
+    else:
+        for entry in detail.get("lods") or []:
+            if name in (entry.get("name"), entry.get("file")):
+                path = entry.get("path")
+                break
+    if not path:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    root = Path(JOB_TMP_DIR).resolve()
+    resolved = Path(path).resolve()
+    # Status payloads are trusted less than the filesystem: never serve outside the job root
+    if (root != resolved and root not in resolved.parents) or not resolved.is_file():
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    workspace.touch(resolved, JOB_TMP_DIR)  # served artifacts are evicted last
+    return resolved
+
+
+@lru_cache(maxsize=1024)
+def _sha256(path: Path, size: int, mtime_ns: int) -> str:
+    # Keyed on size and mtime so a rewritten file is hashed again
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _etag(path: Path, st: os.stat_result) -> str:
+    return f'"{_sha256(path, st.st_size, st.st_mtime_ns)}"'
+
+
+def _cache_control(request: Request, etag: str) -> str:
+    if request.query_params.get("v") == etag.strip('"'):
+        return "public, max-age=31536000, immutable"
+    return f"public, max-age={ARTIFACT_MAX_AGE}"
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # Weak comparison, as If-None-Match requires
+    if header.strip() == "*":
+        return True
+    return any(t.strip().removeprefix("W/") == etag for t in header.split(","))
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        return _etag_matches(inm, etag)
+    ims = request.headers.get("if-modified-since")
+    if ims:
+        try:
+            return int(mtime) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) for a single ``bytes=`` range. None means serve the
+    whole file (absent, malformed or multi-range); ValueError means 416.
+    """
+    m = _RANGE.match(header or "")
+    if not m or not (m.group(1) or m.group(2)):
+        return None
+    if not m.group(1):
+        suffix = int(m.group(2))
+        if suffix == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - suffix), size - 1
+    start = int(m.group(1))
+    end = int(m.group(2)) if m.group(2) else size - 1
+    if m.group(2) and end < start:
+        return None
+    if start >= size:
+        raise ValueError("range starts past end of file")
+    return start, min(end, size - 1)
+
+
+def _read_range(path: Path, start: int, end: int):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        pos = start
+        while pos <= end:
+            data = os.pread(fd, min(CHUNK, end - pos + 1), pos)
+            if not data:
+                break
+            pos += len(data)
+            yield data
+    finally:
+        os.close(fd)
+
+
+@router.api_route("/{job_id}/{name:path}", methods=["GET", "HEAD"])
+def get_artifact(job_id: str, name: str, request: Request):
+    path = _resolve(job_id, name)
+    st = path.stat()
+    etag = _etag(path, st)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Cache-Control": _cache_control(request, etag),
+        "Accept-Ranges": "bytes",
+    }
+    if _not_modified(request, etag, st.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    media_type = _MEDIA_TYPES.get(path.suffix, "application/octet-stream")
+    range_header = request.headers.get("range", "")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() != etag:
+        range_header = ""  # representation changed: send it whole
+    try:
+        span = parse_range(range_header, st.st_size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{st.st_size}"})
+
+    if span is None:
+        if request.method == "HEAD":
+            return Response(headers={**headers, "Content-Length": str(st.st_size)}, media_type=media_type)
+        return FileResponse(path, media_type=media_type, headers=headers, stat_result=st)
+
+    start, end = span
+    headers.update({"Content-Range": f"bytes {start}-{end}/{st.st_size}", "Content-Length": str(end - start + 1)})
+    if request.method == "HEAD":
+        return Response(status_code=206, headers=headers, media_type=media_type)
+    return StreamingResponse(_read_range(path, start, end), status_code=206, headers=headers, media_type=media_type)
@@ -1,24 +1,142 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
 import os
+import time
 import uuid
-import json
-import boto3
+from functools import lru_cache
+from typing import Any, Dict, Optional
+from shared import cancellation, runtime_model, singleflight
+from shared.messaging import put_plan_s3
+from shared.serialization import dumps, loads
 
 
 router = APIRouter(prefix="/v1/generations", tags=["envgen"])
 
 S3_BUCKET = os.getenv("S3_BUCKET", "s3://multimodal-fusion-models-sanyuktatuti").replace("s3://", "").split("/", 1)[0]
+# "sagemaker" submits processing jobs directly; "celery" queues run_pipeline on the local workers
+ENVGEN_BACKEND = os.getenv("ENVGEN_BACKEND", "sagemaker")
+LANES = ("interactive", "batch")
+
+
+@lru_cache(maxsize=None)
+def _client(service: str):
+    # boto3 is heavy to import and clients are costly to build; do both once, on first use
+    import boto3
+    return boto3.client(service, region_name=os.getenv("AWS_REGION", "us-east-1"))
+
+
+@lru_cache(maxsize=None)
+def _status_client():
+    import redis
+    return redis.Redis(
+        host=os.getenv("REDIS_HOST", "127.0.0.1"),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        db=int(os.getenv("REDIS_STATUS_DB", "0")),
+        decode_responses=True,
+    )
+
+
+@lru_cache(maxsize=None)
+def _celery():
+    # The API does not run Celery apps; a bare client on the same broker can send tasks and control messages
+    from celery import Celery
+    from shared.messaging import celery_conf
+    host, port = os.getenv("REDIS_HOST", "127.0.0.1"), os.getenv("REDIS_PORT", "6379")
+    app = Celery(broker=f"redis://{host}:{port}/{os.getenv('REDIS_BROKER_DB', '0')}")
+    app.conf.update(**celery_conf())
+    return app
+
+
+def _sagemaker_state(job_id: str):
+    try:
+        return _client("sagemaker").describe_processing_job(ProcessingJobName=job_id)["ProcessingJobStatus"]
+    except Exception:
+        return None
+
+
+def _join_flight(plan: Dict[str, Any], job_id: str):
+    # Deduplication is an optimisation: without Redis every submission runs
+    try:
+        r, key = _status_client(), singleflight.plan_key(plan, "envgen")
+        leader = singleflight.join(r, key, job_id)
+        state = _sagemaker_state(leader) if leader is not None else None
+        if state in ("Failed", "Stopped"):
+            # Nobody polled the dead leader's status, so its flight never settled: do it now and lead
+            singleflight.settle(r, leader, ok=False)
+            leader = singleflight.join(r, key, job_id)
+        elif state == "Completed":
+            singleflight.settle(r, leader, ok=True)  # still attach, but start the short done TTL
+        return leader
+    except Exception as e:
+        print(f"single-flight unavailable ({e}), submitting without dedup")
+        return None
+
+
+def _target(job_id: str) -> str:
+    """The job doing the work for ``job_id``: its flight's leader when it attached to one."""
+    try:
+        return singleflight.leader_of(_status_client(), job_id) or job_id
+    except Exception as e:
+        print(f"single-flight unavailable ({e}), resolving {job_id} as itself")
+        return job_id
+
+
+def _settle_flight(job_id: str, ok: bool) -> None:
+    try:
+        singleflight.settle(_status_client(), job_id, ok)
+    except Exception as e:
+        print(f"single-flight settle failed for {job_id}: {e}")
 
 
 class GenReq(BaseModel):
     prompt: str
+    # "batch" jobs queue behind interactive ones and yield to them (Celery backend only)
+    lane: str = "interactive"
+    # A plan from /v1/plan (possibly edited); planned from the prompt when omitted (SageMaker backend)
+    scene_plan: Optional[Dict[str, Any]] = None
+
+
+def _plan(req: GenReq) -> Dict[str, Any]:
+    from shared.schemas.scene_plan import ScenePlan
+    from .planning import _naive_plan_from_prompt
+    return ScenePlan(**(req.scene_plan or _naive_plan_from_prompt(req.prompt))).dict()
+
+
+def _submit_celery(req: GenReq, job_id: str):
+    # run_pipeline deduplicates by plan and fans results out itself
+    r = _status_client()
+    r.set(job_id, dumps({"status": "queued", "detail": {"lane": req.lane}}))
+    _celery().send_task(
+        "workers.orchestrator.tasks.run_pipeline", args=(job_id, req.prompt), kwargs={"lane": req.lane},
+        queue="orchestrator",
+    )
+    return {"task_id": job_id, "job_id": job_id, "status": "queued", "lane": req.lane}
 
 
 @router.post("")
 def submit(req: GenReq):
+    from fastapi import HTTPException
+    if req.lane not in LANES:
+        raise HTTPException(status_code=422, detail=f"lane must be one of {', '.join(LANES)}")
     job_id = f"envgen-{uuid.uuid4().hex[:8]}"
-    
+    if ENVGEN_BACKEND == "celery":
+        try:
+            return _submit_celery(req, job_id)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to queue job: {str(e)}")
+    if req.lane != "interactive":
+        raise HTTPException(status_code=400, detail="The batch lane needs ENVGEN_BACKEND=celery")
+    try:
+        # Planned here, not in the container, so the job can be sized from its plan
+        plan = _plan(req)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Invalid scene plan: {e}")
+    leader = _join_flight(plan, job_id)
+    if leader is not None:
+        # Same plan already in flight: attach to that job instead of launching another. The
+        # submission keeps its own id so status, artifacts and cancellation stay per-client.
+        return {"task_id": job_id, "job_id": job_id, "status": "attached", "attached_to": leader}
+
     # Direct SageMaker submission (cloud deployment)
     try:
         # Normalize out_bucket to the bucket root 
@@ -28,81 +146,187 @@ def submit(req: GenReq):
             bucket_name = bucket_part.split("/", 1)[0]
             out_bucket = f"s3://{bucket_name}"
         
-        payload = {"prompt": req.prompt, "out_bucket": out_bucket, "job_id": job_id}
-        
-        sm = boto3.client("sagemaker", region_name=os.getenv("AWS_REGION", "us-east-1"))
+        resources = runtime_model.for_submission(plan, runtime_model.SM_ENV_CFG)
+        bucket, _, root = out_bucket.replace("s3://", "", 1).partition("/")
+        plan_key = put_plan_s3(_client("s3"), bucket, job_id, plan, root)
+        payload = {
+            "prompt": req.prompt, "out_bucket": out_bucket, "job_id": job_id, "submitted_at": time.time(),
+            "instance_type": resources["instance_type"], "plan_key": plan_key,
+            "env_cfg": runtime_model.SM_ENV_CFG, "features": resources["features"],
+        }
+
+        sm = _client("sagemaker")
         sm.create_processing_job(
             ProcessingJobName=job_id,
             RoleArn=os.getenv("SAGEMAKER_ROLE_ARN"),
             AppSpecification={"ImageUri": os.getenv("ECR_IMAGE_URI")},
             Environment={
-                "PROMPT_JSON": json.dumps(payload),
+                "PROMPT_JSON": dumps(payload),
                 "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", ""),
             },
             ProcessingResources={
                 "ClusterConfig": {
                     "InstanceCount": 1,
-                    "InstanceType": os.getenv("SM_INSTANCE_TYPE", "ml.m5.xlarge"),
+                    "InstanceType": resources["instance_type"],
                     "VolumeSizeInGB": int(os.getenv("SM_VOL_GB", "50")),
                 }
             },
-            StoppingCondition={"MaxRuntimeInSeconds": int(os.getenv("SM_MAX_SEC", "1800"))},
+            StoppingCondition={"MaxRuntimeInSeconds": resources["max_runtime_s"]},
         )
-        return {"task_id": job_id, "job_id": job_id, "status": "submitted"}
+        return {"task_id": job_id, "job_id": job_id, "status": "submitted", "resources": resources}
     except Exception as e:
-        from fastapi import HTTPException
+        _settle_flight(job_id, ok=False)
         raise HTTPException(status_code=500, detail=f"Failed to submit job: {str(e)}")
 
 
+_CELERY_STATES = {"env_done": "SUCCESS", "error": "FAILURE", "cancelled": "REVOKED"}
+
+
 @router.get("/{task_id}/status")
 def status(task_id: str):
+    if ENVGEN_BACKEND == "celery":
+        raw = _status_client().get(task_id)
+        if not raw:
+            return {"state": "UNKNOWN", "job_id": task_id, "error": "no such job"}
+        state = loads(raw)
+        stage = state.get("status")
+        return {
+            "state": _CELERY_STATES.get(stage, "PENDING"),
+            "job_id": task_id,
+            "status": stage,
+            "detail": state.get("detail"),
+        }
     # Cloud deployment: check SageMaker job status directly
     try:
-        sm = boto3.client("sagemaker", region_name=os.getenv("AWS_REGION", "us-east-1"))
-        response = sm.describe_processing_job(ProcessingJobName=task_id)
+        if cancellation.requested(_status_client(), task_id):
+            # This submission was cancelled; the job may still run for others attached to it
+            return {"state": "REVOKED", "job_id": task_id, "status": "cancelled"}
+    except Exception as e:
+        print(f"cancellation flags unavailable ({e})")
+    target = _target(task_id)
+    try:
+        sm = _client("sagemaker")
+        response = sm.describe_processing_job(ProcessingJobName=target)
         status = response["ProcessingJobStatus"]
+        if status in ("Completed", "Failed", "Stopped"):
+            _settle_flight(target, ok=status == "Completed")
         return {
             "state": "SUCCESS" if status == "Completed" else "PENDING" if status == "InProgress" else "FAILURE",
             "job_id": task_id,
-            "sagemaker_status": status
+            "sagemaker_status": status,
+            **({"attached_to": target} if target != task_id else {}),
         }
     except Exception as e:
         return {"state": "UNKNOWN", "job_id": task_id, "error": str(e)}
 
 
+def _revoke(task_ids, terminate: bool) -> None:
+    _celery().control.revoke(list(task_ids), terminate=terminate, signal="SIGTERM")
+
+
+@router.delete("/{job_id}")
+def cancel(job_id: str, force: bool = False):
+    """
+    Cancel a generation. Submissions attached to a shared job only detach
+    until the last one leaves; then the SageMaker job is stopped, or the
+    Celery task is revoked and its worker stops at the next checkpoint
+    (``force`` terminates the task's worker process instead).
+    """
+    from fastapi import HTTPException
+    try:
+        r = _status_client()
+        if ENVGEN_BACKEND != "celery" and cancellation.requested(r, job_id):
+            raise HTTPException(status_code=409, detail="Job already cancelled")
+        leader, remaining = singleflight.detach(r, job_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"single-flight unavailable ({e}), cancelling {job_id} directly")
+        r, leader, remaining = None, None, 0
+    sagemaker = ENVGEN_BACKEND != "celery"
+    if leader is not None and leader != job_id and r is not None and not sagemaker:
+        r.set(job_id, dumps({"status": "cancelled", "detail": {"attached_to": leader}}))
+    if remaining > 0:
+        if sagemaker and r is not None:
+            # SageMaker jobs have no Redis status: flag the submission so its status reads cancelled
+            cancellation.request(r, job_id)
+        return {"job_id": job_id, "status": "detached", "attached": remaining}
+
+    target = leader or job_id
+    if not sagemaker:
+        # Celery path: the job's status lives in Redis
+        raw = r.get(target) if r is not None else None
+        if not raw:
+            raise HTTPException(status_code=404, detail="No such job")
+        state = loads(raw)
+        if state.get("status") in ("env_done", "error", "cancelled"):
+            raise HTTPException(status_code=409, detail=f"Job already {state['status']}")
+        cancellation.request(r, target)
+        detail = state.get("detail") or {}
+        if detail.get("task_id"):
+            try:
+                _revoke([detail["task_id"]], terminate=force)
+            except Exception as e:
+                print(f"revoke failed for {target}: {e}")
+        # A revoked task never runs, so record the outcome here; a running one confirms it
+        r.set(target, dumps({"status": "cancelled", "detail": {"stage": state.get("status")}}))
+        _settle_flight(target, ok=False)
+        return {"job_id": job_id, "status": "cancelling", "target": target}
+    try:
+        _client("sagemaker").stop_processing_job(ProcessingJobName=target)
+    except Exception as e:
+        raise HTTPException(status_code=409, detail=f"Failed to stop job: {str(e)}")
+    if r is not None:
+        cancellation.request(r, job_id)
+    _settle_flight(target, ok=False)
+    return {"job_id": job_id, "status": "stopping", "target": target}
+
+
 @router.get("/{job_id}/presigned")
 def presign(job_id: str):
-    import boto3
-    s3 = boto3.client("s3", region_name=os.getenv("AWS_REGION", "us-east-1"))
+    s3 = _client("s3")
+    # Attached submissions read the artifacts of the job that produced them
+    job_id = _target(job_id)
     # Try multiple possible S3 key patterns
     patterns = [
         f"jobs/{job_id}/",  # Standard path
         f"jobs/jobs/{job_id}/",  # Double jobs prefix
         f"{job_id}/",  # Direct job_id path (current)
     ]
-    
-    key_m = key_g = None
+
+    found = None
     for pattern in patterns:
+        key_m = f"{pattern}manifest.json"
         try:
-            test_m = f"{pattern}manifest.json"
-            test_g = f"{pattern}scene.glb"
-            s3.head_object(Bucket=S3_BUCKET, Key=test_m)
-            s3.head_object(Bucket=S3_BUCKET, Key=test_g)
-            key_m, key_g = test_m, test_g
-            break
+            manifest = loads(s3.get_object(Bucket=S3_BUCKET, Key=key_m)["Body"].read())
         except Exception:
             continue
-    
-    if not key_m:
+        blobs = manifest.get("blobs") or {}
+        # Content-addressed jobs: file -> blobs/<sha256>; legacy jobs keep files next to the manifest
+        keys = {f: b["key"] for f, b in blobs.items()}
+        if "scene.glb" not in keys:
+            try:
+                s3.head_object(Bucket=S3_BUCKET, Key=f"{pattern}scene.glb")
+            except Exception:
+                continue
+        found = (key_m, pattern, keys, manifest)
+        break
+
+    if not found:
         from fastapi import HTTPException
         raise HTTPException(status_code=404, detail="Artifacts not found for job_id")
+    key_m, pattern, keys, manifest = found
+
+    def url(file):
+        key = keys.get(file, f"{pattern}{file}")
+        return s3.generate_presigned_url("get_object", Params={"Bucket": S3_BUCKET, "Key": key}, ExpiresIn=3600)
+
+    lods = sorted(manifest.get("lods") or [], key=lambda e: e.get("lod", 0))
     return {
         "manifest_url": s3.generate_presigned_url(
             "get_object", Params={"Bucket": S3_BUCKET, "Key": key_m}, ExpiresIn=3600
         ),
-        "scene_url": s3.generate_presigned_url(
-            "get_object", Params={"Bucket": S3_BUCKET, "Key": key_g}, ExpiresIn=3600
-        ),
+        "scene_url": url("scene.glb"),
+        # Coarse -> full; empty for jobs written before LODs existed
+        "lods": [{**e, "url": url(e["file"])} for e in lods],
     }
-
-
@@ -0,0 +1,56 @@
+import os
+import time
+from functools import lru_cache
+
+from fastapi import APIRouter, Response
+
+from shared import saturation, telemetry
+
+router = APIRouter(tags=["metrics"])
+
+# Each snapshot scans Redis (and may call SageMaker); scrapers and autoscalers share one
+SATURATION_CACHE_SEC = float(os.getenv("SATURATION_CACHE_SEC", "5"))
+SM_INFLIGHT_METRICS = os.getenv("SM_INFLIGHT_METRICS", "1" if os.getenv("ECR_IMAGE_URI") else "0") == "1"
+
+_cached = {"at": None, "snap": None}
+
+
+@lru_cache(maxsize=None)
+def _redis(db: int):
+    import redis
+    return redis.Redis(host=os.getenv("REDIS_HOST", "127.0.0.1"), port=int(os.getenv("REDIS_PORT", "6379")), db=db)
+
+
+@lru_cache(maxsize=None)
+def _sagemaker():
+    import boto3
+    return boto3.client("sagemaker", region_name=os.getenv("AWS_REGION", "us-east-1"))
+
+
+def _snapshot():
+    now = time.monotonic()
+    if _cached["at"] is None or now - _cached["at"] >= SATURATION_CACHE_SEC:
+        snap = saturation.snapshot(
+            _redis(int(os.getenv("REDIS_BROKER_DB", "0"))),
+            _redis(int(os.getenv("REDIS_STATUS_DB", "0"))),
+            sm=_sagemaker() if SM_INFLIGHT_METRICS else None,
+        )
+        _cached.update(at=now, snap=snap)
+    return _cached["snap"]
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = telemetry.metrics_payload()
+    try:
+        body += saturation.exposition(_snapshot()).encode("utf-8")
+    except Exception as e:
+        # Redis or AWS unreachable: still serve the process metrics
+        print(f"saturation metrics unavailable: {e}")
+    return Response(content=body, media_type=content_type)
+
+
+@router.get("/metrics/saturation")
+def saturation_snapshot():
+    """Queue depth, worker utilization and drain-time estimates for autoscalers."""
+    return _snapshot()
@@ -1,7 +1,6 @@
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import json
 # Planner service not implemented yet - using fallback
 PlannerOrchestrator = None
 PlannerProviderError = Exception
@@ -38,4 +37,5 @@ async def create_plan(req: PlanRequest):
     # Fallback to naive planner for now
     from shared.schemas.scene_plan import ScenePlan
     plan = ScenePlan(**_naive_plan_from_prompt(req.prompt))
-    return {"scene_plan": json.loads(plan.json())}
+    # plan.dict() is already JSON-safe; the response class serializes it once
+    return {"scene_plan": plan.dict()}
@@ -1,6 +1,6 @@
 export default async function handler(req, res) {
   try {
-    const { job_id } = req.query;
+    const { job_id, lod } = req.query;
     if (!job_id) return res.status(400).json({ error: "job_id is required" });
     const apiBase = process.env.API_BASE || "http://localhost:8000";
     const r = await fetch(`${apiBase}/v1/generations/${job_id}/presigned`);
@@ -9,7 +9,12 @@ export default async function handler(req, res) {
       return res.status(r.status).send(text);
     }
     const data = await r.json();
-    const sceneUrl = data.scene_url;
+    // lod=coarse serves the smallest LOD when the job has one; anything else the full scene
+    const coarse = lod === "coarse" && Array.isArray(data.lods) && data.lods.length ? data.lods[0] : null;
+    if (lod === "coarse" && (!coarse || coarse.name === "scene_glb")) {
+      return res.status(404).json({ error: "no coarse LOD" });
+    }
+    const sceneUrl = coarse ? coarse.url : data.scene_url;
     if (!sceneUrl) return res.status(404).json({ error: "scene_url missing" });
     const proxied = await fetch(sceneUrl);
     if (!proxied.ok) {
@@ -18,6 +23,7 @@ export default async function handler(req, res) {
     }
     res.setHeader("Content-Type", proxied.headers.get("content-type") || "model/gltf-binary");
     res.setHeader("Cache-Control", "no-store");
+    res.setHeader("X-Scene-Lod", coarse ? String(coarse.lod) : "full");
     const buf = Buffer.from(await proxied.arrayBuffer());
     return res.status(200).send(buf);
   } catch (e) {
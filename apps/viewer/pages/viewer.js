@@ -12,11 +12,21 @@ export default function Viewer() {
     setJobId(id);
     // Use local proxy endpoints to avoid S3 CORS
     const ts = Date.now();
-    fetch(`/api/scene?job_id=${id}&t=${ts}`)
-      .then(async (r) => {
+    // Coarse proxy first for a fast first frame, then swap in the full scene
+    let full = false;
+    const load = (lod) =>
+      fetch(`/api/scene?job_id=${id}&t=${ts}${lod ? `&lod=${lod}` : ""}`).then(async (r) => {
         if (!r.ok) throw new Error("scene fetch failed");
-        const blob = await r.blob();
-        const url = URL.createObjectURL(blob);
+        return URL.createObjectURL(await r.blob());
+      });
+    load("coarse")
+      .then((url) => {
+        if (!full) setSceneUrl(url);
+      })
+      .catch(() => {});
+    load(null)
+      .then((url) => {
+        full = true;
         setSceneUrl(url);
       })
       .catch(() => {});
@@ -62,7 +72,7 @@ function SceneCanvas({ url }) {
   return (
     <iframe
       title="viewer"
-      srcDoc={`<!doctype html><html><head><meta charset="utf-8"/><style>html,body{margin:0;height:100%;overflow:hidden}</style><script type="importmap">{ "imports": { "three": "https://unpkg.com/three@0.161.0/build/three.module.js" } }</script></head><body><div id="c" style="width:100%;height:100%"></div><script type="module">import * as THREE from 'three'; import { GLTFLoader } from 'https://unpkg.com/three@0.161.0/examples/jsm/loaders/GLTFLoader.js'; const renderer=new THREE.WebGLRenderer({antialias:true}); const el=document.getElementById('c'); el.appendChild(renderer.domElement); const scene=new THREE.Scene(); const camera=new THREE.PerspectiveCamera(60,1,0.1,100); camera.position.set(2,2,2); const amb=new THREE.AmbientLight(0xffffff,0.7); scene.add(amb); const dir=new THREE.DirectionalLight(0xffffff,0.8); dir.position.set(5,5,5); scene.add(dir); const loader=new GLTFLoader(); const url='${url||''}'; if(url){ loader.load(url,(g)=>{ scene.add(g.scene); animate(); }); } function resize(){ const w=el.clientWidth,h=el.clientHeight; renderer.setSize(w,h); camera.aspect=w/h; camera.updateProjectionMatrix(); } function animate(){ resize(); renderer.render(scene,camera); requestAnimationFrame(animate); } </script></body></html>`}
+      srcDoc={`<!doctype html><html><head><meta charset="utf-8"/><style>html,body{margin:0;height:100%;overflow:hidden}</style><script type="importmap">{ "imports": { "three": "https://unpkg.com/three@0.161.0/build/three.module.js" } }</script></head><body><div id="c" style="width:100%;height:100%"></div><script type="module">import * as THREE from 'three'; import { GLTFLoader } from 'https://unpkg.com/three@0.161.0/examples/jsm/loaders/GLTFLoader.js'; const renderer=new THREE.WebGLRenderer({antialias:true}); const el=document.getElementById('c'); el.appendChild(renderer.domElement); const scene=new THREE.Scene(); const camera=new THREE.PerspectiveCamera(60,1,0.1,100); camera.position.set(2,2,2); const amb=new THREE.AmbientLight(0xffffff,0.7); scene.add(amb); const dir=new THREE.DirectionalLight(0xffffff,0.8); dir.position.set(5,5,5); scene.add(dir); const loader=new GLTFLoader(); const url='${url||''}'; let cam=camera, mixer=null; const clock=new THREE.Clock(); if(url){ loader.load(url,(g)=>{ scene.add(g.scene); if(g.cameras.length){ cam=g.cameras[0]; } if(g.animations.length){ mixer=new THREE.AnimationMixer(g.scene); g.animations.forEach((a)=>mixer.clipAction(a).play()); } animate(); }); } function resize(){ const w=el.clientWidth,h=el.clientHeight; renderer.setSize(w,h); cam.aspect=w/h; cam.updateProjectionMatrix(); } function animate(){ resize(); if(mixer){ mixer.update(clock.getDelta()); } renderer.render(scene,cam); requestAnimationFrame(animate); } </script></body></html>`}
       style={{ border: 0, width: "100%", height: "100%" }}
     />
   );
@@ -0,0 +1 @@
+"""Offline performance benchmarks (no network, CPU only)."""
@@ -0,0 +1,217 @@
+"""In-process stand-ins for Redis and S3 so benchmarks run without network."""
+import fnmatch
+import io
+import shutil
+import threading
+import time
+import types
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class FakeRedis:
+    """The subset of redis.Redis the pipeline uses, backed by a dict."""
+
+    def __init__(self, decode_responses: bool = False, **_: Any):
+        self.decode_responses = decode_responses
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, key: str) -> bool:
+        exp = self._expires.get(key)
+        if exp is not None and exp <= time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def _out(self, value: Any) -> Any:
+        if self.decode_responses and isinstance(value, bytes):
+            return value.decode("utf-8")
+        if not self.decode_responses and isinstance(value, str):
+            return value.encode("utf-8")
+        return value
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            return self._out(self._data[key]) if self._alive(key) else None
+
+    def set(self, key: str, value: Any, ex: Optional[int] = None, nx: bool = False, xx: bool = False) -> Optional[bool]:
+        with self._lock:
+            exists = self._alive(key)
+            if (nx and exists) or (xx and not exists):
+                return None
+            self._data[key] = value
+            if ex:
+                self._expires[key] = time.time() + ex
+            else:
+                self._expires.pop(key, None)
+            return True
+
+    def expire(self, key: str, seconds: int) -> bool:
+        with self._lock:
+            if not self._alive(key):
+                return False
+            self._expires[key] = time.time() + seconds
+            return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            n = 0
+            for k in keys:
+                if self._alive(k):
+                    n += 1
+                self._data.pop(k, None)
+                self._expires.pop(k, None)
+            return n
+
+    def exists(self, *keys: str) -> int:
+        with self._lock:
+            return sum(1 for k in keys if self._alive(k))
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            value = int(self._data.get(key, 0)) + amount if self._alive(key) else amount
+            self._data[key] = str(value)
+            return value
+
+    def decr(self, key: str, amount: int = 1) -> int:
+        return self.incr(key, -amount)
+
+    def llen(self, key: str) -> int:
+        with self._lock:
+            return len(self._data.get(key, [])) if self._alive(key) else 0
+
+    def rpush(self, key: str, *values: Any) -> int:
+        with self._lock:
+            items = self._data[key] if self._alive(key) else []
+            items.extend(values)
+            self._data[key] = items
+            return len(items)
+
+    def lrange(self, key: str, start: int, end: int) -> List[Any]:
+        with self._lock:
+            items = self._data.get(key, []) if self._alive(key) else []
+            return [self._out(v) for v in items[start: None if end == -1 else end + 1]]
+
+    def lrem(self, key: str, count: int, value: Any) -> int:
+        with self._lock:
+            items = self._data.get(key, []) if self._alive(key) else []
+            kept = [v for v in items if self._out(v) != self._out(value)]
+            self._data[key] = kept
+            return len(items) - len(kept)
+
+    def sadd(self, key: str, *values: Any) -> int:
+        with self._lock:
+            items = self._data[key] if self._alive(key) else set()
+            added = len(set(values) - items)
+            self._data[key] = items | set(values)
+            return added
+
+    def srem(self, key: str, *values: Any) -> int:
+        with self._lock:
+            items = self._data.get(key, set()) if self._alive(key) else set()
+            removed = len(items & set(values))
+            self._data[key] = items - set(values)
+            return removed
+
+    def scard(self, key: str) -> int:
+        with self._lock:
+            return len(self._data.get(key, set())) if self._alive(key) else 0
+
+    def scan_iter(self, match: str = "*", count: Optional[int] = None) -> Iterator[Any]:
+        with self._lock:
+            keys = [k for k in list(self._data) if self._alive(k) and fnmatch.fnmatchcase(k, match)]
+        return iter([self._out(k) for k in keys])
+
+    def eval(self, script: str, numkeys: int, *args: Any) -> Any:
+        """Only understands ``shared.singleflight``'s settle script."""
+        from shared.singleflight import _SETTLE
+        if script != _SETTLE:
+            raise NotImplementedError("FakeRedis.eval only runs the single-flight settle script")
+        key, followers_key, members_key, job_id, ttl = args
+        if self.get(key) != self._out(job_id):
+            return []
+        followers = self.lrange(followers_key, 0, -1)
+        for k in (key, followers_key, members_key):
+            if int(ttl) > 0:
+                self.expire(k, int(ttl))
+            else:
+                self.delete(k)
+        return followers
+
+
+class LocalS3:
+    """boto3 S3 client stand-in that stores objects under a local directory."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def _path(self, bucket: str, key: str) -> Path:
+        return self.root / bucket / key
+
+    def upload_file(self, filename: str, bucket: str, key: str, **_: Any) -> None:
+        dest = self._path(bucket, key)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(filename, dest)
+
+    def put_object(self, Bucket: str, Key: str, Body: Any = b"", **_: Any) -> Dict[str, Any]:
+        dest = self._path(Bucket, Key)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        dest.write_bytes(Body if isinstance(Body, (bytes, bytearray)) else Body.read())
+        return {}
+
+    def copy_object(self, Bucket: str, Key: str, CopySource: Dict[str, str], **_: Any) -> Dict[str, Any]:
+        src, dest = self._path(CopySource["Bucket"], CopySource["Key"]), self._path(Bucket, Key)
+        if not src.exists():
+            raise FileNotFoundError(f"s3://{CopySource['Bucket']}/{CopySource['Key']}")
+        if src != dest:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(src, dest)
+        dest.touch()
+        return {}
+
+    def head_object(self, Bucket: str, Key: str, **_: Any) -> Dict[str, Any]:
+        p = self._path(Bucket, Key)
+        if not p.exists():
+            raise FileNotFoundError(f"s3://{Bucket}/{Key}")
+        st = p.stat()
+        return {"ContentLength": st.st_size, "LastModified": datetime.fromtimestamp(st.st_mtime, timezone.utc)}
+
+    def get_object(self, Bucket: str, Key: str, **_: Any) -> Dict[str, Any]:
+        p = self._path(Bucket, Key)
+        if not p.exists():
+            raise FileNotFoundError(f"s3://{Bucket}/{Key}")
+        return {"Body": io.BytesIO(p.read_bytes()), "ContentLength": p.stat().st_size}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "", **_: Any) -> Dict[str, Any]:
+        base = self.root / Bucket
+        contents = []
+        for p in sorted(base.rglob("*")) if base.exists() else []:
+            key = p.relative_to(base).as_posix()
+            if p.is_file() and key.startswith(Prefix):
+                st = p.stat()
+                modified = datetime.fromtimestamp(st.st_mtime, timezone.utc)
+                contents.append({"Key": key, "Size": st.st_size, "LastModified": modified})
+        return {"Contents": contents, "IsTruncated": False}
+
+    def delete_object(self, Bucket: str, Key: str, **_: Any) -> Dict[str, Any]:
+        self._path(Bucket, Key).unlink(missing_ok=True)
+        return {}
+
+    def generate_presigned_url(self, _op: str, Params: Dict[str, str], ExpiresIn: int = 3600) -> str:
+        return self._path(Params["Bucket"], Params["Key"]).as_uri()
+
+
+def fake_boto3(s3: LocalS3) -> types.ModuleType:
+    """A module object that can be installed as ``sys.modules['boto3']``."""
+    mod = types.ModuleType("boto3")
+
+    def client(service: str, **_: Any):
+        if service != "s3":
+            raise RuntimeError(f"offline benchmark has no {service} stand-in")
+        return s3
+
+    mod.client = client  # type: ignore[attr-defined]
+    return mod
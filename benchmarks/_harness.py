@@ -0,0 +1,42 @@
+import time
+from typing import Any, Callable, Dict, List
+
+from shared.telemetry import peak_rss_mb  # noqa: F401  re-exported for benchmarks
+
+
+def measure(fn: Callable[[], Any], iterations: int = 1000, warmup: int = 10) -> Dict[str, float]:
+    """Run ``fn`` repeatedly and return latency percentiles (microseconds) and throughput."""
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter_ns()
+        fn()
+        samples.append((time.perf_counter_ns() - t0) / 1000.0)
+    elapsed = time.perf_counter() - start
+    samples.sort()
+    return {
+        "n": float(iterations),
+        "p50_us": percentile(samples, 50),
+        "p95_us": percentile(samples, 95),
+        "p99_us": percentile(samples, 99),
+        "ops_per_s": iterations / elapsed if elapsed > 0 else float("inf"),
+    }
+
+
+def percentile(sorted_samples: List[float], pct: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    k = (len(sorted_samples) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_samples) - 1)
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (k - lo)
+
+
+def print_table(rows: Dict[str, Dict[str, float]]) -> None:
+    cols = ["p50_us", "p95_us", "p99_us", "ops_per_s"]
+    width = max([len(name) for name in rows] + [8])
+    print(f"{'case':<{width}}  " + "  ".join(f"{c:>12}" for c in cols))
+    for name, stats in rows.items():
+        print(f"{name:<{width}}  " + "  ".join(f"{stats.get(c, 0.0):>12.1f}" for c in cols))
@@ -0,0 +1,93 @@
+"""
+Cold-start import cost of the API and worker entry modules.
+
+Each module is imported in a fresh interpreter with ``-X importtime``; the
+cumulative time is compared against ``importtime_budgets.json`` and the run
+exits non-zero if any module exceeds its budget. ``--update-budgets`` rewrites
+the budgets as the measured times plus ``--margin``; modules that cannot be
+imported (missing dependencies) keep their previous budget.
+
+    python -m benchmarks.bench_importtime [--runs N] [--top N] [--no-fail]
+    python -m benchmarks.bench_importtime --update-budgets [--margin 0.25]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+BUDGETS_PATH = Path(__file__).with_name("importtime_budgets.json")
+
+
+def _import_profile(module: str) -> Tuple[float, List[Tuple[float, str]]]:
+    """Return (total ms to import ``module``, [(cumulative ms, name)] for every import)."""
+    env = dict(os.environ, PYTHONPATH=str(ROOT), PYTHONDONTWRITEBYTECODE="")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        tail = proc.stderr.strip().splitlines()[-1:] or ["import failed"]
+        raise RuntimeError(tail[0])
+    rows: List[Tuple[float, str]] = []
+    total = 0.0
+    root = module.split(".", 1)[0]
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _self_us, cum_us, raw_name = line[len("import time:"):].split("|", 2)
+        name = raw_name.strip()
+        ms = int(cum_us) / 1000.0
+        rows.append((ms, name))
+        # Top-level entries of the target package (a, a.b, a.b.c) sum to its full cost
+        nested = raw_name[1:].startswith(" ")
+        if not nested and name.split(".", 1)[0] == root:
+            total += ms
+    return total, rows
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=3, help="best-of-N per module")
+    ap.add_argument("--top", type=int, default=5, help="heaviest imports to list per module")
+    ap.add_argument("--no-fail", action="store_true", help="report only, never exit non-zero")
+    ap.add_argument("--update-budgets", action="store_true", help="write measured times (+ margin) as the budgets")
+    ap.add_argument("--margin", type=float, default=0.25, help="headroom added by --update-budgets")
+    args = ap.parse_args()
+
+    budgets: Dict[str, float] = json.loads(BUDGETS_PATH.read_text())
+    tolerance = float(os.getenv("IMPORTTIME_TOLERANCE", "0.15"))
+    regressions = []
+    measured: Dict[str, float] = {}
+    for module, budget_ms in budgets.items():
+        try:
+            runs = [_import_profile(module) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{module:<32} ERROR {e}")
+            regressions.append(module)
+            continue
+        best_ms, rows = min(runs, key=lambda r: r[0])
+        measured[module] = best_ms
+        limit = budget_ms * (1 + tolerance)
+        verdict = "ok" if best_ms <= limit else "REGRESSED"
+        if verdict != "ok":
+            regressions.append(module)
+        print(f"{module:<32} {best_ms:>8.1f} ms  budget {budget_ms:>7.1f} ms  {verdict}")
+        for ms, name in sorted(rows, reverse=True)[:args.top]:
+            print(f"    {ms:>8.1f} ms  {name}")
+    if args.update_budgets:
+        updated = {m: round(measured[m] * (1 + args.margin), 1) if m in measured else b for m, b in budgets.items()}
+        BUDGETS_PATH.write_text(json.dumps(updated, indent=2) + "\n")
+        print(f"budgets updated for {len(measured)} of {len(budgets)} module(s) -> {BUDGETS_PATH.name}")
+        return 0
+    if regressions and not args.no_fail:
+        print(f"import-time budget exceeded: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""
+Offline end-to-end benchmarks for the generation pipeline.
+
+Runs on a CPU-only box with no network: Redis and S3 are replaced by the
+in-process stand-ins in ``benchmarks/_fakes.py``, Celery runs in eager mode
+and providers stay on their dependency-free fallback paths. Each case runs
+in its own interpreter so peak RSS is attributable to that case.
+
+    python -m benchmarks.bench_pipeline                       # all cases
+    python -m benchmarks.bench_pipeline --case env_stub       # one case
+    python -m benchmarks.bench_pipeline --out results.json    # save as a baseline
+    python -m benchmarks.bench_pipeline --baseline results.json --tolerance 0.2
+
+Exits non-zero when a case breaks a limit in ``pipeline_thresholds.json`` or
+regresses past ``--tolerance`` against ``--baseline``.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from benchmarks._harness import measure, peak_rss_mb
+
+ROOT = Path(__file__).resolve().parent.parent
+THRESHOLDS_PATH = Path(__file__).with_name("pipeline_thresholds.json")
+PROMPT = "misty cyberpunk alley at night; light rain; dolly camera"
+PACK_SIZES = {"pack_glb_small": 8, "pack_glb_medium": 64, "pack_glb_large": 256}
+
+
+def _sample_plan() -> Dict[str, Any]:
+    fixture = ROOT / "tests" / "fixtures" / "prompt_cyberpunk.json"
+    prompt = json.loads(fixture.read_text())["prompt"] if fixture.exists() else PROMPT
+    return {
+        "environment": {"theme": prompt, "weather": "light_rain", "time_of_day": "night"},
+        "objects": [{"type": "neon_sign", "instances": 4, "tags": ["pink"]}],
+        "camera": {"path": "dolly", "duration_s": 8},
+        "audio": {"tempo": 80, "mood": ["lofi"], "sfx": ["rain"]},
+    }
+
+
+def write_grid_obj(path: Path, n: int) -> int:
+    """Write an n x n quad grid (2*n*n triangles) as OBJ text; returns the face count."""
+    lines: List[str] = [f"v {x / n} {y / n} 0" for y in range(n + 1) for x in range(n + 1)]
+    for y in range(n):
+        for x in range(n):
+            a = y * (n + 1) + x + 1
+            b, c, d = a + 1, a + n + 1, a + n + 2
+            lines.append(f"f {a} {b} {d}")
+            lines.append(f"f {a} {d} {c}")
+    path.write_text("\n".join(lines) + "\n")
+    return 2 * n * n
+
+
+# --- cases: each takes a scratch dir and returns the callable to time ---
+
+def case_plan(tmp: Path) -> Callable[[], Any]:
+    import asyncio
+    from apps.api.routes.planning import PlanRequest, create_plan
+    req = PlanRequest(prompt=PROMPT)
+    return lambda: asyncio.run(create_plan(req))
+
+
+def case_orchestrator(tmp: Path) -> Callable[[], Any]:
+    import types
+    from benchmarks._fakes import FakeRedis
+    import workers.env_gen.tasks as env_tasks
+    import workers.orchestrator.tasks as orch_tasks
+    from shared import singleflight
+
+    # Every iteration plans the same prompt; time the full path, not an attach
+    singleflight.SINGLEFLIGHT_TTL_SEC = 0
+    fake = FakeRedis(decode_responses=True)
+    fake_redis_mod = types.SimpleNamespace(Redis=lambda **_: fake)
+    env_tasks.redis = fake_redis_mod
+    orch_tasks.redis = fake_redis_mod
+    for app in (env_tasks.app, orch_tasks.app):
+        app.conf.task_always_eager = True
+        app.conf.task_eager_propagates = True
+
+    def run() -> None:
+        job_id = f"bench-{uuid.uuid4().hex[:8]}"
+        orch_tasks.run_pipeline.apply(args=(job_id, PROMPT))
+        status = json.loads(fake.get(job_id))
+        if status["status"] not in ("env_queued", "env_done"):
+            raise RuntimeError(f"pipeline ended in {status}")
+    return run
+
+
+def case_env_stub(tmp: Path) -> Callable[[], Any]:
+    from shared.providers.env_stub import Env_Stub
+    provider, plan = Env_Stub(cfg={"job_root": str(tmp)}), _sample_plan()
+    return lambda: provider.generate(plan)
+
+
+def case_env_triposr_fallback(tmp: Path) -> Callable[[], Any]:
+    from shared.providers.env_triposr_fast import Env_TripoSR_Fast
+    provider = Env_TripoSR_Fast(cfg={"job_root": str(tmp), "load_models": False, "scene_reuse": False})
+    plan = _sample_plan()
+    return lambda: provider.generate(plan)
+
+
+def case_audio_procedural(tmp: Path) -> Callable[[], Any]:
+    from shared.providers.audio_musicgen_small import Audio_MusicGen_Small
+    provider = Audio_MusicGen_Small(cfg={"job_root": str(tmp), "cache_dir": str(tmp / "sfx"), "load_models": False})
+    plan = _sample_plan()
+    return lambda: provider.generate(plan)
+
+
+def _case_pack(n: int) -> Callable[[Path], Callable[[], Any]]:
+    def setup(tmp: Path) -> Callable[[], Any]:
+        from shared.providers.mesh_utils import clean_and_pack_glb
+        meshes = []
+        for i in range(3):
+            p = tmp / f"grid_{i}.obj"
+            write_grid_obj(p, n)
+            meshes.append(str(p))
+        out = tmp / "packed.glb"
+        return lambda: clean_and_pack_glb(meshes, out)
+    return setup
+
+
+def case_sagemaker_entrypoint(tmp: Path) -> Callable[[], Any]:
+    from benchmarks._fakes import LocalS3, fake_boto3
+    from infra.sagemaker import entrypoint_processing
+
+    sys.modules["boto3"] = fake_boto3(LocalS3(tmp / "s3"))
+    os.environ["ENV_LOAD_MODELS"] = "0"
+    os.environ["ENV_SCENE_REUSE"] = "0"  # time generation, not index hits
+    tempfile.tempdir = str(tmp)
+
+    def run() -> None:
+        os.environ["PROMPT_JSON"] = json.dumps(
+            {"prompt": PROMPT, "out_bucket": "s3://bench-bucket", "job_id": f"bench-{uuid.uuid4().hex[:8]}"}
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            entrypoint_processing.main()
+    return run
+
+
+CASES: Dict[str, Callable[[Path], Callable[[], Any]]] = {
+    "plan": case_plan,
+    "orchestrator": case_orchestrator,
+    "env_stub": case_env_stub,
+    "env_triposr_fallback": case_env_triposr_fallback,
+    "audio_procedural": case_audio_procedural,
+    **{name: _case_pack(n) for name, n in PACK_SIZES.items()},
+    "sagemaker_entrypoint": case_sagemaker_entrypoint,
+}
+ITERATIONS = {"audio_procedural": 10, "pack_glb_large": 5, "pack_glb_medium": 20, "sagemaker_entrypoint": 20}
+
+
+def _run_case_inline(name: str, iterations: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix=f"mmf-bench-{name}-") as d:
+        tmp = Path(d)
+        os.environ["JOB_TMP_DIR"] = str(tmp)
+        try:
+            fn = CASES[name](tmp)
+        except ImportError as e:
+            return {"case": name, "skipped": f"missing dependency: {e.name or e}"}
+        stats = measure(fn, iterations=iterations, warmup=1)
+        return {
+            "case": name,
+            "n": int(stats["n"]),
+            "p50_ms": stats["p50_us"] / 1000.0,
+            "p95_ms": stats["p95_us"] / 1000.0,
+            "p99_ms": stats["p99_us"] / 1000.0,
+            "ops_per_s": stats["ops_per_s"],
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+
+def _run_case_subprocess(name: str, iterations: int) -> Dict[str, Any]:
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_pipeline", "--case", name, "--iterations", str(iterations), "--inline"],
+        cwd=ROOT, env=dict(os.environ, PYTHONPATH=str(ROOT)), capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        tail = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+        return {"case": name, "error": tail}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _check(result: Dict[str, Any], limits: Dict[str, float], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    problems = []
+    for metric, limit in limits.items():
+        if metric in result and result[metric] > limit:
+            problems.append(f"{metric} {result[metric]:.1f} > limit {limit:.1f}")
+    for metric in ("p95_ms", "peak_rss_mb"):
+        base = baseline.get(metric)
+        if base and metric in result and result[metric] > base * (1 + tolerance):
+            problems.append(f"{metric} {result[metric]:.1f} > baseline {base:.1f} +{tolerance:.0%}")
+    return problems
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--case", action="append", choices=sorted(CASES), help="run only these cases")
+    ap.add_argument("--iterations", type=int, default=0, help="override per-case iteration count")
+    ap.add_argument("--baseline", type=Path, help="results JSON from a previous --out run")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed regression vs. baseline")
+    ap.add_argument("--out", type=Path, help="write results JSON (use as a later --baseline)")
+    ap.add_argument("--inline", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    names = args.case or list(CASES)
+    if args.inline:
+        iterations = args.iterations or ITERATIONS.get(names[0], 100)
+        print(json.dumps(_run_case_inline(names[0], iterations)))
+        return 0
+
+    thresholds = json.loads(THRESHOLDS_PATH.read_text()) if THRESHOLDS_PATH.exists() else {}
+    baseline = {}
+    if args.baseline:
+        baseline = {r["case"]: r for r in json.loads(args.baseline.read_text())}
+
+    results, failed = [], []
+    print(f"{'case':<24} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>9} {'rss MB':>8}")
+    for name in names:
+        res = _run_case_subprocess(name, args.iterations or ITERATIONS.get(name, 100))
+        results.append(res)
+        if "skipped" in res or "error" in res:
+            print(f"{name:<24} {'SKIP' if 'skipped' in res else 'ERROR'}  {res.get('skipped') or res.get('error')}")
+            if "error" in res:
+                failed.append(name)
+            continue
+        print(
+            f"{name:<24} {res['n']:>5} {res['p50_ms']:>9.2f} {res['p95_ms']:>9.2f} "
+            f"{res['p99_ms']:>9.2f} {res['ops_per_s']:>9.1f} {res['peak_rss_mb']:>8.1f}"
+        )
+        for problem in _check(res, thresholds.get(name, {}), baseline.get(name, {}), args.tolerance):
+            print(f"    REGRESSED: {problem}")
+            failed.append(name)
+
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2))
+    if failed:
+        print(f"regressions: {', '.join(sorted(set(failed)))}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+Seconds-per-image and peak RSS for the SDXL CPU inference modes.
+
+Needs diffusers/torch and the weights already in the Hugging Face cache; each
+mode runs in a fresh interpreter so peak RSS is per mode.
+
+    python -m benchmarks.bench_sdxl_cpu [--mode NAME ...] [--refs N]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MODES = {
+    "fp32-512": {"resolution": 512, "steps": 12},
+    "bf16-512": {"resolution": 512, "steps": 12, "dtype": "bfloat16"},
+    "int8-512": {"resolution": 512, "steps": 12, "dtype": "int8"},
+    "turbo-512": {"turbo": True, "resolution": 512},
+    "turbo-bf16-512": {"turbo": True, "resolution": 512, "dtype": "bfloat16"},
+}
+
+
+def _run_mode(cfg: dict) -> dict:
+    from shared.providers.env_triposr_fast import Env_TripoSR_Fast
+    with tempfile.TemporaryDirectory() as d:
+        provider = Env_TripoSR_Fast(cfg=dict(cfg, job_root=d, cpu_inference=True, scene_reuse=False))
+        provider._ensure_initialized()
+        if not provider._uses_pipe():
+            return {"skipped": "diffusers/torch not installed"}
+        provider.generate({"environment": {"theme": "alley", "time_of_day": "night", "weather": "fog"}})
+        return provider.runtime_stats
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mode", action="append", choices=sorted(MODES))
+    ap.add_argument("--refs", type=int, default=2)
+    ap.add_argument("--inline", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.inline:
+        print(json.dumps(_run_mode(json.loads(args.inline))))
+        return 0
+
+    print(f"{'mode':<16} {'s/image':>9} {'peak RSS MB':>12}")
+    for name in args.mode or list(MODES):
+        cfg = dict(MODES[name], num_refs=args.refs)
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_sdxl_cpu", "--inline", json.dumps(cfg)],
+            cwd=ROOT, env=dict(os.environ, PYTHONPATH=str(ROOT), CUDA_VISIBLE_DEVICES=""),
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            print(f"{name:<16} ERROR {(proc.stderr.strip().splitlines() or ['failed'])[-1]}")
+            continue
+        stats = json.loads(proc.stdout.strip().splitlines()[-1])
+        if "skipped" in stats:
+            print(f"{name:<16} SKIP  {stats['skipped']}")
+            continue
+        print(f"{name:<16} {stats['s_per_image']:>9.2f} {stats['peak_rss_mb']:>12.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""
+Serialization cost per path, stdlib json vs. the active backend.
+
+    python -m benchmarks.bench_serialization [--iterations N]
+"""
+import argparse
+import json
+
+from benchmarks._harness import measure, print_table
+from shared import serialization
+from shared.messaging import encode_plan
+
+SAMPLE_PLAN = {
+    "environment": {"theme": "alley", "weather": "light_rain", "time_of_day": "night"},
+    "objects": [
+        {"type": "alley_buildings", "instances": 2, "tags": ["wet_concrete"], "text_overlays": None},
+        {"type": "neon_sign", "instances": 4, "tags": ["pink", "blue"], "text_overlays": ["ラーメン", "探偵社"]},
+    ],
+    "character": {"archetype": "sleuth", "rig": "humanoid", "motion_text": "walk cautiously"},
+    "camera": {"path": "dolly", "duration_s": 8},
+    "audio": {"tempo": 80, "mood": ["lofi", "minor"], "sfx": ["rain", "footsteps", "neon_buzz"]},
+}
+
+SAMPLE_STATUS = {"status": "env_done", "detail": {"scene_glb": "/app/tmp/env_0123/scene.glb", "prov": {"name": "env/stub", "version": "0.1.0"}}}
+
+SAMPLE_MANIFEST = {
+    "job_id": "envgen-0123abcd",
+    "prompt": "misty cyberpunk alley at night; light rain; dolly camera",
+    "artifacts": {"scene_glb": "/tmp/envgen-0123abcd/scene.glb", "refs": [f"/tmp/refs/ref_{i}.png" for i in range(4)]},
+    "provenance": {"name": "env/triposr_fast", "version": "0.2.0", "components": {"sdxl": "stub", "triposr": "stub"}},
+}
+
+
+CASES = {
+    "response": {"scene_plan": SAMPLE_PLAN},
+    "status": SAMPLE_STATUS,
+    "manifest": SAMPLE_MANIFEST,
+}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--iterations", type=int, default=20000)
+    args = ap.parse_args()
+
+    rows = {}
+    for name, obj in CASES.items():
+        rows[f"{name}/stdlib"] = measure(lambda o=obj: json.dumps(o).encode("utf-8"), args.iterations)
+        rows[f"{name}/{serialization.BACKEND}"] = measure(lambda o=obj: serialization.dumpb(o), args.iterations)
+
+    # Celery payload: the plan envelope as it is encoded onto the broker
+    envelope = [["job-1", {"plan": SAMPLE_PLAN}, "stub", "0.1.0"], {}, {}]
+    rows["celery/stdlib"] = measure(lambda: json.dumps(envelope).encode("utf-8"), args.iterations)
+    rows[f"celery/{serialization.BACKEND}"] = measure(lambda: serialization.dumpb(envelope), args.iterations)
+    rows["plan_key/canonical"] = measure(lambda: encode_plan(SAMPLE_PLAN), args.iterations)
+
+    encoded = serialization.dumpb(SAMPLE_PLAN)
+    rows["decode/stdlib"] = measure(lambda: json.loads(encoded), args.iterations)
+    rows[f"decode/{serialization.BACKEND}"] = measure(lambda: serialization.loads(encoded), args.iterations)
+
+    print(f"backend: {serialization.BACKEND}")
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Per-process memory of env workers at concurrency 1, 4 and 8.
+
+Forks N children the way Celery prefork does, has each one touch every
+weight page, then reports RSS and PSS (proportional set size: shared pages
+are split between the processes that map them) while all N are alive.
+
+Strategies:
+  private   each child loads its own copy (today's behaviour)
+  preload   the parent loads once before forking; children share copy-on-write
+  mmap      each child maps the weight file read-only; pages come from the page cache
+
+``--synthetic-mb`` (default) uses a generated weight file and needs only the
+stdlib. ``--real`` loads the SDXL pipeline through the weight store instead
+(diffusers, torch and cached weights required; Linux only).
+
+    python -m benchmarks.bench_worker_rss [--synthetic-mb 256] [--real]
+"""
+import argparse
+import json
+import mmap
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+PAGE = mmap.PAGESIZE
+
+
+def _mem_kb() -> Tuple[int, int]:
+    """(RSS, PSS) of this process in KiB from /proc."""
+    rss = pss = 0
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Rss:"):
+                rss = int(line.split()[1])
+            elif line.startswith("Pss:"):
+                pss = int(line.split()[1])
+    return rss, pss
+
+
+def _touch(buf: Any) -> int:
+    # Read one byte per page so every page is resident in this process
+    view = memoryview(buf)
+    return sum(view[i] for i in range(0, len(view), PAGE))
+
+
+def _synthetic_loader(strategy: str, path: str):
+    if strategy == "mmap":
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    with open(path, "rb") as f:
+        return bytearray(f.read())
+
+
+def _real_loader(strategy: str, _path: str):
+    from shared.providers.env_triposr_fast import Env_TripoSR_Fast
+    provider = Env_TripoSR_Fast(cfg={"cpu_inference": True, "scene_reuse": False})
+    provider._ensure_initialized()
+    if provider.pipe is None:
+        raise RuntimeError("diffusers/torch not installed")
+    return provider.pipe
+
+
+def _real_touch(pipe: Any) -> int:
+    total = 0
+    for name in ("unet", "vae", "text_encoder", "text_encoder_2"):
+        module = getattr(pipe, name, None)
+        for p in module.parameters() if module is not None else []:
+            total += int(p.detach().reshape(-1)[:: max(1, PAGE // p.element_size())].sum().item() != 0)
+    return total
+
+
+def _child(strategy, path, preloaded, real, barrier, results):
+    weights = preloaded if strategy == "preload" else (_real_loader if real else _synthetic_loader)(strategy, path)
+    (_real_touch if real else _touch)(weights)
+    barrier.wait()  # everyone resident before measuring, so PSS splits shared pages correctly
+    results.put(_mem_kb())
+    barrier.wait()
+
+
+def run(strategy: str, concurrency: int, path: str, real: bool) -> Dict[str, float]:
+    ctx = mp.get_context("fork")
+    preloaded = None
+    if strategy == "preload":
+        if real:
+            os.environ["ENV_PRELOAD_WEIGHTS"] = "1"
+            from shared.providers import weight_store
+            weight_store.preload([{"cpu_inference": True}])
+            preloaded = _real_loader(strategy, path)
+        else:
+            preloaded = _synthetic_loader(strategy, path)
+    if real and strategy == "mmap":
+        os.environ["WEIGHTS_MMAP"] = "1"
+    barrier, results = ctx.Barrier(concurrency), ctx.Queue()
+    procs = [ctx.Process(target=_child, args=(strategy, path, preloaded, real, barrier, results)) for _ in range(concurrency)]
+    for p in procs:
+        p.start()
+    samples: List[Tuple[int, int]] = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    rss = [s[0] / 1024.0 for s in samples]
+    pss = [s[1] / 1024.0 for s in samples]
+    return {"rss_mb": sum(rss) / len(rss), "pss_mb": sum(pss) / len(pss), "total_pss_mb": sum(pss)}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--synthetic-mb", type=int, default=256)
+    ap.add_argument("--real", action="store_true")
+    ap.add_argument("--concurrency", type=int, action="append")
+    ap.add_argument("--strategy", action="append", choices=["private", "preload", "mmap"])
+    ap.add_argument("--inline", nargs=3, metavar=("STRATEGY", "N", "PATH"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("SKIP  needs Linux /proc/self/smaps_rollup")
+        return 0
+
+    if args.inline:
+        strategy, n, path = args.inline
+        print(json.dumps(run(strategy, int(n), path, args.real)))
+        return 0
+
+    root = Path(__file__).resolve().parent.parent
+    with tempfile.TemporaryDirectory() as d:
+        path = str(Path(d) / "weights.bin")
+        if not args.real:
+            with open(path, "wb") as f:
+                for _ in range(args.synthetic_mb):
+                    f.write(os.urandom(1024 * 1024))
+        print(f"{'strategy':<10} {'conc':>4} {'RSS/proc MB':>12} {'PSS/proc MB':>12} {'total PSS MB':>13}")
+        for strategy in args.strategy or ["private", "preload", "mmap"]:
+            for n in args.concurrency or [1, 4, 8]:
+                # Fresh interpreter per configuration so nothing preloaded leaks into the next
+                cmd = [sys.executable, "-m", "benchmarks.bench_worker_rss", "--inline", strategy, str(n), path]
+                proc = subprocess.run(
+                    cmd + (["--real"] if args.real else []),
+                    cwd=root, env=dict(os.environ, PYTHONPATH=str(root)), capture_output=True, text=True,
+                )
+                if proc.returncode != 0:
+                    print(f"{strategy:<10} {n:>4} ERROR {(proc.stderr.strip().splitlines() or ['failed'])[-1]}")
+                    continue
+                r = json.loads(proc.stdout.strip().splitlines()[-1])
+                print(f"{strategy:<10} {n:>4} {r['rss_mb']:>12.1f} {r['pss_mb']:>12.1f} {r['total_pss_mb']:>13.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,36 @@
 import os
-import json
 import tempfile
+import time
 import uuid
 import sys
 from pathlib import Path
 
-import boto3
+
+def _ensure_code_path() -> None:
+    # Ensure proper Python path for SageMaker environment
+    current_dir = Path('/opt/ml/code')
+    if str(current_dir) not in sys.path:
+        sys.path.insert(0, str(current_dir))
+
+    # Also add parent directory for relative imports
+    parent_dir = current_dir.parent
+    if str(parent_dir) not in sys.path:
+        sys.path.insert(0, str(parent_dir))
+
+    print(f"Python path: {sys.path[:3]}")  # Debug info
 
 
 def main() -> None:
+    started = time.perf_counter()
     payload = os.getenv("PROMPT_JSON")
     if not payload:
         raise RuntimeError("PROMPT_JSON env is missing")
 
-    cfg = json.loads(payload)
+    _ensure_code_path()
+    from shared.serialization import dumpb, dumps, loads
+    from shared import runtime_model, telemetry
+
+    cfg = loads(payload)
     prompt = cfg.get("prompt", "(none)")
     out_bucket_uri = cfg["out_bucket"]  # e.g., s3://bucket[/prefix]
     job_id = cfg.get("job_id", f"scn_{uuid.uuid4().hex}")
@@ -21,80 +38,124 @@ def main() -> None:
     tmp_dir = Path(tempfile.mkdtemp()) / job_id
     tmp_dir.mkdir(parents=True, exist_ok=True)
 
-    # --- REAL PIPELINE: Use actual environment generator ---
-    try:
-        # Ensure proper Python path for SageMaker environment
-        current_dir = Path('/opt/ml/code')
-        if str(current_dir) not in sys.path:
-            sys.path.insert(0, str(current_dir))
-        
-        # Also add parent directory for relative imports
-        parent_dir = current_dir.parent
-        if str(parent_dir) not in sys.path:
-            sys.path.insert(0, str(parent_dir))
-        
-        print(f"Python path: {sys.path[:3]}")  # Debug info
-        
-        from shared.providers.factory import get_provider
-        
-        # Create a minimal scene plan from the prompt
-        scene_plan = {
-            "environment": {
-                "theme": prompt,
-                "time_of_day": "night",  # Default to night for moody scenes
-                "weather": "none"
+    with telemetry.recording() as rec:
+        # Submission -> container start: instance provisioning, image pull and boot
+        telemetry.observe_queue_wait("sagemaker", cfg.get("submitted_at"))
+
+        env_cfg = cfg.get("env_cfg") or {}
+        if cfg.get("plan_key"):
+            # Planned by the submitter, which sized the job from it
+            import boto3
+            from shared.messaging import get_plan_s3
+            s3 = boto3.client("s3", region_name=os.getenv("AWS_REGION", "us-east-1"))
+            scene_plan = get_plan_s3(s3, out_bucket_uri.replace("s3://", "", 1).split("/", 1)[0], cfg["plan_key"])
+        else:
+            # Create a minimal scene plan from the prompt
+            scene_plan = {
+                "environment": {
+                    "theme": prompt,
+                    "time_of_day": "night",  # Default to night for moody scenes
+                    "weather": "none"
+                }
             }
-        }
-        
-        # Get the real environment generator
-        provider = get_provider("env", "sdxl_triposr", "0.1.0", cfg={"job_root": str(tmp_dir)})
-        result = provider.generate(scene_plan)
-
-        # Extract the generated GLB path and any refs if available
-        glb_path = Path(result["artifacts"]["scene_glb"])
-        refs = result.get("artifacts", {}).get("refs", []) or []
-        provenance = result["provenance"]
-        
-    except Exception as e:
-        # Fallback to stub if real pipeline fails
-        print(f"Real pipeline failed: {e}, falling back to stub")
-        print(f"Exception type: {type(e).__name__}")
-        print(f"Exception details: {str(e)}")
-        glb_path = tmp_dir / "scene.glb"
-        glb_path.write_bytes(b"glTF-stub")
-        refs = []
-        provenance = {"pipeline": "stub-fallback", "version": "0.1.0", "error": str(e)}
 
+        # --- REAL PIPELINE: Use actual environment generator ---
+        try:
+            from shared.providers.factory import get_provider
+
+            # Get the real environment generator
+            provider = get_provider("env", "sdxl_triposr", "0.1.0", cfg={**env_cfg, "job_root": str(tmp_dir)})
+            with telemetry.span("sagemaker.generate"):
+                result = provider.generate(scene_plan)
+
+            # Extract the generated GLB path and any refs if available
+            glb_path = Path(result["artifacts"]["scene_glb"])
+            refs = result.get("artifacts", {}).get("refs", []) or []
+            lods = result.get("artifacts", {}).get("lods", []) or []
+            provenance = result["provenance"]
+
+        except Exception as e:
+            # Fallback to stub if real pipeline fails
+            print(f"Real pipeline failed: {e}, falling back to stub")
+            print(f"Exception type: {type(e).__name__}")
+            print(f"Exception details: {str(e)}")
+            glb_path = tmp_dir / "scene.glb"
+            try:
+                from shared.providers.glb_writer import GLBWriter
+                GLBWriter().write(glb_path)
+            except Exception:
+                glb_path.write_bytes(b"glTF-stub")
+            refs = []
+            lods = []
+            provenance = {"pipeline": "stub-fallback", "version": "0.1.0", "error": str(e)}
+
+        # Upload to S3
+        bucket_part = out_bucket_uri.replace("s3://", "", 1)
+        if "/" in bucket_part:
+            bucket, root = bucket_part.split("/", 1)
+            root = root.rstrip("/")
+        else:
+            bucket, root = bucket_part, ""
+        # Standardized layout: jobs/<job_id>/manifest.json, bytes under blobs/<sha256>
+        prefix = f"{root}/jobs/{job_id}" if root else f"jobs/{job_id}"
+        legacy_layout = os.getenv("ARTIFACT_LAYOUT", "blobs") == "legacy"
+
+        # (file relative to the job, local path, artifact name); coarse LOD first so
+        # it is readable as early as possible, scene.glb is the full LOD
+        files = [(e["file"], e["path"], e["name"]) for e in lods if e["file"] != "scene.glb"]
+        files.append(("scene.glb", str(glb_path), "scene_glb"))
+        files += [(f"refs/{Path(r).name}", r, "refs") for r in refs]
+
+        import boto3
+        from shared.blob_store import put_blob
+        s3 = boto3.client("s3", region_name=os.getenv("AWS_REGION", "us-east-1"))
+        blobs = {}
+        # Artifacts go up first so the manifest can carry the upload timing
+        with telemetry.span("sagemaker.upload"):
+            for rel, path, name in files:
+                try:
+                    if name != "refs":
+                        telemetry.record_artifact(name, path)
+                    if legacy_layout:
+                        s3.upload_file(path, bucket, f"{prefix}/{rel}")
+                    else:
+                        blobs[rel] = put_blob(s3, bucket, path, root)
+                except Exception:
+                    # Reference images are best effort; the scene itself must upload
+                    if name != "refs":
+                        raise
+            rec.attrs["blobs_reused"] = sum(1 for b in blobs.values() if not b.pop("uploaded"))
+
+    lod_entries = [{k: e[k] for k in ("name", "file", "lod", "bytes", "object") if k in e} for e in lods]
+    for entry in lod_entries:
+        if entry["file"] in blobs:
+            entry["sha256"] = blobs[entry["file"]]["sha256"]
     manifest = {
         "job_id": job_id,
         "prompt": prompt,
         "artifacts": {"scene_glb": str(glb_path), "refs": refs},
+        # Files relative to the job prefix, ordered coarse -> full
+        "lods": lod_entries,
+        # File relative to the job prefix -> {"sha256", "key", "bytes"}; absent in legacy layout
+        **({"blobs": blobs} if blobs else {}),
         "provenance": provenance,
+        "timings": rec.as_dict(),
+        # Training sample for shared.runtime_model; the features the job was sized from
+        "runtime": {
+            "features": cfg.get("features") or runtime_model.features(scene_plan, env_cfg),
+            "instance_type": cfg.get("instance_type"),
+            "wall_s": round(time.perf_counter() - started, 3),
+            "peak_rss_mb": round(telemetry.peak_rss_mb(), 1),
+            "finished_at": time.time(),
+        },
     }
-    (tmp_dir / "manifest.json").write_text(json.dumps(manifest, indent=2))
-
-    # Upload to S3
-    bucket_part = out_bucket_uri.replace("s3://", "", 1)
-    if "/" in bucket_part:
-        bucket, prefix = bucket_part.split("/", 1)
-        prefix = prefix.rstrip("/")
-    else:
-        bucket, prefix = bucket_part, ""
-    # Standardized layout: jobs/<job_id>/...
-    prefix = f"{prefix}/jobs/{job_id}" if prefix else f"jobs/{job_id}"
-
-    s3 = boto3.client("s3", region_name=os.getenv("AWS_REGION", "us-east-1"))
-    s3.upload_file(str(glb_path), bucket, f"{prefix}/scene.glb")
+    (tmp_dir / "manifest.json").write_bytes(dumpb(manifest))
     s3.upload_file(str(tmp_dir / "manifest.json"), bucket, f"{prefix}/manifest.json")
-    # Upload any reference images if produced
-    for ref_path in refs:
-        try:
-            p = Path(ref_path)
-            s3.upload_file(str(p), bucket, f"{prefix}/refs/{p.name}")
-        except Exception:
-            pass
 
-    print(json.dumps({"ok": True, "s3": f"s3://{bucket}/{prefix}/"}))
+    # Everything is in S3 now; don't leave the job's files on the instance volume
+    from shared import workspace
+    workspace.release(tmp_dir.parent)
+    print(dumps({"ok": True, "s3": f"s3://{bucket}/{prefix}/"}))
 
 
 if __name__ == "__main__":
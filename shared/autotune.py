@@ -0,0 +1,133 @@
+"""Resource-aware Celery autoscaling.
+
+Celery's stock autoscaler (``--autoscale=MAX,MIN``) grows the pool whenever
+tasks are reserved, with no regard for whether the host can take another
+generation process. With ``WORKER_AUTOTUNE=1`` workers use
+``ResourceAutoscaler``. It grows one process at a time, at most every
+``AUTOTUNE_GROW_INTERVAL_SEC`` so the last process's load shows up first, and
+only while CPU, memory and GPU use are all at least ``AUTOTUNE_MARGIN`` below
+their limits. It sheds one process at a time when any of them is at or over
+its limit, or when fewer tasks are reserved than processes run. Idle shrinking
+honours Celery's ``keepalive`` cooldown, because a new child has to reload its
+weights. Celery resizes the prefetch count with the pool, so prefetch follows.
+
+Usage comes from ``/proc`` and ``nvidia-smi``, never CUDA: the autoscaler runs
+in the prefork parent, which must not initialise CUDA before forking. CPU is
+the busy share of ``/proc/stat`` ticks since the previous sample, not the
+lagging load average.
+"""
+import os
+import shutil
+import subprocess
+import time
+from typing import Dict, Optional, Tuple
+
+try:
+    from celery.worker.autoscale import Autoscaler  # type: ignore
+except ImportError:  # pragma: no cover
+    Autoscaler = object  # type: ignore
+
+AUTOTUNE_LIMITS = {
+    "cpu": float(os.getenv("AUTOTUNE_CPU_HIGH", "0.9")),
+    "mem": float(os.getenv("AUTOTUNE_MEM_HIGH", "0.85")),
+    "gpu": float(os.getenv("AUTOTUNE_GPU_HIGH", "0.95")),
+    "gpu_mem": float(os.getenv("AUTOTUNE_GPU_MEM_HIGH", "0.9")),
+}
+AUTOTUNE_MARGIN = float(os.getenv("AUTOTUNE_MARGIN", "0.1"))
+AUTOTUNE_GROW_INTERVAL_SEC = float(os.getenv("AUTOTUNE_GROW_INTERVAL_SEC", "60"))
+
+_last_cpu: Optional[Tuple[int, int]] = None
+
+
+def _cpu_ticks() -> Optional[Tuple[int, int]]:
+    """(busy, total) jiffies across all CPUs."""
+    try:
+        with open("/proc/stat") as f:
+            fields = [int(v) for v in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0)  # idle + iowait
+    return sum(fields) - idle, sum(fields)
+
+
+def _cpu() -> Optional[float]:
+    """Busy CPU share since the previous call (None on the first call)."""
+    global _last_cpu
+    now = _cpu_ticks()
+    prev, _last_cpu = _last_cpu, now
+    if now is None or prev is None or now[1] <= prev[1]:
+        return None
+    return (now[0] - prev[0]) / (now[1] - prev[1])
+
+
+def _mem() -> Optional[float]:
+    try:
+        with open("/proc/meminfo") as f:
+            info = {line.split(":")[0]: int(line.split()[1]) for line in f if line.split()[1:]}
+        return 1.0 - info["MemAvailable"] / info["MemTotal"]
+    except (OSError, KeyError, ValueError, ZeroDivisionError):
+        return None
+
+
+def _gpu() -> Dict[str, float]:
+    exe = shutil.which("nvidia-smi")
+    if exe is None:
+        return {}
+    try:
+        out = subprocess.run(
+            [exe, "--query-gpu=utilization.gpu,memory.used,memory.total", "--format=csv,noheader,nounits"],
+            capture_output=True, text=True, timeout=5, check=True,
+        ).stdout
+        rows = [[float(v) for v in line.split(",")] for line in out.strip().splitlines()]
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return {}
+    if not rows:
+        return {}
+    # The busiest device bounds how many more processes fit
+    return {"gpu": max(r[0] for r in rows) / 100.0, "gpu_mem": max(r[1] / r[2] for r in rows if r[2])}
+
+
+def sample() -> Dict[str, float]:
+    """Current usage as fractions (0-1); metrics that cannot be read are left out."""
+    usage = {"cpu": _cpu(), "mem": _mem(), **_gpu()}
+    return {k: round(v, 4) for k, v in usage.items() if v is not None}
+
+
+def decide(procs: int, wanted: int, min_procs: int, max_procs: int, usage: Dict[str, float],
+           limits: Optional[Dict[str, float]] = None, margin: float = AUTOTUNE_MARGIN) -> int:
+    """Next pool size (one step from ``procs``) given ``wanted`` reserved tasks and resource ``usage``."""
+    limits = AUTOTUNE_LIMITS if limits is None else limits
+    checked = [(usage[k], limits[k]) for k in limits if k in usage]
+    if any(u >= lim for u, lim in checked):
+        return max(min_procs, procs - 1)
+    if wanted > procs and all(u < lim - margin for u, lim in checked):
+        return min(max_procs, procs + 1)
+    if wanted < procs:
+        return max(min_procs, procs - 1)
+    return max(min_procs, min(procs, max_procs))
+
+
+class ResourceAutoscaler(Autoscaler):  # type: ignore[misc, valid-type]
+    """``worker_autoscaler`` that scales on reserved tasks and host headroom."""
+
+    _last_grow = 0.0
+
+    def _maybe_scale(self, req=None):
+        procs = self.processes
+        usage = sample()
+        target = decide(procs, self.qty, self.min_concurrency, self.max_concurrency, usage)
+        if target > procs:
+            if time.monotonic() - self._last_grow < AUTOTUNE_GROW_INTERVAL_SEC:
+                return None
+            self._last_grow = time.monotonic()
+            self.scale_up(1)
+            return True
+        if target < procs:
+            hot = any(usage.get(k, 0.0) >= lim for k, lim in AUTOTUNE_LIMITS.items())
+            # Only pressure sheds at once; idle shrinking waits out keepalive (scale_down checks it)
+            if hot:
+                self._shrink(1)
+            else:
+                self.scale_down(1)
+            return True
+        return None
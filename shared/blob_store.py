@@ -0,0 +1,141 @@
+"""Content-addressed artifact storage on S3.
+
+Artifact bytes live once under ``<root>/blobs/<sha256>``; each job only writes
+``jobs/<job_id>/manifest.json``, which maps artifact files to hashes. Uploads
+are skipped when the blob already exists (the blob is re-stamped instead), and
+blob keys never change content, so they are served with immutable cache headers.
+
+Unreferenced blobs are removed by ``gc`` (``python -m shared.blob_store gc``).
+Blobs written or reused within the grace period are kept so a job that has
+uploaded its blobs but not yet its manifest is never collected.
+"""
+import argparse
+import hashlib
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+BLOB_DIR = "blobs"
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+GC_GRACE_SEC = int(os.getenv("BLOB_GC_GRACE_SEC", str(24 * 3600)))
+
+_CONTENT_TYPES = {".glb": "model/gltf-binary", ".png": "image/png", ".json": "application/json", ".obj": "text/plain"}
+
+
+def sha256_file(path: Any, chunk: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def blob_key(sha: str, root: str = "") -> str:
+    return f"{root.strip('/')}/{BLOB_DIR}/{sha}" if root.strip("/") else f"{BLOB_DIR}/{sha}"
+
+
+def _refresh(s3: Any, bucket: str, key: str, extra: Dict[str, str]) -> bool:
+    """
+    Re-stamp an existing blob's LastModified (server-side self-copy) so the gc
+    grace period restarts for the job about to reference it. False when the
+    blob does not exist.
+    """
+    try:
+        s3.copy_object(Bucket=bucket, Key=key, CopySource={"Bucket": bucket, "Key": key},
+                       MetadataDirective="REPLACE", **extra)
+        return True
+    except Exception:
+        return False
+
+
+def put_blob(s3: Any, bucket: str, path: Any, root: str = "") -> Dict[str, Any]:
+    """
+    Upload ``path`` as a blob unless one with the same hash exists. Returns
+    ``{"sha256", "key", "bytes", "uploaded"}`` for the job manifest.
+    """
+    p = Path(path)
+    sha = sha256_file(p)
+    key = blob_key(sha, root)
+    extra = {"CacheControl": CACHE_CONTROL, "ContentType": _CONTENT_TYPES.get(p.suffix, "application/octet-stream")}
+    uploaded = False
+    if not _refresh(s3, bucket, key, extra):
+        s3.upload_file(str(p), bucket, key, ExtraArgs=extra)
+        uploaded = True
+    return {"sha256": sha, "key": key, "bytes": p.stat().st_size, "uploaded": uploaded}
+
+
+def _list(s3: Any, bucket: str, prefix: str) -> Iterator[Dict[str, Any]]:
+    kwargs: Dict[str, Any] = {"Bucket": bucket, "Prefix": prefix}
+    while True:
+        resp = s3.list_objects_v2(**kwargs)
+        yield from resp.get("Contents", [])
+        if not resp.get("IsTruncated"):
+            return
+        kwargs["ContinuationToken"] = resp["NextContinuationToken"]
+
+
+def referenced_blobs(s3: Any, bucket: str, root: str = "") -> Set[str]:
+    """Every hash named by a job manifest under ``<root>/jobs/``."""
+    from shared.serialization import loads
+
+    jobs = f"{root.strip('/')}/jobs/" if root.strip("/") else "jobs/"
+    refs: Set[str] = set()
+    for obj in _list(s3, bucket, jobs):
+        if not obj["Key"].endswith("manifest.json"):
+            continue
+        manifest = loads(s3.get_object(Bucket=bucket, Key=obj["Key"])["Body"].read())
+        refs.update(entry["sha256"] for entry in (manifest.get("blobs") or {}).values())
+    return refs
+
+
+def _age(modified: datetime) -> float:
+    return (datetime.now(timezone.utc) - modified).total_seconds()
+
+
+def gc(s3: Any, bucket: str, root: str = "", grace_sec: int = GC_GRACE_SEC, dry_run: bool = False) -> Tuple[int, int]:
+    """Delete blobs no manifest references; returns (blobs deleted, bytes freed)."""
+    refs = referenced_blobs(s3, bucket, root)
+    deleted = freed = 0
+    for obj in _list(s3, bucket, blob_key("", root)):
+        sha = obj["Key"].rsplit("/", 1)[-1]
+        if sha in refs or _age(obj["LastModified"]) < grace_sec:
+            continue
+        try:
+            # The listing may be stale: a job that reused the blob since then has
+            # restamped it and may not have written its manifest yet
+            modified = s3.head_object(Bucket=bucket, Key=obj["Key"])["LastModified"]
+        except Exception:
+            continue  # already gone
+        if _age(modified) < grace_sec:
+            continue
+        if not dry_run:
+            s3.delete_object(Bucket=bucket, Key=obj["Key"])
+        deleted += 1
+        freed += obj.get("Size", 0)
+    return deleted, freed
+
+
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m shared.blob_store")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    g = sub.add_parser("gc", help="delete blobs no job manifest references")
+    g.add_argument("--bucket", default=os.getenv("S3_BUCKET", ""), help="s3://bucket[/root] (default: $S3_BUCKET)")
+    g.add_argument("--grace-sec", type=int, default=GC_GRACE_SEC)
+    g.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args(argv)
+
+    bucket, _, root = args.bucket.replace("s3://", "", 1).partition("/")
+    if not bucket:
+        ap.error("--bucket or S3_BUCKET is required")
+    import boto3
+    s3 = boto3.client("s3", region_name=os.getenv("AWS_REGION", "us-east-1"))
+    deleted, freed = gc(s3, bucket, root, args.grace_sec, args.dry_run)
+    verb = "would delete" if args.dry_run else "deleted"
+    print(f"{verb} {deleted} blob(s), {freed / 1e6:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
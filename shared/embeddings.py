@@ -0,0 +1,105 @@
+"""Small text embeddings for cache lookups.
+
+``EMBED_BACKEND=hash`` (default) needs nothing installed: stemmed words and
+their character trigrams are hashed into a fixed-size signed vector, so
+rephrasings that share words ("walking cautiously" / "cautious walk") land
+close together. ``EMBED_BACKEND=sentence-transformers`` uses ``EMBED_MODEL``
+instead. Vectors are L2-normalised, so ``cosine`` is a dot product. Store
+``backend()`` next to saved vectors; vectors from different backends are not
+comparable.
+"""
+import math
+import os
+import re
+import zlib
+from typing import List, Sequence
+
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "hash")
+EMBED_MODEL = os.getenv("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+HASH_DIM = 512
+# Part of the backend tag: bump whenever tokens() changes, so vectors stored by the old tokenizer are skipped
+HASH_VERSION = 2
+
+_STOPWORDS = {"a", "an", "the", "and", "or", "of", "in", "on", "at", "to", "with", "very", "is", "while"}
+_SUFFIXES = ("ingly", "ing", "ly", "ed", "es", "s")
+# Scene vocabulary the hashed backend cannot relate on its own (applied after stemming)
+_SYNONYMS = {
+    "misty": "fog", "mist": "fog", "foggy": "fog", "hazy": "fog", "haze": "fog",
+    "rainy": "rain", "drizzle": "rain", "nighttime": "night", "midnight": "night",
+    "daytime": "day", "daylight": "day", "dusk": "evening", "twilight": "evening",
+}
+_model = None
+_backend = None
+
+
+def tokens(text: str) -> List[str]:
+    """Lower-cased, stopword-free, crudely stemmed words."""
+    out = []
+    for w in re.findall(r"[a-z0-9]+", text.lower()):
+        if w in _STOPWORDS:
+            continue
+        stripped = True
+        while stripped:  # "cautiously" and "cautious" must meet at the same stem
+            stripped = False
+            for suf in _SUFFIXES:
+                if len(w) > len(suf) + 3 and w.endswith(suf):
+                    w, stripped = w[: -len(suf)], True
+                    if suf in ("ing", "ed") and len(w) > 2 and w[-1] == w[-2] and w[-1] not in "aeiouls":
+                        w = w[:-1]  # running -> run, stepped -> step
+                    break
+        out.append(_SYNONYMS.get(w, w))
+    return out
+
+
+def normalize(text: str) -> str:
+    """Canonical form for exact-match keys: sorted stemmed tokens."""
+    return " ".join(sorted(tokens(text)))
+
+
+def _sentence_model():
+    global _model
+    if _model is None:
+        from sentence_transformers import SentenceTransformer
+        _model = SentenceTransformer(EMBED_MODEL, device="cpu")
+    return _model
+
+
+def backend() -> str:
+    global _backend
+    if _backend is None:
+        _backend = f"hash{HASH_DIM}v{HASH_VERSION}"
+        if EMBED_BACKEND == "sentence-transformers":
+            try:
+                _sentence_model()
+                _backend = f"st:{EMBED_MODEL}"
+            except Exception as e:
+                print(f"sentence-transformers unavailable ({e}), using hashed embeddings")
+    return _backend
+
+
+def _hash_embed(text: str) -> List[float]:
+    vec = [0.0] * HASH_DIM
+    for w in tokens(text):
+        padded = f"#{w}#"
+        feats = [(w, 1.0)] + [(padded[i:i + 3], 0.3) for i in range(len(padded) - 2)]
+        for feat, weight in feats:
+            h = zlib.crc32(feat.encode("utf-8"))
+            vec[h % HASH_DIM] += weight if h & 0x80000000 else -weight
+    return _unit(vec)
+
+
+def _unit(vec: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vec)) or 1.0
+    return [x / norm for x in vec]
+
+
+def embed(text: str) -> List[float]:
+    if backend().startswith("st:"):
+        return _unit([float(x) for x in _sentence_model().encode([text])[0]])
+    return _hash_embed(text)
+
+
+def cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    if len(a) != len(b):
+        return 0.0
+    return sum(x * y for x, y in zip(a, b))
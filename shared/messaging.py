@@ -0,0 +1,97 @@
+"""Task message helpers shared by the orchestrator and env workers.
+
+Scene plans travel inside the Celery message so env workers never need the
+orchestrator's filesystem. Plans above ``PLAN_INLINE_MAX_BYTES`` are spilled
+to a content-addressed Redis key and the message only carries the reference.
+SageMaker jobs get theirs from S3 (``put_plan_s3``/``get_plan_s3``), since a
+processing job's environment values are too small to hold a plan.
+"""
+import hashlib
+import os
+from typing import Any, Dict, List, Optional
+
+from shared.serialization import KOMBU_SERIALIZER, dumpb, loads, register_kombu
+
+PLAN_INLINE_MAX_BYTES = int(os.getenv("PLAN_INLINE_MAX_BYTES", "65536"))
+PLAN_BLOB_TTL_SEC = int(os.getenv("PLAN_BLOB_TTL_SEC", "86400"))
+PLAN_BLOB_PREFIX = "plan:"
+
+
+def _pick_task_serializer(orjson_registered: bool) -> str:
+    override = os.getenv("CELERY_TASK_SERIALIZER")
+    if override:
+        return override
+    try:
+        import msgpack  # noqa: F401
+        return "msgpack"
+    except ImportError:
+        return KOMBU_SERIALIZER if orjson_registered else "json"
+
+
+def celery_conf() -> Dict[str, Any]:
+    """Serializer settings every Celery app in the pipeline must agree on."""
+    orjson_registered = register_kombu()
+    result_serializer = KOMBU_SERIALIZER if orjson_registered else "json"
+    task_serializer = _pick_task_serializer(orjson_registered)
+    # Always accept json so workers keep draining messages queued before a switch
+    accept: List[str] = sorted({task_serializer, result_serializer, "json"})
+    return {
+        "task_serializer": task_serializer,
+        "result_serializer": result_serializer,
+        "accept_content": accept,
+        "result_accept_content": accept,
+    }
+
+
+def encode_plan(plan: Dict[str, Any]) -> bytes:
+    """Canonical compact encoding: identical plans always produce identical bytes."""
+    return dumpb(plan, sort_keys=True)
+
+
+def pack_plan(plan: Dict[str, Any], r=None) -> Dict[str, Any]:
+    """
+    Build the plan envelope for a task message. Small plans are inlined; large
+    plans go to Redis under ``plan:<sha256>`` when a client is given.
+    """
+    data = encode_plan(plan)
+    if r is None or len(data) <= PLAN_INLINE_MAX_BYTES:
+        return {"plan": plan}
+    key = PLAN_BLOB_PREFIX + hashlib.sha256(data).hexdigest()
+    # Same content, same key: a concurrent job only refreshes the TTL
+    if not r.set(key, data, ex=PLAN_BLOB_TTL_SEC, nx=True):
+        r.expire(key, PLAN_BLOB_TTL_SEC)
+    return {"plan_ref": key}
+
+
+def plan_s3_key(job_id: str, root: str = "") -> str:
+    return f"{root.strip('/')}/jobs/{job_id}/plan.json" if root.strip("/") else f"jobs/{job_id}/plan.json"
+
+
+def put_plan_s3(s3, bucket: str, job_id: str, plan: Dict[str, Any], root: str = "") -> str:
+    """Store ``plan`` next to the job's manifest; returns the key to send in the job payload."""
+    key = plan_s3_key(job_id, root)
+    s3.put_object(Bucket=bucket, Key=key, Body=encode_plan(plan), ContentType="application/json")
+    return key
+
+
+def get_plan_s3(s3, bucket: str, key: str) -> Dict[str, Any]:
+    return loads(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+
+
+def unpack_plan(envelope: Any, r=None) -> Dict[str, Any]:
+    """Resolve a plan envelope (or a legacy plan file path) back into a plan dict."""
+    if isinstance(envelope, str):
+        # Messages queued before plans moved in-message still carry a file path
+        with open(envelope, "rb") as f:
+            return loads(f.read())
+    if "plan" in envelope:
+        return envelope["plan"]
+    key: Optional[str] = envelope.get("plan_ref")
+    if not key:
+        raise ValueError("Plan envelope has neither 'plan' nor 'plan_ref'")
+    if r is None:
+        raise RuntimeError(f"Redis client required to resolve {key}")
+    data = r.get(key)
+    if data is None:
+        raise KeyError(f"Plan blob {key} expired or missing")
+    return loads(data)
@@ -1,2 +1,20 @@
-from .factory import get_provider, PROVIDERS
+from .factory import get_provider, register_provider, PROVIDERS
 from .base import EnvGenerator, MotionGenerator, AudioGenerator
+
+# Provider classes are resolved on attribute access so importing the package
+# does not pull in every provider module.
+_LAZY = {
+    "Env_Stub": ".env_stub",
+    "Env_TripoSR_Fast": ".env_triposr_fast",
+    "Motion_MDM_Base": ".motion_mdm_base",
+    "Audio_MusicGen_Small": ".audio_musicgen_small",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        from importlib import import_module
+        value = getattr(import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,9 +1,321 @@
-
 from .base import AudioGenerator
+import array
+import math
+import os
+import random
+import re
+import sys
+import uuid
+import wave
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from shared import workspace
+from shared.telemetry import record_artifact, span
+from . import weight_store
+
+MUSICGEN_SMALL = "facebook/musicgen-small"
+SAMPLE_RATE = 32000  # MusicGen's EnCodec rate; the procedural path matches it
+
+_MINOR = (220.0, 261.63, 329.63)  # A minor triad
+_MAJOR = (261.63, 329.63, 392.0)  # C major triad
+
 
 class Audio_MusicGen_Small(AudioGenerator):
-    def generate(self, audio_spec):
+    """
+    Music bed for a scene from its AudioSpec (tempo, mood, sfx) plus the
+    camera duration. Audio is produced chunk by chunk; every chunk is written
+    as its own WAV segment (and uploaded when ``out_s3`` is set) as soon as it
+    is ready, appended to ``music.wav`` and listed in ``music.m3u``, so only
+    one chunk is ever held in memory and playback can start early.
+
+    Uses MusicGen through transformers when available, each chunk conditioned
+    on the tail of the previous one; otherwise a procedural tempo-synced pad.
+    SFX loops are cached on disk by name and reused across jobs.
+    """
+
+    def __init__(self, weights_dir=None, cfg=None):
+        super().__init__(weights_dir, cfg or {})
+        self.model_id = self.cfg.get("model_id", os.getenv("MUSICGEN_MODEL", MUSICGEN_SMALL))
+        # CPU small mode: no classifier-free guidance (halves the batch) and shorter chunks
+        self.cpu_small = bool(self.cfg.get("cpu_small", os.getenv("AUDIO_CPU_SMALL", "0") == "1"))
+        self.chunk_s = float(self.cfg.get("chunk_s", os.getenv("AUDIO_CHUNK_S", "5" if self.cpu_small else "10")))
+        # Seconds of the previous chunk fed back as the audio prompt for the next
+        self.overlap_s = float(self.cfg.get("overlap_s", 1.0 if self.cpu_small else 2.0))
+        self.guidance_scale = float(self.cfg.get("guidance", 1.0 if self.cpu_small else 3.0))
+        self.sfx_loop_s = float(self.cfg.get("sfx_loop_s", 4.0))
+        self.cache_dir = Path(self.cfg.get("cache_dir", os.getenv("AUDIO_CACHE_DIR", "/app/cache/sfx")))
+        # "s3://bucket/prefix": upload each segment as it finishes
+        self.out_s3 = self.cfg.get("out_s3", os.getenv("AUDIO_OUT_S3", ""))
+        self.load_models = bool(self.cfg.get("load_models", os.getenv("AUDIO_LOAD_MODELS", "1") != "0"))
+        self.processor = None
+        self.model = None
+        self.device = "cpu"
+        self.sample_rate = SAMPLE_RATE
+        self._initialized = False
+
+    def _ensure_initialized(self):
+        if self._initialized:
+            return
+        with span("audio.model_load"):
+            self._load_models()
+        self._initialized = True
+
+    def _load_models(self):
+        if not self.load_models:
+            return
+        try:
+            import torch
+            from transformers import AutoProcessor, MusicgenForConditionalGeneration
+        except ImportError:
+            return
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+
+        def load():
+            processor = AutoProcessor.from_pretrained(self.model_id)
+            model = MusicgenForConditionalGeneration.from_pretrained(
+                self.model_id, torch_dtype=torch.float16 if self.device == "cuda" else torch.float32
+            ).to(self.device)
+            model.eval()
+            return processor, model
+
+        try:
+            key = (self.model_id, "default", self.device, "musicgen")
+            self.processor, self.model = weight_store.get_or_load(key, load)
+            self.sample_rate = int(self.model.config.audio_encoder.sampling_rate)
+        except Exception as e:
+            print(f"MusicGen unavailable ({e}), using procedural audio")
+            self.processor = self.model = None
+
+    @staticmethod
+    def _prompt(audio_spec: Dict[str, Any]) -> str:
+        mood = ", ".join(audio_spec.get("mood") or ["ambient"])
+        return f"{mood} instrumental soundtrack, {int(audio_spec.get('tempo', 80))} bpm, loopable, no vocals"
+
+    # --- chunk sources: each yields little-endian PCM16 mono chunks ---
+
+    def _musicgen_chunks(self, prompt: str, duration_s: float) -> Iterator[bytes]:
+        import numpy as np
+        import torch
+
+        frame_rate = int(self.model.config.audio_encoder.frame_rate)
+        remaining, tail = duration_s, None
+        while remaining > 0:
+            length = min(self.chunk_s, remaining)
+            kwargs: Dict[str, Any] = {"text": [prompt], "padding": True, "return_tensors": "pt"}
+            if tail is not None:
+                kwargs.update(audio=tail, sampling_rate=self.sample_rate)
+            inputs = self.processor(**kwargs).to(self.device)
+            with torch.inference_mode():
+                out = self.model.generate(
+                    **inputs, do_sample=True, guidance_scale=self.guidance_scale,
+                    max_new_tokens=max(1, int(length * frame_rate)),
+                )
+            audio = out[0, 0].float().cpu().numpy()
+            if tail is not None:
+                audio = audio[len(tail):]  # the output repeats the audio prompt first
+            audio = audio[: int(length * self.sample_rate)]
+            overlap = int(self.overlap_s * self.sample_rate)
+            tail = audio[-overlap:].copy() if overlap else None
+            remaining -= length
+            yield (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+    def _procedural_chunks(self, audio_spec: Dict[str, Any], duration_s: float) -> Iterator[bytes]:
+        sr = self.sample_rate
+        minor = any("minor" in m or m in ("dark", "sad", "noir") for m in audio_spec.get("mood") or [])
+        steps = [2 * math.pi * f / sr for f in (_MINOR if minor else _MAJOR)]
+        beat = max(1, int(sr * 60.0 / int(audio_spec.get("tempo", 80))))
+        kick_len, kick_step = int(0.12 * sr), 2 * math.pi * 55.0 / sr
+        total, start = int(duration_s * sr), 0
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        while start < total:
+            n = min(int(self.chunk_s * sr), total - start)
+            if np is not None:
+                t = np.arange(start, start + n, dtype=np.float64)
+                pad = sum(np.sin(s * t) for s in steps) * (0.5 + 0.5 * np.sin(2 * math.pi * t / (8 * beat)))
+                k = t % beat
+                kick = np.where(k < kick_len, np.sin(kick_step * k) * (1.0 - k / kick_len), 0.0)
+                start += n
+                # astype truncates toward zero, like int() in the loop below
+                yield (3000 * pad + 9000 * kick).astype("<i2").tobytes()
+                continue
+            pcm = array.array("h", bytes(2 * n))
+            for i in range(n):
+                t = start + i
+                pad = sum(math.sin(s * t) for s in steps) * (0.5 + 0.5 * math.sin(2 * math.pi * t / (8 * beat)))
+                k = t % beat
+                kick = math.sin(kick_step * k) * (1.0 - k / kick_len) if k < kick_len else 0.0
+                pcm[i] = int(3000 * pad + 9000 * kick)
+            if sys.byteorder != "little":  # pragma: no cover
+                pcm.byteswap()
+            start += n
+            yield pcm.tobytes()
+
+    # --- SFX loops ---
+
+    def _sfx_loop(self, name: str) -> Path:
+        backend = "musicgen" if self.model is not None else "procedural"
+        slug = re.sub(r"[^a-z0-9_]+", "_", name.lower()).strip("_") or "sfx"
+        path = self.cache_dir / f"{slug}-{backend}-{self.sample_rate}hz-{self.sfx_loop_s:g}s.wav"
+        if path.exists():
+            return path
+        with span("audio.sfx", sfx=slug):
+            if self.model is not None:
+                pcm = b"".join(self._musicgen_chunks(f"{name} sound effect, seamless ambient loop", self.sfx_loop_s))
+            else:
+                pcm = _procedural_sfx(slug, self.sample_rate, self.sfx_loop_s)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename so concurrent workers never read a half-written loop
+            tmp = path.with_suffix(f".{uuid.uuid4().hex[:8]}.tmp")
+            with wave.open(str(tmp), "wb") as w:
+                _wav_params(w, self.sample_rate)
+                w.writeframes(pcm)
+            os.replace(tmp, path)
+        return path
+
+    def _uploader(self, job_id: str) -> Optional[Callable[[Path, str], None]]:
+        if not self.out_s3:
+            return None
+        import boto3
+        bucket, _, prefix = self.out_s3.replace("s3://", "", 1).partition("/")
+        s3 = boto3.client("s3", region_name=os.getenv("AWS_REGION", "us-east-1"))
+        base = f"{prefix.rstrip('/')}/{job_id}" if prefix else job_id
+        return lambda path, rel: s3.upload_file(str(path), bucket, f"{base}/{rel}")
+
+    def generate(self, audio_spec: Dict[str, Any], duration_s: Optional[float] = None) -> Dict[str, Any]:
+        """
+        ``audio_spec`` is the plan's AudioSpec, or the whole scene plan. The
+        length is ``duration_s``, else the plan's camera duration, else
+        ``cfg["duration_s"]`` (8 s, the CameraSpec default).
+        """
+        if isinstance(audio_spec.get("audio"), dict) or "camera" in audio_spec:
+            plan = audio_spec
+            audio_spec = plan.get("audio") or {}
+            if duration_s is None:
+                duration_s = (plan.get("camera") or {}).get("duration_s")
+        if duration_s is None:
+            duration_s = audio_spec.get("duration_s", self.cfg.get("duration_s", 8))
+        duration_s = float(duration_s)
+        self._ensure_initialized()
+        job_root = workspace.allocate("audio", self.cfg.get("job_root"))
+        job_id = job_root.name
+        seg_dir = job_root / "segments"
+        seg_dir.mkdir(parents=True, exist_ok=True)
+        upload = self._uploader(job_id)
+
+        if self.model is not None:
+            chunks = self._musicgen_chunks(self._prompt(audio_spec), duration_s)
+        else:
+            chunks = self._procedural_chunks(audio_spec, duration_s)
+
+        music = job_root / "music.wav"
+        playlist = job_root / "music.m3u"
+        segments: List[str] = []
+        with wave.open(str(music), "wb") as full, open(playlist, "w") as m3u:
+            _wav_params(full, self.sample_rate)
+            m3u.write("#EXTM3U\n")
+            i = 0
+            while True:
+                with span("audio.chunk", index=i):
+                    pcm = next(chunks, None)
+                if pcm is None:
+                    break
+                seg = seg_dir / f"seg_{i:05d}.wav"
+                with wave.open(str(seg), "wb") as w:
+                    _wav_params(w, self.sample_rate)
+                    w.writeframes(pcm)
+                full.writeframes(pcm)
+                m3u.write(f"#EXTINF:{len(pcm) / 2 / self.sample_rate:.3f},\nsegments/{seg.name}\n")
+                m3u.flush()
+                if upload is not None:
+                    upload(seg, f"segments/{seg.name}")
+                segments.append(str(seg))
+                i += 1
+
+        sfx = {name: str(self._sfx_loop(name)) for name in audio_spec.get("sfx") or []}
+        if upload is not None:
+            upload(music, "music.wav")
+            upload(playlist, "music.m3u")
+        record_artifact("music_wav", music)
+        workspace.finish(job_root)
+
         return {
-            "artifacts": {"music_mp3": "file://tmp/stub_track.mp3"},
-            "provenance": {"name": "audio/musicgen_small", "version": "1.1.0"}
+            "artifacts": {
+                "music_wav": str(music),
+                "music_playlist": str(playlist),
+                "music_segments": segments,
+                "sfx_loops": sfx,
+            },
+            "provenance": {
+                "name": "audio/musicgen_small",
+                "version": "1.2.0",
+                "backend": "musicgen" if self.model is not None else "procedural",
+                "model": self.model_id if self.model is not None else "procedural",
+                "sample_rate": self.sample_rate,
+                "chunk_s": self.chunk_s,
+                "duration_s": duration_s,
+            },
         }
+
+
+def _wav_params(w: Any, sample_rate: int) -> None:
+    w.setnchannels(1)
+    w.setsampwidth(2)
+    w.setframerate(sample_rate)
+
+
+def _procedural_sfx(slug: str, sr: int, seconds: float) -> bytes:
+    """Procedural stand-ins: noise for rain/wind, thumps for steps, mains hum for buzz."""
+    n = int(seconds * sr)
+    try:
+        import numpy as np
+    except ImportError:
+        return _procedural_sfx_py(slug, sr, n)
+    if n <= 0:
+        return b""
+    rng = np.random.default_rng(zlib.crc32(slug.encode("utf-8")))
+    i = np.arange(n, dtype=np.float64)
+    if "step" in slug:
+        period, length = int(0.55 * sr), int(0.08 * sr)
+        k = i % period
+        out = np.where(k < length, 8000 * rng.uniform(-1, 1, n) * (1 - k / length), 0.0)
+    elif "buzz" in slug or "hum" in slug:
+        steps = [2 * math.pi * f / sr for f in (120.0, 240.0, 360.0)]
+        out = 2500 * sum(np.sin(s * i) / (j + 1) for j, s in enumerate(steps))
+    else:
+        # _procedural_sfx_py's one-pole low-pass as a convolution with its impulse
+        # response, truncated once the taps fall under 1e-4
+        alpha = 0.5 if "rain" in slug else 0.05
+        taps = min(n, math.ceil(math.log(1e-4) / math.log(1 - alpha)))
+        kernel = alpha * (1 - alpha) ** np.arange(taps)
+        out = 6000 * np.convolve(rng.uniform(-1, 1, n), kernel)[:n]
+    return out.astype("<i2").tobytes()
+
+
+def _procedural_sfx_py(slug: str, sr: int, n: int) -> bytes:
+    """Pure-Python fallback for ``_procedural_sfx`` when numpy is missing."""
+    rng = random.Random(slug)
+    pcm = array.array("h", bytes(2 * n))
+    if "step" in slug:
+        period, length = int(0.55 * sr), int(0.08 * sr)
+        for i in range(n):
+            k = i % period
+            pcm[i] = int(8000 * rng.uniform(-1, 1) * (1 - k / length)) if k < length else 0
+    elif "buzz" in slug or "hum" in slug:
+        # 120 Hz fits a whole number of cycles in any integer-second loop, so it loops cleanly
+        steps = [2 * math.pi * f / sr for f in (120.0, 240.0, 360.0)]
+        for i in range(n):
+            pcm[i] = int(2500 * sum(math.sin(s * i) / (j + 1) for j, s in enumerate(steps)))
+    else:
+        # One-pole low-passed noise; heavier smoothing reads as wind/ambience, lighter as rain
+        alpha = 0.5 if "rain" in slug else 0.05
+        y = 0.0
+        for i in range(n):
+            y += alpha * (rng.uniform(-1, 1) - y)
+            pcm[i] = int(6000 * y)
+    if sys.byteorder != "little":  # pragma: no cover
+        pcm.byteswap()
+    return pcm.tobytes()
@@ -1,7 +1,9 @@
 from .base import EnvGenerator
-import uuid
-from pathlib import Path
 from typing import Dict, Any
+from shared import workspace
+from shared.cancellation import checkpoint
+from shared.telemetry import record_artifact
+from .glb_writer import GLBWriter
 
 
 class Env_Stub(EnvGenerator):
@@ -13,16 +15,14 @@ class Env_Stub(EnvGenerator):
     def generate(self, scene_plan: Dict[str, Any]) -> Dict[str, Any]:
         """Generate a stub GLB file for testing"""
         # Create a simple stub GLB file
-        job_root = Path(self.cfg.get("job_root", "/app/tmp")) / f"env_{uuid.uuid4().hex}"
+        checkpoint("env.export")
+        job_root = workspace.allocate("env", self.cfg.get("job_root"))
         out_glb = job_root / "scene.glb"
-        out_glb.parent.mkdir(parents=True, exist_ok=True)
         
-        # Write a minimal GLB stub (just enough to be recognized as GLB)
-        # This is a minimal GLB file with no geometry
-        minimal_glb = b'glTF\x02\x00\x00\x00\x08\x00\x00\x00JSON{"asset":{"version":"2.0"},"scene":0,"scenes":[{"nodes":[]}],"nodes":[],"meshes":[],"accessors":[],"bufferViews":[],"buffers":[]}\x00\x00\x00\x00'
-        
-        with open(out_glb, "wb") as f:
-            f.write(minimal_glb)
+        # Write a valid GLB with an empty scene (no geometry)
+        GLBWriter().write(out_glb)
+        record_artifact("scene_glb", out_glb)
+        workspace.finish(job_root)
         
         return {
             "artifacts": {"scene_glb": str(out_glb)},
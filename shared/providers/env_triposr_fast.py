@@ -1,9 +1,15 @@
 
 from .base import EnvGenerator
-import uuid
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 import os
+import time
+from shared import workspace
+from shared.cancellation import checkpoint, interrupted
+from shared.telemetry import peak_rss_mb, record_artifact, span
+from . import prompt_cache, weight_store
+from .mesh_utils import placeholder_mesh, write_obj, write_scene_lods
+from .scene_index import SCENE_REUSE_THRESHOLD, SCENE_SEED_THRESHOLD, SceneIndex
 # Lazy imports to avoid dependency issues
 # import torch
 # from PIL import Image
@@ -18,16 +24,52 @@ import os
 #     clean_and_pack_glb,
 # )
 
+SDXL_BASE = "stabilityai/stable-diffusion-xl-base-1.0"
+SDXL_TURBO = "stabilityai/sdxl-turbo"
+
+
 class Env_TripoSR_Fast(EnvGenerator):
     def __init__(self, weights_dir=None, cfg=None):
         super().__init__(weights_dir, cfg or {})
         # Lazy initialization to avoid import issues
         self.device = None
         self.num_refs = int(self.cfg.get("num_refs", 2))
-        self.guidance_scale = float(self.cfg.get("guidance", 7.0))
-        self.steps = int(self.cfg.get("steps", 24))
+        # Turbo: distilled SDXL, few steps and no classifier-free guidance
+        self.turbo = bool(self.cfg.get("turbo", os.getenv("SDXL_TURBO", "0") == "1"))
+        self.model_id = self.cfg.get("model_id", SDXL_TURBO if self.turbo else SDXL_BASE)
+        self.guidance_scale = float(self.cfg.get("guidance", 0.0 if self.turbo else 7.0))
+        self.steps = int(self.cfg.get("steps", 4 if self.turbo else 24))
+        # CPU mode: run SDXL on CPU instead of falling back to blank refs
+        self.cpu_inference = bool(self.cfg.get("cpu_inference", os.getenv("ENV_CPU_INFERENCE", "0") == "1"))
+        # float32 | bfloat16 | float16 | int8 (int8 = dynamic quantization, CPU only)
+        self.weights_dtype = self.cfg.get("dtype", os.getenv("SDXL_DTYPE"))
+        # Stream submodules to the GPU one at a time (accelerator boxes with little VRAM)
+        self.sequential_offload = bool(self.cfg.get("sequential_offload", False))
+        # 0 = pipeline default (1024 base / 512 turbo); CPU mode defaults to 512
+        self.resolution = int(self.cfg.get("resolution", 0))
+        self.runtime_stats: Dict[str, Any] = {}
+        # Persist ref PNGs and mesh OBJs next to the GLB (and list refs for upload)
+        self.debug_artifacts = bool(self.cfg.get("debug_artifacts", os.getenv("ENV_DEBUG_ARTIFACTS", "0") == "1"))
+        # Coarse LOD triangle budget per object, and whether to also emit per-object GLBs
+        self.coarse_faces = int(self.cfg.get("coarse_faces", os.getenv("ENV_LOD_COARSE_FACES", "512")))
+        self.glb_chunks = bool(self.cfg.get("chunks", os.getenv("ENV_GLB_CHUNKS", "0") == "1"))
+        # Camera/beat timeline keyframe rate (0 disables the timeline)
+        self.timeline_fps = int(self.cfg.get("timeline_fps", os.getenv("TIMELINE_FPS", "30")))
+        # Reuse SDXL text-encoder outputs for repeated prompts (see prompt_cache)
+        self.prompt_cache = bool(self.cfg.get("prompt_cache", os.getenv("ENV_PROMPT_CACHE", "1") != "0"))
+        # Near-duplicate plans: reuse a stored scene, or img2img from its refs at this strength
+        self.scene_reuse = bool(self.cfg.get("scene_reuse", os.getenv("ENV_SCENE_REUSE", "1") != "0"))
+        self.seed_strength = float(self.cfg.get("seed_strength", os.getenv("ENV_SEED_STRENGTH", "0.5")))
+        self.scene_index = SceneIndex(
+            root=self.cfg.get("scene_index_dir"),
+            reuse_threshold=float(self.cfg.get("reuse_threshold", SCENE_REUSE_THRESHOLD)),
+            seed_threshold=float(self.cfg.get("seed_threshold", SCENE_SEED_THRESHOLD)),
+        )
+        self._img2img = None
         self.enable_zero123 = bool(self.cfg.get("zero123", False))
         self.zero123_ckpt = os.getenv("ZERO123_CKPT")
+        # False forces the dependency-free fallback path (offline benchmarks, CI)
+        self.load_models = bool(self.cfg.get("load_models", os.getenv("ENV_LOAD_MODELS", "1") != "0"))
         self.pipe = None
         self._initialized = False
 
@@ -35,7 +77,15 @@ class Env_TripoSR_Fast(EnvGenerator):
         """Lazy initialization of heavy dependencies"""
         if self._initialized:
             return
-        
+        with span("env.model_load"):
+            self._load_models()
+
+    def _load_models(self):
+        if not self.load_models:
+            self.device = "cpu"
+            self.pipe = None
+            self._initialized = True
+            return
         try:
             import torch
             from PIL import Image
@@ -44,14 +94,14 @@ class Env_TripoSR_Fast(EnvGenerator):
             self.device = "cuda" if torch.cuda.is_available() else "cpu"
             
             if StableDiffusionXLPipeline is not None:
-                self.pipe = StableDiffusionXLPipeline.from_pretrained(
-                    "stabilityai/stable-diffusion-xl-base-1.0",
-                    torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
-                ).to(self.device)
-                try:
-                    self.pipe.enable_attention_slicing()
-                except Exception:
-                    pass
+                # One pipeline per process per configuration, shared across provider instances
+                key = (
+                    self.model_id,
+                    self.weights_dtype or "default",
+                    self.device,
+                    f"turbo={int(self.turbo)},offload={int(self.sequential_offload)}",
+                )
+                self.pipe = weight_store.get_or_load(key, lambda: self._build_pipe(torch, StableDiffusionXLPipeline))
             self._initialized = True
         except ImportError:
             # Fallback mode - no heavy dependencies
@@ -59,100 +109,236 @@ class Env_TripoSR_Fast(EnvGenerator):
             self.pipe = None
             self._initialized = True
 
-    def _ref_images(self, prompt: str, outdir: Path) -> List[Path]:
-        outdir.mkdir(parents=True, exist_ok=True)
-        paths: List[Path] = []
-        
+    def _build_pipe(self, torch, pipeline_cls):
+        pipe = pipeline_cls.from_pretrained(
+            self.model_id,
+            torch_dtype=self._torch_dtype(torch),
+            use_safetensors=True,
+            low_cpu_mem_usage=True,
+        )
+        if self.turbo:
+            from diffusers import EulerAncestralDiscreteScheduler
+            pipe.scheduler = EulerAncestralDiscreteScheduler.from_config(
+                pipe.scheduler.config, timestep_spacing="trailing"
+            )
+        if self.sequential_offload and self.device == "cuda":
+            pipe.enable_sequential_cpu_offload()
+        else:
+            pipe = pipe.to(self.device)
+        if self.weights_dtype == "int8" and self.device == "cpu":
+            self._quantize_int8(torch, pipe)
+        elif weight_store.WEIGHTS_MMAP and self.device == "cpu":
+            weight_store.mmap_weights(pipe, self.model_id)
+        # Bound activation memory: attention in slices, VAE decode in tiles/slices
+        for opt in ("enable_attention_slicing", "enable_vae_slicing", "enable_vae_tiling"):
+            try:
+                getattr(pipe, opt)()
+            except Exception:
+                pass
+        return pipe
+
+    def _torch_dtype(self, torch):
+        if self.device == "cuda":
+            return torch.bfloat16 if self.weights_dtype == "bfloat16" else torch.float16
+        # fp16 matmuls are not supported/fast on CPU; int8 quantizes from fp32 after load
+        return torch.bfloat16 if self.weights_dtype == "bfloat16" else torch.float32
+
+    def _quantize_int8(self, torch, pipe):
+        from torch.ao.quantization import quantize_dynamic
+        for name in ("unet", "text_encoder", "text_encoder_2"):
+            module = getattr(pipe, name, None)
+            if module is not None:
+                setattr(pipe, name, quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8))
+
+    def _uses_pipe(self) -> bool:
+        return self.pipe is not None and (self.device == "cuda" or self.cpu_inference)
+
+    def _prompt_kwargs(self, prompt: str) -> Tuple[Dict[str, Any], str]:
+        """Precomputed embeddings for the pipeline call, or the raw prompt."""
+        if not self.prompt_cache or not hasattr(self.pipe, "encode_prompt"):
+            return {"prompt": prompt}, "off"
+        import torch
+        variant = self.weights_dtype or ("float16" if self.device == "cuda" else "float32")
+        try:
+            # Cached embeddings must not hold an autograd graph
+            with span("env.prompt_embeds"), torch.no_grad():
+                return prompt_cache.default_cache().get(
+                    self.pipe, self.model_id, prompt, self.device, do_cfg=self.guidance_scale > 1.0, variant=variant
+                )
+        except Exception as e:
+            print(f"Prompt embedding cache bypassed ({e})")
+            return {"prompt": prompt}, "off"
+
+    def _img2img_pipe(self):
+        # Shares every module with the text-to-image pipeline; no extra weights
+        if self._img2img is None:
+            from diffusers import StableDiffusionXLImg2ImgPipeline
+            self._img2img = StableDiffusionXLImg2ImgPipeline(**self.pipe.components)
+        return self._img2img
+
+    @staticmethod
+    def _interrupt_on_cancel(pipe, step, timestep, callback_kwargs):
+        # diffusers stops the denoising loop after this step; checkpoint() then raises
+        if interrupted():
+            pipe._interrupt = True
+        return callback_kwargs
+
+    def _ref_images(self, prompt: str, seeds: Optional[List[Any]] = None) -> List[Any]:
+        """
+        Reference images as in-memory PIL images (None when PIL is unavailable).
+        With ``seeds`` (a near-duplicate's refs) they are img2img'd at
+        ``seed_strength``, i.e. only that fraction of the denoising steps runs.
+        """
         # Ensure dependencies are loaded
         self._ensure_initialized()
         
-        # Fallback to blank refs when no diffusers or no CUDA device
-        if self.pipe is None or self.device != "cuda":
+        # Fallback to blank refs when no diffusers, or no CUDA device and CPU mode is off
+        if not self._uses_pipe():
             # Fallback to blank images when diffusers not installed
             try:
                 from PIL import Image
-                for i in range(self.num_refs):
-                    img = Image.new("RGB", (512, 512), (30, 30, 30))
-                    p = outdir / f"ref_{i}.png"
-                    img.save(p)
-                    paths.append(p)
-                return paths
+                return [Image.new("RGB", (512, 512), (30, 30, 30)) for _ in range(self.num_refs)]
             except ImportError:
-                # Create empty files as last resort
-                for i in range(self.num_refs):
-                    p = outdir / f"ref_{i}.png"
-                    p.touch()
-                    paths.append(p)
-                return paths
+                return [None] * self.num_refs
+        import torch
+        size = self.resolution or (512 if self.device == "cpu" else None)
+        kwargs: Dict[str, Any] = {"num_inference_steps": self.steps, "guidance_scale": self.guidance_scale}
+        pipe, steps = self.pipe, self.steps
+        if seeds:
+            pipe = self._img2img_pipe()
+            kwargs["strength"] = self.seed_strength
+            steps = max(1, int(self.steps * self.seed_strength))
+        elif size:
+            kwargs.update(height=size, width=size)
+        prompt_kwargs, embeds_source = self._prompt_kwargs(prompt)
+        kwargs.update(prompt_kwargs)
+        kwargs["callback_on_step_end"] = self._interrupt_on_cancel
+        images: List[Any] = []
+        infer_s = 0.0
         for i in range(self.num_refs):
-            img = self.pipe(
-                prompt, num_inference_steps=self.steps, guidance_scale=self.guidance_scale
-            ).images[0]
-            p = outdir / f"ref_{i}.png"
-            img.save(p)
-            paths.append(p)
-        return paths
+            checkpoint("env.sdxl_infer")
+            if seeds:
+                kwargs["image"] = seeds[i % len(seeds)]
+            t0 = time.perf_counter()
+            with span("env.sdxl_infer", steps=steps), torch.inference_mode():
+                images.append(pipe(**kwargs).images[0])
+            infer_s += time.perf_counter() - t0
+        checkpoint("env.meshing")  # an interrupted denoise returns a partial image
+        self.runtime_stats = {
+            "device": self.device,
+            "dtype": self.weights_dtype or ("float16" if self.device == "cuda" else "float32"),
+            "steps": steps,
+            "resolution": size or "default",
+            "seeded": bool(seeds),
+            "s_per_image": round(infer_s / max(1, self.num_refs), 3),
+            "prompt_embeds": embeds_source,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+        return images
+
+    def _save_debug(self, job_root: Path, images: List[Any], meshes: List[Dict[str, Any]]) -> List[str]:
+        refs_dir = job_root / "refs"
+        refs_dir.mkdir(parents=True, exist_ok=True)
+        ref_paths: List[str] = []
+        for i, img in enumerate(images):
+            p = refs_dir / f"ref_{i}.png"
+            if img is not None:
+                img.save(p)
+            else:
+                p.touch()
+            ref_paths.append(str(p))
+        for i, mesh in enumerate(meshes):
+            write_obj(mesh, job_root / "meshes" / f"asset_{i}.obj")
+        return ref_paths
 
     def generate(self, scene_plan: Dict[str, Any]) -> Dict[str, Any]:
         # Derive a prompt from scene plan
         env = scene_plan.get("environment", {})
         prompt = f"{env.get('theme','scene')}, {env.get('time_of_day','night')}, {env.get('weather','none')}, cinematic"
 
-        job_root = Path(self.cfg.get("job_root", os.getenv("JOB_TMP_DIR", "/app/tmp"))) / f"env_{uuid.uuid4().hex}"
-        refs_dir = job_root / "refs"
-        meshes_dir = job_root / "meshes"
+        job_root = workspace.allocate("env", self.cfg.get("job_root"))
         out_glb = job_root / "scene.glb"
-        meshes_dir.mkdir(parents=True, exist_ok=True)
+        self.runtime_stats = {}  # per job: reused or fallback scenes must not report the last SDXL run
 
-        ref_paths = self._ref_images(prompt, refs_dir)
+        self._ensure_initialized()
+        source = "sdxl" if self._uses_pipe() else "fallback"
+        match = None
+        if self.scene_reuse:
+            with span("env.scene_lookup"):
+                # Blank-ref fallback scenes only stand in while SDXL is unavailable
+                match = self.scene_index.match(
+                    scene_plan, sources=("sdxl",) if source == "sdxl" else None,
+                    model_id=self.model_id if source == "sdxl" else None,
+                )
+        cache: Dict[str, Any] = {"status": "miss"}
+        if match is not None:
+            neighbour, score, mode = match
+            cache = {"status": mode, "score": round(score, 3), "neighbour": neighbour["id"]}
+            if mode == "reuse":
+                with span("env.scene_reuse"):
+                    lods = self.scene_index.restore(neighbour, job_root)
+                if lods is None:
+                    # Evicted by another worker since the lookup: generate as on a miss
+                    match, cache = None, {"status": "miss"}
+                else:
+                    for entry in lods:
+                        record_artifact(entry["name"], entry["path"])
+                    workspace.finish(job_root)
+                    return {
+                        "artifacts": {"scene_glb": str(out_glb), "lods": lods},
+                        "provenance": self._provenance(cache),
+                    }
+
+        seeds = self.scene_index.load_refs(match[0]) if cache["status"] == "seed" and source == "sdxl" else None
+        checkpoint("env.refs")
+        with span("env.refs", num_refs=self.num_refs):
+            images = self._ref_images(prompt, seeds)
 
-        groups: List[List[str]] = []
         # For now, just use single views (Zero123++ not implemented yet)
-        groups = [[str(p)] for p in ref_paths]
-
-        mesh_paths: List[str] = []
-        for idx, views in enumerate(groups):
-            # For now, create placeholder mesh files
-            mesh_stem = meshes_dir / f"asset_{idx}"
-            mesh_stem.parent.mkdir(parents=True, exist_ok=True)
-            mpath = str(mesh_stem) + ".obj"
-            # Create minimal OBJ file
-            with open(mpath, "w") as f:
-                f.write("# Minimal OBJ stub\nv 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n")
-            mesh_paths.append(mpath)
-
-        # For now, just create a simple GLB file
-        try:
-            import trimesh
-            # Create a simple scene with basic geometry
-            scene = trimesh.Scene()
-            for i, mesh_path in enumerate(mesh_paths):
-                if Path(mesh_path).exists():
-                    try:
-                        mesh = trimesh.load(mesh_path)
-                        if hasattr(mesh, 'geometry'):
-                            for _, geom in mesh.geometry.items():
-                                scene.add_geometry(geom)
-                        else:
-                            scene.add_geometry(mesh)
-                    except Exception:
-                        pass
-            
-            # Export to GLB
-            scene.export(str(out_glb))
-        except ImportError:
-            # Fallback: create minimal GLB
-            out_glb.write_bytes(b'glTF\x02\x00\x00\x00\x08\x00\x00\x00JSON{"asset":{"version":"2.0"},"scene":0,"scenes":[{"nodes":0}],"nodes":[{"mesh":0}],"meshes":[{"primitives":[{"attributes":{"POSITION":0},"indices":1}]}],"accessors":[{"bufferView":0,"componentType":5126,"count":3,"type":"VEC3","max":[1,1,0],"min":[0,0,0]},{"bufferView":1,"componentType":5123,"count":3,"type":"SCALAR"}],"bufferViews":[{"buffer":0,"byteOffset":0,"byteLength":36},{"buffer":0,"byteOffset":36,"byteLength":6}],"buffers":[{"byteLength":42}]}\x00\x00\x00\x00')
+        groups: List[List[Any]] = [[img] for img in images]
+
+        with span("env.meshing", groups=len(groups)):
+            # For now, placeholder meshes; kept as arrays, never round-tripped through OBJ text
+            meshes = [placeholder_mesh() for _ in groups]
+
+        checkpoint("env.export")
+        timeline = None
+        if self.timeline_fps > 0:
+            # Plans without a camera get the CameraSpec defaults
+            timeline = {"camera": scene_plan.get("camera"), "audio": scene_plan.get("audio"), "fps": self.timeline_fps}
+
+        with span("env.export"):
+            lods = write_scene_lods(meshes, job_root, self.coarse_faces, self.glb_chunks, timeline=timeline)
+
+        for entry in lods:
+            record_artifact(entry["name"], entry["path"])
+
+        if self.scene_reuse:
+            try:
+                with span("env.scene_index"):
+                    self.scene_index.add(
+                        scene_plan, lods, images if source == "sdxl" else (), source=source, model_id=self.model_id
+                    )
+            except OSError as e:
+                print(f"Scene not indexed ({e})")
+
+        # scene_glb stays the full-detail scene; lods lists every file coarse first
+        artifacts: Dict[str, Any] = {"scene_glb": str(out_glb), "lods": lods}
+        if self.debug_artifacts:
+            artifacts["refs"] = self._save_debug(job_root, images, meshes)
+
+        workspace.finish(job_root)
+        return {"artifacts": artifacts, "provenance": self._provenance(cache)}
 
+    def _provenance(self, cache: Dict[str, Any]) -> Dict[str, Any]:
         return {
-            "artifacts": {"scene_glb": str(out_glb)},
-            "provenance": {
-                "name": "env/triposr_fast",
-                "version": "0.2.0",
-                "components": {
-                    "sdxl": "stabilityai/sdxl-base-1.0" if self.pipe is not None else "stub",
-                    "triposr": "facebookresearch/TripoSR",
-                    "zero123pp": "enabled" if (self.enable_zero123 and self.zero123_ckpt) else "optional",
-                },
+            "name": "env/triposr_fast",
+            "version": "0.3.0",
+            "components": {
+                "sdxl": self.model_id if self.pipe is not None else "stub",
+                "triposr": "facebookresearch/TripoSR",
+                "zero123pp": "enabled" if (self.enable_zero123 and self.zero123_ckpt) else "optional",
             },
+            "cache": cache,
+            **({"runtime": self.runtime_stats} if self.runtime_stats else {}),
         }
@@ -1,16 +1,52 @@
+from importlib import import_module
+from typing import Dict, Tuple, Union
 
-from .env_stub import Env_Stub
-from .env_triposr_fast import Env_TripoSR_Fast
-from .motion_mdm_base import Motion_MDM_Base
-from .audio_musicgen_small import Audio_MusicGen_Small
-
-PROVIDERS = {
-  ("env","stub"): Env_Stub,  # Default for testing
-  ("env","sdxl_triposr"): Env_TripoSR_Fast,
-  ("motion","mdm_base"):   Motion_MDM_Base,
-  ("audio","musicgen_small"): Audio_MusicGen_Small,
+# (stage, name) -> "module:Class". Provider modules (and their heavy deps) are
+# only imported the first time get_provider asks for them.
+PROVIDERS: Dict[Tuple[str, str], Union[str, type]] = {
+  ("env","stub"): "shared.providers.env_stub:Env_Stub",  # Default for testing
+  ("env","sdxl_triposr"): "shared.providers.env_triposr_fast:Env_TripoSR_Fast",
+  ("motion","mdm_base"):   "shared.providers.motion_mdm_base:Motion_MDM_Base",
+  ("audio","musicgen_small"): "shared.providers.audio_musicgen_small:Audio_MusicGen_Small",
 }
 
+# Third-party providers register as "<stage>.<name> = module:Class"
+ENTRY_POINT_GROUP = "mmf.providers"
+_entry_points_loaded = False
+
+
+def register_provider(stage: str, name: str, target: Union[str, type]) -> None:
+    PROVIDERS[(stage, name)] = target
+
+
+def _load_entry_points() -> None:
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+    try:
+        from importlib.metadata import entry_points
+        eps = entry_points(group=ENTRY_POINT_GROUP)
+    except Exception:
+        return
+    for ep in eps:
+        stage, _, name = ep.name.partition(".")
+        if name:
+            PROVIDERS.setdefault((stage, name), ep.value)
+
+
+def resolve_provider(stage: str, name: str) -> type:
+    key = (stage, name)
+    if key not in PROVIDERS:
+        _load_entry_points()
+    target = PROVIDERS[key]
+    if isinstance(target, str):
+        module_name, _, attr = target.partition(":")
+        target = getattr(import_module(module_name), attr)
+        PROVIDERS[key] = target
+    return target
+
+
 def get_provider(stage: str, name: str, version: str, cfg=None):
-    cls = PROVIDERS[(stage, name)]
+    cls = resolve_provider(stage, name)
     return cls(weights_dir=None, cfg=cfg)
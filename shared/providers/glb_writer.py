@@ -0,0 +1,332 @@
+"""Streaming GLB 2.0 writer.
+
+Geometry is registered by reference: ``GLBWriter`` records buffer views over
+the caller's arrays and only computes offsets. ``write_to`` then emits the
+12-byte header, the JSON chunk and the BIN chunk view by view with the
+4-byte alignment and padding the spec requires, so exporting never holds a
+second copy of the scene. Any number of source arrays (from any number of
+meshes) are streamed into the single GLB buffer.
+
+Works with numpy arrays, ``array.array`` or plain nested lists; numpy is not
+required.
+"""
+import array
+import json
+import struct
+import sys
+from typing import Any, BinaryIO, Dict, List, Optional, Sequence, Tuple, Union
+
+GLB_MAGIC = 0x46546C67  # b"glTF"
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+FLOAT = 5126
+UNSIGNED_INT = 5125
+UNSIGNED_SHORT = 5123
+
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+_TYPECODES = {FLOAT: "f", UNSIGNED_INT: "I", UNSIGNED_SHORT: "H"}
+_COMPONENT_BYTES = {FLOAT: 4, UNSIGNED_INT: 4, UNSIGNED_SHORT: 2}
+_NUMPY_DTYPES = {FLOAT: "<f4", UNSIGNED_INT: "<u4", UNSIGNED_SHORT: "<u2"}
+
+
+def _pad4(n: int) -> int:
+    return (4 - n % 4) % 4
+
+
+def _flatten(rows: Any) -> List[Any]:
+    out: List[Any] = []
+    for r in rows:
+        if isinstance(r, (list, tuple)):
+            out.extend(r)
+        else:
+            out.append(r)
+    return out
+
+
+def as_buffer(data: Any, component_type: int) -> Tuple[memoryview, Any]:
+    """
+    Little-endian byte view of ``data`` in ``component_type`` plus the object
+    that owns the memory. numpy arrays already in the right dtype and layout
+    are not copied.
+    """
+    try:
+        import numpy as np
+        if isinstance(data, np.ndarray):
+            arr = np.ascontiguousarray(data, dtype=_NUMPY_DTYPES[component_type])
+            return memoryview(arr).cast("B"), arr
+    except ImportError:
+        pass
+    if isinstance(data, array.array) and data.typecode == _TYPECODES[component_type]:
+        arr = data
+    else:
+        arr = array.array(_TYPECODES[component_type], _flatten(data))
+    if sys.byteorder != "little":  # pragma: no cover
+        arr = array.array(arr.typecode, arr)
+        arr.byteswap()
+    return memoryview(arr).cast("B"), arr
+
+
+def _bounds(owner: Any, width: int) -> Tuple[List[float], List[float]]:
+    try:
+        import numpy as np
+        if isinstance(owner, np.ndarray):
+            v = owner.reshape(-1, width)
+            if len(v):
+                return v.min(axis=0).tolist(), v.max(axis=0).tolist()
+            return [0.0] * width, [0.0] * width
+    except ImportError:
+        pass
+    lo, hi = [float("inf")] * width, [float("-inf")] * width
+    for i, x in enumerate(owner):
+        c = i % width
+        lo[c] = min(lo[c], x)
+        hi[c] = max(hi[c], x)
+    if lo[0] == float("inf"):
+        return [0.0] * width, [0.0] * width
+    return lo, hi
+
+
+class GLBWriter:
+    def __init__(self, generator: str = "mmf-glb-writer") -> None:
+        self.gltf: Dict[str, Any] = {"asset": {"version": "2.0", "generator": generator}, "scene": 0}
+        self._views: List[memoryview] = []
+        self._owners: List[Any] = []  # keep source arrays alive until written
+        self._bin_length = 0
+        self._root_nodes: List[int] = []
+        self.scene_extras: Dict[str, Any] = {}
+
+    def _list(self, key: str) -> List[Dict[str, Any]]:
+        return self.gltf.setdefault(key, [])
+
+    def add_buffer_view(self, data: Any, component_type: int, target: Optional[int] = None) -> Tuple[int, Any]:
+        """Register ``data`` as a buffer view; returns (view index, owner array)."""
+        view, owner = as_buffer(data, component_type)
+        self._bin_length += _pad4(self._bin_length)
+        entry: Dict[str, Any] = {"buffer": 0, "byteOffset": self._bin_length, "byteLength": view.nbytes}
+        if target is not None:
+            entry["target"] = target
+        views = self._list("bufferViews")
+        views.append(entry)
+        self._views.append(view)
+        self._owners.append(owner)
+        self._bin_length += view.nbytes
+        return len(views) - 1, owner
+
+    def add_accessor(
+        self,
+        data: Any,
+        component_type: int,
+        accessor_type: str,
+        target: Optional[int] = None,
+        with_bounds: bool = False,
+    ) -> int:
+        width = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4}[accessor_type]
+        view_idx, owner = self.add_buffer_view(data, component_type, target)
+        count = self.gltf["bufferViews"][view_idx]["byteLength"] // _COMPONENT_BYTES[component_type] // width
+        accessor: Dict[str, Any] = {
+            "bufferView": view_idx,
+            "componentType": component_type,
+            "count": count,
+            "type": accessor_type,
+        }
+        if with_bounds:
+            accessor["min"], accessor["max"] = _bounds(owner, width)
+        accessors = self._list("accessors")
+        accessors.append(accessor)
+        return len(accessors) - 1
+
+    def add_node(self, node: Dict[str, Any], root: bool = True) -> int:
+        nodes = self._list("nodes")
+        nodes.append(node)
+        if root:
+            self._root_nodes.append(len(nodes) - 1)
+        return len(nodes) - 1
+
+    def add_mesh(
+        self,
+        vertices: Any,
+        faces: Any,
+        name: Optional[str] = None,
+        translation: Optional[Sequence[float]] = None,
+    ) -> int:
+        """Add a triangle mesh as its own node; returns the node index."""
+        position = self.add_accessor(vertices, FLOAT, "VEC3", ARRAY_BUFFER, with_bounds=True)
+        indices = self.add_accessor(faces, UNSIGNED_INT, "SCALAR", ELEMENT_ARRAY_BUFFER)
+        meshes = self._list("meshes")
+        mesh: Dict[str, Any] = {"primitives": [{"attributes": {"POSITION": position}, "indices": indices}]}
+        if name:
+            mesh["name"] = name
+        meshes.append(mesh)
+        node: Dict[str, Any] = {"mesh": len(meshes) - 1}
+        if name:
+            node["name"] = name
+        if translation is not None and any(translation):
+            node["translation"] = [float(t) for t in translation]
+        return self.add_node(node)
+
+    def add_camera(
+        self,
+        translation: Sequence[float] = (0.0, 0.0, 0.0),
+        rotation: Sequence[float] = (0.0, 0.0, 0.0, 1.0),
+        yfov: float = 0.9,
+        znear: float = 0.05,
+        name: str = "camera",
+    ) -> int:
+        """Add a perspective camera node; returns the node index."""
+        cameras = self._list("cameras")
+        cameras.append({"type": "perspective", "perspective": {"yfov": yfov, "znear": znear}})
+        node = {
+            "name": name,
+            "camera": len(cameras) - 1,
+            "translation": [float(t) for t in translation],
+            "rotation": [float(r) for r in rotation],
+        }
+        return self.add_node(node)
+
+    def add_animation(
+        self,
+        channels: Sequence[Tuple[int, str, Any, Any]],
+        name: Optional[str] = None,
+        interpolation: str = "LINEAR",
+    ) -> int:
+        """
+        Add one animation from (node, path, times, values) channels, path being
+        "translation", "rotation" or "scale". Channels passing the same
+        ``times`` object share one input accessor.
+        """
+        inputs: Dict[int, int] = {}
+        samplers: List[Dict[str, Any]] = []
+        targets: List[Dict[str, Any]] = []
+        for node, path, times, values in channels:
+            if id(times) not in inputs:
+                # glTF requires min/max on animation inputs
+                inputs[id(times)] = self.add_accessor(times, FLOAT, "SCALAR", with_bounds=True)
+            output = self.add_accessor(values, FLOAT, "VEC4" if path == "rotation" else "VEC3")
+            samplers.append({"input": inputs[id(times)], "output": output, "interpolation": interpolation})
+            targets.append({"sampler": len(samplers) - 1, "target": {"node": node, "path": path}})
+        animation: Dict[str, Any] = {"samplers": samplers, "channels": targets}
+        if name:
+            animation["name"] = name
+        animations = self._list("animations")
+        animations.append(animation)
+        return len(animations) - 1
+
+    def scene_bounds(self) -> Optional[Tuple[List[float], List[float]]]:
+        """World-space (min, max) over root mesh nodes, from accessor bounds; None when empty."""
+        lo, hi = [float("inf")] * 3, [float("-inf")] * 3
+        for idx in self._root_nodes:
+            node = self.gltf["nodes"][idx]
+            if "mesh" not in node:
+                continue
+            acc = self.gltf["accessors"][self.gltf["meshes"][node["mesh"]]["primitives"][0]["attributes"]["POSITION"]]
+            t = node.get("translation", [0.0, 0.0, 0.0])
+            for c in range(3):
+                lo[c] = min(lo[c], acc["min"][c] + t[c])
+                hi[c] = max(hi[c], acc["max"][c] + t[c])
+        return (lo, hi) if lo[0] != float("inf") else None
+
+    def _json_chunk(self) -> bytes:
+        doc = dict(self.gltf)
+        doc["scenes"] = [{"nodes": list(self._root_nodes)}] if self._root_nodes else [{}]
+        if self.scene_extras:
+            doc["scenes"][0]["extras"] = self.scene_extras
+        if self._bin_length:
+            doc["buffers"] = [{"byteLength": self._bin_length}]
+        raw = json.dumps(doc, separators=(",", ":")).encode("utf-8")
+        return raw + b" " * _pad4(len(raw))
+
+    def _layout(self) -> Tuple[bytes, int, int]:
+        json_chunk = self._json_chunk()
+        bin_padded = self._bin_length + _pad4(self._bin_length)
+        total = 12 + 8 + len(json_chunk) + (8 + bin_padded if self._bin_length else 0)
+        return json_chunk, bin_padded, total
+
+    def byte_length(self) -> int:
+        """Total file size, known before any geometry byte is written."""
+        return self._layout()[2]
+
+    def write_to(self, sink: BinaryIO) -> int:
+        """Stream the GLB into ``sink`` (anything with ``write``); returns bytes written."""
+        json_chunk, bin_padded, total = self._layout()
+        sink.write(struct.pack("<III", GLB_MAGIC, 2, total))
+        sink.write(struct.pack("<II", len(json_chunk), CHUNK_JSON))
+        sink.write(json_chunk)
+        if self._bin_length:
+            sink.write(struct.pack("<II", bin_padded, CHUNK_BIN))
+            offset = 0
+            for view in self._views:
+                pad = _pad4(offset)
+                if pad:
+                    sink.write(b"\x00" * pad)
+                    offset += pad
+                sink.write(view)
+                offset += view.nbytes
+            if bin_padded > offset:
+                sink.write(b"\x00" * (bin_padded - offset))
+        return total
+
+    def write(self, path: Union[str, Any]) -> int:
+        with open(path, "wb") as f:
+            return self.write_to(f)
+
+    def to_bytes(self) -> bytes:
+        import io
+        buf = io.BytesIO()
+        self.write_to(buf)
+        return buf.getvalue()
+
+
+class S3MultipartSink:
+    """
+    File-like sink that uploads to S3 with multipart upload, holding at most
+    one part in memory. Aborts the upload if the block raises.
+
+        with S3MultipartSink(s3, bucket, key) as sink:
+            writer.write_to(sink)
+    """
+
+    MIN_PART = 5 * 1024 * 1024  # S3 minimum for every part but the last
+
+    def __init__(self, s3: Any, bucket: str, key: str, part_size: int = 8 * 1024 * 1024,
+                 content_type: str = "model/gltf-binary") -> None:
+        self.s3, self.bucket, self.key = s3, bucket, key
+        self.part_size = max(part_size, self.MIN_PART)
+        self.content_type = content_type
+        self._buf = bytearray()
+        self._parts: List[Dict[str, Any]] = []
+        self._upload_id: Optional[str] = None
+
+    def __enter__(self) -> "S3MultipartSink":
+        resp = self.s3.create_multipart_upload(Bucket=self.bucket, Key=self.key, ContentType=self.content_type)
+        self._upload_id = resp["UploadId"]
+        return self
+
+    def write(self, data: Any) -> int:
+        view = memoryview(data).cast("B")
+        self._buf += view
+        while len(self._buf) >= self.part_size:
+            self._flush(self.part_size)
+        return view.nbytes
+
+    def _flush(self, n: int) -> None:
+        chunk = bytes(self._buf[:n])
+        del self._buf[:n]
+        number = len(self._parts) + 1
+        resp = self.s3.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, PartNumber=number, Body=chunk
+        )
+        self._parts.append({"PartNumber": number, "ETag": resp["ETag"]})
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            return
+        if self._buf or not self._parts:
+            self._flush(len(self._buf))
+        self.s3.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+            MultipartUpload={"Parts": self._parts},
+        )
@@ -1,6 +1,153 @@
 import subprocess
 from pathlib import Path
-from typing import List
+from typing import Any, BinaryIO, Dict, List, Optional, Sequence, Union
+
+from .glb_writer import GLBWriter
+
+# Meshes move between stages as {"vertices": (N, 3) float32, "faces": (M, 3) uint32}
+# arrays; only the final GLB (and debug output on request) touches disk.
+Mesh = Dict[str, Any]
+
+_TRI_VERTICES = [[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]
+_TRI_FACES = [[0, 1, 2]]
+
+
+def placeholder_mesh() -> Mesh:
+    """Single triangle used where a reconstruction is not available."""
+    try:
+        import numpy as np
+        return {
+            "vertices": np.array(_TRI_VERTICES, dtype=np.float32),
+            "faces": np.array(_TRI_FACES, dtype=np.uint32),
+        }
+    except ImportError:
+        return {"vertices": [list(v) for v in _TRI_VERTICES], "faces": [list(f) for f in _TRI_FACES]}
+
+
+def scene_writer(meshes: Sequence[Mesh], spread: float = 0.5) -> GLBWriter:
+    """
+    Build a GLB writer over in-memory meshes without copying their arrays.
+    Each mesh is its own node, offset by ``spread`` along X so assets are not
+    co-located.
+    """
+    writer = GLBWriter()
+    for i, m in enumerate(meshes):
+        writer.add_mesh(m["vertices"], m["faces"], name=f"asset_{i}", translation=(i * spread, 0.0, 0.0))
+    return writer
+
+
+def write_glb(meshes: Sequence[Mesh], sink: Union[str, Path, BinaryIO], spread: float = 0.5) -> int:
+    """Stream meshes as GLB to a path or a writable sink; returns bytes written."""
+    writer = scene_writer(meshes, spread)
+    if isinstance(sink, (str, Path)):
+        Path(sink).parent.mkdir(parents=True, exist_ok=True)
+        return writer.write(sink)
+    return writer.write_to(sink)
+
+
+def pack_glb(meshes: Sequence[Mesh], spread: float = 0.5) -> memoryview:
+    """GLB bytes for in-memory meshes (prefer ``write_glb`` for large scenes)."""
+    return memoryview(scene_writer(meshes, spread).to_bytes())
+
+
+def face_count(mesh: Mesh) -> int:
+    return len(mesh["faces"])
+
+
+def box_proxy(mesh: Mesh) -> Mesh:
+    """Axis-aligned bounding box of ``mesh`` as 12 triangles (coarsest LOD)."""
+    try:
+        import numpy as np
+        v = np.asarray(mesh["vertices"], dtype=np.float32).reshape(-1, 3)
+        lo, hi = (v.min(axis=0).tolist(), v.max(axis=0).tolist()) if len(v) else ([0.0] * 3, [0.0] * 3)
+    except ImportError:
+        rows = [list(r) for r in mesh["vertices"]] or [[0.0, 0.0, 0.0]]
+        lo = [min(r[c] for r in rows) for c in range(3)]
+        hi = [max(r[c] for r in rows) for c in range(3)]
+    corners = [[(hi if i & 1 else lo)[0], (hi if i & 2 else lo)[1], (hi if i & 4 else lo)[2]] for i in range(8)]
+    faces = [
+        [0, 2, 1], [1, 2, 3], [4, 5, 6], [5, 7, 6],  # -z, +z
+        [0, 1, 4], [1, 5, 4], [2, 6, 3], [3, 6, 7],  # -y, +y
+        [0, 4, 2], [2, 4, 6], [1, 3, 5], [3, 7, 5],  # -x, +x
+    ]
+    return {"vertices": corners, "faces": faces}
+
+
+def simplify_mesh(mesh: Mesh, target_faces: int) -> Mesh:
+    """
+    Reduce ``mesh`` to about ``target_faces`` triangles. Meshes already under
+    the target are returned as-is; without trimesh the box proxy is used.
+    """
+    if face_count(mesh) <= target_faces:
+        return mesh
+    try:
+        tm = _to_trimesh(mesh)
+        low = tm.simplify_quadric_decimation(face_count=target_faces)
+        if len(low.faces):
+            return {"vertices": low.vertices, "faces": low.faces}
+    except Exception:
+        pass
+    return box_proxy(mesh)
+
+
+def write_scene_lods(
+    meshes: Sequence[Mesh],
+    out_dir: Path,
+    coarse_faces: int = 512,
+    chunks: bool = False,
+    spread: float = 0.5,
+    timeline: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Write the scene at two levels of detail plus, optionally, one GLB per
+    object. Returns entries ordered coarse first, each with ``name``, ``file``
+    (relative to ``out_dir``), ``path``, ``lod`` and ``bytes``:
+
+      scene_lod0.glb      every object reduced to <= ``coarse_faces`` triangles
+      scene.glb           full detail (the ``scene_glb`` artifact)
+      chunks/asset_i.glb  full-detail objects, placed as in the full scene
+
+    ``timeline`` ({"camera": CameraSpec, "audio": AudioSpec, "fps": int})
+    adds the animated camera and sync markers to both scene files.
+    """
+    out_dir = Path(out_dir)
+    coarse = [simplify_mesh(m, coarse_faces) for m in meshes]
+    plan = [("scene_lod0", "scene_lod0.glb", 0, scene_writer(coarse, spread), {})]
+    plan.append(("scene_glb", "scene.glb", 1, scene_writer(meshes, spread), {}))
+    if timeline is not None:
+        from .timeline import TIMELINE_FPS, add_timeline
+        for _, _, _, writer, _ in plan:
+            add_timeline(writer, timeline.get("camera"), timeline.get("audio"), timeline.get("fps", TIMELINE_FPS))
+    if chunks:
+        for i, m in enumerate(meshes):
+            w = GLBWriter()
+            w.add_mesh(m["vertices"], m["faces"], name=f"asset_{i}", translation=(i * spread, 0.0, 0.0))
+            plan.append((f"chunk_{i}", f"chunks/asset_{i}.glb", 1, w, {"object": f"asset_{i}"}))
+    entries: List[Dict[str, Any]] = []
+    for name, rel, lod, writer, extra in plan:
+        path = out_dir / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        size = writer.write(path)
+        entries.append({"name": name, "file": rel, "path": str(path), "lod": lod, "bytes": size, **extra})
+    return entries
+
+
+def load_mesh(path: str) -> Optional[Mesh]:
+    """Read a mesh file into arrays (for callers that still hold file paths)."""
+    try:
+        import trimesh
+        m = trimesh.load(path, force="mesh")
+        return {"vertices": m.vertices, "faces": m.faces}
+    except Exception:
+        return None
+
+
+def write_obj(mesh: Mesh, path: Path) -> None:
+    """Debug dump of an in-memory mesh."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = [f"v {v[0]} {v[1]} {v[2]}" for v in mesh["vertices"]]
+    lines += [f"f {f[0] + 1} {f[1] + 1} {f[2] + 1}" for f in mesh["faces"]]
+    path.write_text("\n".join(lines) + "\n")
 
 
 def triposr_single_image_to_mesh(image_path: str, out_stem: Path) -> str:
@@ -103,36 +250,8 @@ def zero123_novel_views(image_path: Path, out_dir: Path, ckpt: str, device: str
 
 def clean_and_pack_glb(mesh_paths: List[str], out_glb_path: Path) -> None:
     """
-    Merge meshes and export GLB using trimesh when available. If trimesh not
-    available, write a small stub file to indicate placeholder content.
+    Merge mesh files into one GLB, streamed to ``out_glb_path``. Files that
+    cannot be read (or no trimesh) are skipped, leaving a valid empty scene.
     """
-    try:
-        import trimesh
-
-        scene = trimesh.Scene()
-        for mp in mesh_paths:
-            m = trimesh.load(mp, force="mesh")
-            if not isinstance(m, trimesh.Trimesh) and hasattr(m, "geometry"):
-                for _, g in m.geometry.items():
-                    scene.add_geometry(g)
-            else:
-                scene.add_geometry(m)
-
-        # Simple spread so assets are not co-located
-        for i, geom in enumerate(scene.geometry):
-            T = trimesh.transformations.translation_matrix((i * 0.5, 0, 0))
-            geom.apply_transform(T)
-
-        combined = trimesh.util.concatenate(
-            [g for g in scene.geometry if isinstance(g, trimesh.Trimesh)]
-        )
-        out_glb_path.parent.mkdir(parents=True, exist_ok=True)
-        combined.export(out_glb_path)
-    except Exception:
-        # Fallback: create a minimal GLB stub
-        out_glb_path.parent.mkdir(parents=True, exist_ok=True)
-        minimal_glb = b'glTF\x02\x00\x00\x00\x08\x00\x00\x00JSON{"asset":{"version":"2.0"},"scene":0,"scenes":[{"nodes":[]}],"nodes":[],"meshes":[],"accessors":[],"bufferViews":[],"buffers":[]}\x00\x00\x00\x00'
-        with open(out_glb_path, "wb") as f:
-            f.write(minimal_glb)
-
-
+    meshes = [m for m in (load_mesh(mp) for mp in mesh_paths) if m is not None]
+    write_glb(meshes, out_glb_path)
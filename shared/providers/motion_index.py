@@ -0,0 +1,164 @@
+"""On-disk retrieval index of motion clips, keyed by motion text.
+
+Layout under ``MOTION_INDEX_DIR``::
+
+    index.json          [{"id", "text", "key", "rig", "path", "format", "source", "duration_s", "vector", "backend"}]
+    clips/<sha256>.ext  clip files, content-addressed
+
+Lookups try the normalised text first (exact), then cosine similarity of
+text embeddings (see ``shared.embeddings``). Clips dropped into
+``MOTION_LIBRARY_DIR`` named after their motion ("walk_cautiously.bvh") are
+indexed on the next lookup after the directory's mtime changes. Writers take an flock on ``index.lock`` and replace
+``index.json`` atomically, so several workers can share one directory.
+"""
+import hashlib
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from shared import embeddings
+from shared.serialization import dumpb, loads
+
+MOTION_INDEX_DIR = os.getenv("MOTION_INDEX_DIR", "/app/cache/motion")
+MOTION_LIBRARY_DIR = os.getenv("MOTION_LIBRARY_DIR", "")
+MOTION_MATCH_THRESHOLD = float(os.getenv("MOTION_MATCH_THRESHOLD", "0.8"))
+
+CLIP_SUFFIXES = (".bvh", ".fbx", ".npy", ".json", ".glb")
+
+
+class MotionIndex:
+    def __init__(self, root: Optional[str] = None, library: Optional[str] = None,
+                 threshold: float = MOTION_MATCH_THRESHOLD) -> None:
+        self.root = Path(root or MOTION_INDEX_DIR)
+        self.library = Path(library) if library else (Path(MOTION_LIBRARY_DIR) if MOTION_LIBRARY_DIR else None)
+        self.threshold = threshold
+        self._entries: Optional[List[Dict[str, Any]]] = None
+        self._mtime = 0.0
+        self._library_mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    # --- persistence ---
+
+    @property
+    def _index_path(self) -> Path:
+        return self.root / "index.json"
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.root / "index.lock", "a") as fh:
+            try:
+                import fcntl
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            except ImportError:  # pragma: no cover - Windows: in-process lock only
+                pass
+            yield
+
+    def _read(self) -> List[Dict[str, Any]]:
+        try:
+            return loads(self._index_path.read_bytes())
+        except (OSError, ValueError):
+            return []
+
+    def _save(self, entries: List[Dict[str, Any]]) -> None:
+        tmp = self._index_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(dumpb(entries))
+        os.replace(tmp, self._index_path)
+        self._entries, self._mtime = entries, self._index_path.stat().st_mtime
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Current entries; re-read when another process changed the file or clips were added to the library."""
+        try:
+            mtime = self._index_path.stat().st_mtime
+        except OSError:
+            mtime = 0.0
+        if self._entries is None or mtime != self._mtime:
+            self._entries, self._mtime = self._read(), mtime
+            self._library_mtime = None
+        if self.library is not None:
+            # Adding or renaming a clip bumps the directory's mtime
+            try:
+                library_mtime: Optional[float] = self.library.stat().st_mtime
+            except OSError:
+                library_mtime = None
+            if library_mtime is not None and library_mtime != self._library_mtime:
+                self._index_library()
+                self._library_mtime = library_mtime
+        return self._entries
+
+    def _index_library(self) -> None:
+        known = {e["path"] for e in self._entries or []}
+        new = [p for p in sorted(self.library.iterdir()) if p.suffix in CLIP_SUFFIXES and str(p) not in known]
+        if not new:
+            return
+        with self._write_lock():
+            entries = self._read()
+            # Another worker may have indexed the same clips since our last read
+            known = {e["path"] for e in entries}
+            for p in (p for p in new if str(p) not in known):
+                # Library clips are referenced in place, not copied
+                entries.append(self._entry(p.stem.replace("_", " "), p, "library", rig="humanoid"))
+            self._save(entries)
+
+    # --- lookup / insert ---
+
+    @staticmethod
+    def _entry(text: str, path: Path, source: str, rig: str, duration_s: Optional[float] = None) -> Dict[str, Any]:
+        return {
+            "id": hashlib.sha1(f"{text}|{path}".encode("utf-8")).hexdigest()[:12],
+            "text": text,
+            "key": embeddings.normalize(text),
+            "rig": rig,
+            "path": str(path),
+            "format": path.suffix.lstrip("."),
+            "source": source,
+            "duration_s": duration_s,
+            "vector": embeddings.embed(text),
+            "backend": embeddings.backend(),
+        }
+
+    def lookup(self, text: str, rig: str = "humanoid",
+               sources: Optional[Iterable[str]] = None) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Best clip for ``text`` as (entry, score), or None below the threshold."""
+        allowed = set(sources) if sources is not None else None
+        candidates = [
+            e for e in self.entries()
+            if e.get("rig") == rig and (allowed is None or e["source"] in allowed) and os.path.exists(e["path"])
+        ]
+        key = embeddings.normalize(text)
+        for e in candidates:
+            if e["key"] == key:
+                return e, 1.0
+        backend = embeddings.backend()
+        query = embeddings.embed(text)
+        best, best_score = None, 0.0
+        for e in candidates:
+            if e.get("backend") != backend:
+                continue
+            score = embeddings.cosine(query, e["vector"])
+            if score > best_score:
+                best, best_score = e, score
+        if best is not None and best_score >= self.threshold:
+            return best, best_score
+        return None
+
+    def add(self, text: str, clip: Path, rig: str = "humanoid", duration_s: Optional[float] = None,
+            source: str = "generated") -> Dict[str, Any]:
+        """Copy ``clip`` into the index (content-addressed) and record it under ``text``."""
+        h = hashlib.sha256()
+        with open(clip, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        dest = self.root / "clips" / f"{h.hexdigest()}{Path(clip).suffix}"
+        with self._write_lock():
+            if not dest.exists():
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(clip, dest)
+            entries = self._read()
+            entry = self._entry(text, dest, source, rig, duration_s)
+            entries = [e for e in entries if e["id"] != entry["id"]] + [entry]
+            self._save(entries)
+        return entry
@@ -0,0 +1,117 @@
+"""Cache of SDXL prompt embeddings, keyed by model and prompt text.
+
+Env prompts are built from three ``EnvSpec`` fields, so most jobs repeat a
+prompt that both SDXL text encoders have already seen. ``get`` returns the
+``prompt_embeds`` / ``pooled_prompt_embeds`` (and negative) kwargs for the
+pipeline call, running ``pipe.encode_prompt`` only on a miss.
+
+Entries live in a per-process LRU (``PROMPT_CACHE_SIZE``) as CPU tensors and
+are moved to the pipeline's device on use. With ``PROMPT_CACHE_DIR`` set,
+misses are also written as ``<key>.safetensors`` (atomic rename) and read
+back by other workers and later processes.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "64"))
+PROMPT_CACHE_DIR = os.getenv("PROMPT_CACHE_DIR", "")
+
+# Order of pipe.encode_prompt()'s return tuple; also the pipeline kwarg names
+FIELDS = ("prompt_embeds", "negative_prompt_embeds", "pooled_prompt_embeds", "negative_pooled_prompt_embeds")
+
+Embeds = Dict[str, Any]
+
+
+def cache_key(model_id: str, prompt: str, variant: str = "") -> str:
+    """``variant`` separates encodings that differ for the same text (dtype, CFG)."""
+    return hashlib.sha256(f"{model_id}\0{variant}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+class PromptEmbedCache:
+    def __init__(self, size: int = PROMPT_CACHE_SIZE, root: Optional[str] = PROMPT_CACHE_DIR) -> None:
+        self.size = size
+        self.root = Path(root) if root else None
+        self._entries: "OrderedDict[str, Embeds]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hit": 0, "disk": 0, "miss": 0}
+
+    def _remember(self, key: str, embeds: Embeds) -> None:
+        with self._lock:
+            self._entries[key] = embeds
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def _load(self, key: str) -> Optional[Embeds]:
+        if self.root is None:
+            return None
+        path = self.root / f"{key}.safetensors"
+        if not path.exists():
+            return None
+        try:
+            from safetensors.torch import load_file
+            tensors = load_file(str(path))
+        except Exception as e:
+            print(f"Prompt embedding cache unreadable ({path.name}: {e}), re-encoding")
+            return None
+        return {name: tensors.get(name) for name in FIELDS}
+
+    def _save(self, key: str, embeds: Embeds) -> None:
+        if self.root is None:
+            return
+        try:
+            from safetensors.torch import save_file
+            self.root.mkdir(parents=True, exist_ok=True)
+            path = self.root / f"{key}.safetensors"
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            save_file({k: v.contiguous() for k, v in embeds.items() if v is not None}, str(tmp))
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"Prompt embedding cache not persisted ({e})")
+
+    def lookup(self, key: str) -> Tuple[Optional[Embeds], str]:
+        """(embeds, source) with source "hit" (memory), "disk" or "miss"."""
+        with self._lock:
+            embeds = self._entries.get(key)
+            if embeds is not None:
+                self._entries.move_to_end(key)
+                return embeds, "hit"
+        embeds = self._load(key)
+        if embeds is not None:
+            self._remember(key, embeds)
+            return embeds, "disk"
+        return None, "miss"
+
+    def get(self, pipe: Any, model_id: str, prompt: str, device: Any,
+            do_cfg: bool = True, variant: str = "") -> Tuple[Embeds, str]:
+        """Pipeline kwargs for ``prompt`` and where they came from."""
+        key = cache_key(model_id, prompt, f"{variant},cfg={int(do_cfg)}")
+        embeds, source = self.lookup(key)
+        if embeds is None:
+            encoded = pipe.encode_prompt(
+                prompt=prompt, device=device, num_images_per_prompt=1, do_classifier_free_guidance=do_cfg
+            )
+            embeds = {name: _to(t, "cpu") for name, t in zip(FIELDS, encoded)}
+            self._remember(key, embeds)
+            self._save(key, embeds)
+        self.stats[source] += 1
+        return {name: _to(t, device) for name, t in embeds.items() if t is not None}, source
+
+
+def _to(t: Any, device: Any) -> Any:
+    return t.to(device) if t is not None and hasattr(t, "to") else t
+
+
+_default: Optional[PromptEmbedCache] = None
+
+
+def default_cache() -> PromptEmbedCache:
+    """The process-wide cache shared by every provider instance."""
+    global _default
+    if _default is None:
+        _default = PromptEmbedCache()
+    return _default
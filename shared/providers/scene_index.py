@@ -0,0 +1,206 @@
+"""On-disk index of generated scenes for near-duplicate reuse.
+
+Layout under ``SCENE_INDEX_DIR``::
+
+    index.json              [{"id", "text", "vector", "backend", "timeline", "source", "model_id", "files", "refs", "created"}]
+    scenes/<id>/...         the scene's GLBs (hard-linked when possible) and refs/ref_<i>.png
+
+Each plan is embedded from its environment and object description (see
+``shared.embeddings``). ``match`` returns the nearest stored scene with a
+mode: ``"reuse"`` at or above ``SCENE_REUSE_THRESHOLD`` when the camera and
+audio (baked into the GLB timeline) are identical, ``"seed"`` at or above
+``SCENE_SEED_THRESHOLD`` when the neighbour kept reference images to start
+img2img from. The index keeps the newest ``SCENE_INDEX_MAX`` scenes.
+Writers take an flock on ``index.lock`` and replace ``index.json``
+atomically, like the motion index.
+"""
+import hashlib
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from shared import embeddings
+from shared.messaging import encode_plan
+from shared.serialization import dumpb, loads
+
+SCENE_INDEX_DIR = os.getenv("SCENE_INDEX_DIR", "/app/cache/scenes")
+SCENE_REUSE_THRESHOLD = float(os.getenv("SCENE_REUSE_THRESHOLD", "0.95"))
+SCENE_SEED_THRESHOLD = float(os.getenv("SCENE_SEED_THRESHOLD", "0.8"))
+SCENE_INDEX_MAX = int(os.getenv("SCENE_INDEX_MAX", "500"))
+
+
+def describe(plan: Dict[str, Any]) -> str:
+    """The text a scene is matched on: environment plus objects and their tags."""
+    env = plan.get("environment") or {}
+    parts = [str(env.get(k, "")) for k in ("theme", "time_of_day", "weather")]
+    for obj in plan.get("objects") or []:
+        parts.append(" ".join([str(obj.get("type", ""))] + [str(t) for t in obj.get("tags") or []]))
+    return " ".join(p.replace("_", " ") for p in parts if p)
+
+
+def timeline_key(plan: Dict[str, Any]) -> str:
+    """Scenes can only be reused verbatim if their baked camera/beat timeline matches."""
+    return hashlib.sha256(encode_plan({"camera": plan.get("camera"), "audio": plan.get("audio")})).hexdigest()[:16]
+
+
+def _link(src: Path, dest: Path) -> None:
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(src, dest)  # same filesystem: no copy, survives the source job's cleanup
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+class SceneIndex:
+    def __init__(self, root: Optional[str] = None, reuse_threshold: float = SCENE_REUSE_THRESHOLD,
+                 seed_threshold: float = SCENE_SEED_THRESHOLD, max_entries: int = SCENE_INDEX_MAX) -> None:
+        self.root = Path(root or SCENE_INDEX_DIR)
+        self.reuse_threshold = reuse_threshold
+        self.seed_threshold = seed_threshold
+        self.max_entries = max_entries
+        self._entries: Optional[List[Dict[str, Any]]] = None
+        self._mtime = 0.0
+        self._lock = threading.Lock()
+
+    # --- persistence ---
+
+    @property
+    def _index_path(self) -> Path:
+        return self.root / "index.json"
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.root / "index.lock", "a") as fh:
+            try:
+                import fcntl
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            except ImportError:  # pragma: no cover - Windows: in-process lock only
+                pass
+            yield
+
+    def _read(self) -> List[Dict[str, Any]]:
+        try:
+            return loads(self._index_path.read_bytes())
+        except (OSError, ValueError):
+            return []
+
+    def _save(self, entries: List[Dict[str, Any]]) -> None:
+        tmp = self._index_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(dumpb(entries))
+        os.replace(tmp, self._index_path)
+        self._entries, self._mtime = entries, self._index_path.stat().st_mtime
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Current entries; re-read only when another process changed the file."""
+        try:
+            mtime = self._index_path.stat().st_mtime
+        except OSError:
+            mtime = 0.0
+        if self._entries is None or mtime != self._mtime:
+            self._entries, self._mtime = self._read(), mtime
+        return self._entries
+
+    # --- lookup / insert ---
+
+    def _scene_dir(self, entry_id: str) -> Path:
+        return self.root / "scenes" / entry_id
+
+    def match(self, plan: Dict[str, Any], sources: Optional[Iterable[str]] = None,
+              model_id: Optional[str] = None) -> Optional[Tuple[Dict[str, Any], float, str]]:
+        """Nearest usable scene as (entry, score, "reuse" | "seed"), or None."""
+        allowed = set(sources) if sources is not None else None
+        backend = embeddings.backend()
+        query = embeddings.embed(describe(plan))
+        tl = timeline_key(plan)
+        scored = []
+        for e in self.entries():
+            if e.get("backend") != backend or (allowed is not None and e.get("source") not in allowed):
+                continue
+            if model_id is not None and e.get("model_id") != model_id:
+                continue
+            score = embeddings.cosine(query, e["vector"])
+            if score >= self.seed_threshold:
+                scored.append((score, e))
+        scored.sort(key=lambda s: s[0], reverse=True)
+        for score, e in scored:
+            files_ok = all((self._scene_dir(e["id"]) / f["file"]).exists() for f in e["files"])
+            if score >= self.reuse_threshold and e.get("timeline") == tl and files_ok:
+                return e, score, "reuse"
+        for score, e in scored:
+            if e.get("refs") and all((self._scene_dir(e["id"]) / r).exists() for r in e["refs"]):
+                return e, score, "seed"
+        return None
+
+    def add(self, plan: Dict[str, Any], lods: Sequence[Dict[str, Any]], refs: Sequence[Any] = (),
+            source: str = "sdxl", model_id: Optional[str] = None) -> Dict[str, Any]:
+        """Store a finished scene's files (and PIL reference images) under a new entry."""
+        text = describe(plan)
+        entry_id = uuid.uuid4().hex[:12]
+        scene_dir = self._scene_dir(entry_id)
+        files = []
+        for lod in lods:
+            _link(Path(lod["path"]), scene_dir / lod["file"])
+            files.append({k: lod[k] for k in ("name", "file", "lod", "object") if k in lod})
+        ref_names = []
+        for i, img in enumerate(refs):
+            if img is None:
+                continue
+            name = f"refs/ref_{i}.png"
+            (scene_dir / "refs").mkdir(parents=True, exist_ok=True)
+            img.save(scene_dir / name)
+            ref_names.append(name)
+        entry = {
+            "id": entry_id,
+            "text": text,
+            "vector": embeddings.embed(text),
+            "backend": embeddings.backend(),
+            "timeline": timeline_key(plan),
+            "source": source,
+            "model_id": model_id,
+            "files": files,
+            "refs": ref_names,
+            "created": time.time(),
+        }
+        with self._write_lock():
+            entries = self._read() + [entry]
+            evicted = entries[:-self.max_entries] if len(entries) > self.max_entries else []
+            self._save(entries[len(evicted):])
+        for old in evicted:
+            shutil.rmtree(self._scene_dir(old["id"]), ignore_errors=True)
+        return entry
+
+    def restore(self, entry: Dict[str, Any], job_root: Path) -> Optional[List[Dict[str, Any]]]:
+        """
+        Link a stored scene's files into ``job_root``; returns LOD entries for
+        the new paths, or None when another worker evicted the scene since
+        ``match`` (nothing is left behind in ``job_root``).
+        """
+        lods = []
+        try:
+            for f in entry["files"]:
+                dest = Path(job_root) / f["file"]
+                _link(self._scene_dir(entry["id"]) / f["file"], dest)
+                lods.append({**f, "path": str(dest), "bytes": dest.stat().st_size})
+        except FileNotFoundError:
+            # Drop partial links: regenerating must not write through them into other scenes
+            for lod in lods:
+                Path(lod["path"]).unlink(missing_ok=True)
+            return None
+        return sorted(lods, key=lambda e: e.get("lod", 0))
+
+    def load_refs(self, entry: Dict[str, Any]) -> List[Any]:
+        """The neighbour's reference images as PIL images (empty without PIL)."""
+        try:
+            from PIL import Image
+        except ImportError:
+            return []
+        try:
+            return [Image.open(self._scene_dir(entry["id"]) / r).convert("RGB") for r in entry.get("refs") or []]
+        except FileNotFoundError:
+            return []  # evicted since match: generate unseeded
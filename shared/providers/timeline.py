@@ -0,0 +1,144 @@
+"""Camera paths and sync timelines, precomputed at packaging time.
+
+``camera_track`` samples a CameraSpec path (dolly / orbit / static) at
+``fps`` over ``duration_s`` into keyframe arrays: times (N,), translations
+(N, 3) and look-at rotations (N, 4, xyzw) aimed at the scene centre. With
+numpy every key is computed in one vectorised pass; tracks are cached by
+(path, duration, fps, bounds), so the LODs of a scene and repeated plans
+reuse the same arrays. ``add_timeline`` writes the track into a GLB as a
+camera node plus a glTF animation, and beat/bar markers from the audio
+tempo as scene extras, so the viewer only plays it back.
+"""
+import math
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .glb_writer import GLBWriter
+
+TIMELINE_FPS = int(os.getenv("TIMELINE_FPS", "30"))
+_CACHE_SIZE = 64
+
+Bounds = Tuple[Sequence[float], Sequence[float]]
+Track = Tuple[Any, Any, Any]  # times, translations, rotations
+
+_tracks: "OrderedDict[Tuple, Track]" = OrderedDict()
+
+
+def _frame(bounds: Optional[Bounds]) -> Tuple[List[float], float]:
+    """Scene centre and a radius that keeps the whole scene in view."""
+    if not bounds:
+        return [0.0, 0.0, 0.0], 1.0
+    lo, hi = bounds
+    centre = [(a + b) / 2.0 for a, b in zip(lo, hi)]
+    half = math.sqrt(sum(((b - a) / 2.0) ** 2 for a, b in zip(lo, hi)))
+    return centre, max(half, 0.5)
+
+
+def _offsets(path: str, u: Any, r: float, trig: Any) -> Tuple[Any, Any, Any]:
+    """Camera offset from the scene centre at normalised time(s) ``u``."""
+    if path == "orbit":
+        theta = 2.0 * math.pi * u
+        return 2.2 * r * trig.sin(theta), 0.45 * r + 0.0 * u, 2.2 * r * trig.cos(theta)
+    if path == "dolly":
+        ease = 0.5 - 0.5 * trig.cos(math.pi * u)
+        return 0.0 * u, r * (0.35 - 0.10 * ease), r * (3.0 - 1.4 * ease)
+    return 0.0 * u, 0.35 * r + 0.0 * u, 2.5 * r + 0.0 * u  # static
+
+
+def _look_at(dx: Any, dy: Any, dz: Any, trig: Any) -> Tuple[Any, Any, Any, Any]:
+    """
+    Quaternion (x, y, z, w) turning glTF's camera forward (-Z) from offset
+    (dx, dy, dz) towards the centre: yaw about Y, then pitch about local X.
+    """
+    dist = trig.sqrt(dx * dx + dy * dy + dz * dz)
+    yaw = trig.arctan2(dx, dz)  # forward is -offset
+    pitch = trig.arcsin(-dy / dist)
+    sy, cy = trig.sin(yaw / 2.0), trig.cos(yaw / 2.0)
+    sp, cp = trig.sin(pitch / 2.0), trig.cos(pitch / 2.0)
+    return cy * sp, sy * cp, -sy * sp, cy * cp
+
+
+def _sample_numpy(np: Any, path: str, duration_s: float, fps: int, centre: List[float], r: float) -> Track:
+    n = 1 if path == "static" else int(round(duration_s * fps)) + 1
+    times = np.linspace(0.0, duration_s, n, dtype=np.float64) if n > 1 else np.zeros(1)
+    u = times / duration_s if duration_s > 0 else times
+    dx, dy, dz = _offsets(path, u, r, np)
+    translations = np.stack([dx + centre[0], dy + centre[1], dz + centre[2]], axis=1).astype(np.float32)
+    rotations = np.stack(_look_at(dx, dy, dz, np), axis=1).astype(np.float32)
+    times = times.astype(np.float32)
+    for a in (times, translations, rotations):
+        a.flags.writeable = False  # shared through the cache
+    return times, translations, rotations
+
+
+class _MathShim:
+    """Scalar stand-in for the numpy functions used above."""
+    sin = staticmethod(math.sin)
+    cos = staticmethod(math.cos)
+    sqrt = staticmethod(math.sqrt)
+    arcsin = staticmethod(math.asin)
+    arctan2 = staticmethod(math.atan2)
+
+
+def _sample_python(path: str, duration_s: float, fps: int, centre: List[float], r: float) -> Track:
+    n = 1 if path == "static" else int(round(duration_s * fps)) + 1
+    times, translations, rotations = [], [], []
+    for i in range(n):
+        t = duration_s * i / (n - 1) if n > 1 else 0.0
+        u = t / duration_s if duration_s > 0 else 0.0
+        dx, dy, dz = _offsets(path, u, r, _MathShim)
+        times.append(t)
+        translations.append([dx + centre[0], dy + centre[1], dz + centre[2]])
+        rotations.append(list(_look_at(dx, dy, dz, _MathShim)))
+    return times, translations, rotations
+
+
+def camera_track(path: str, duration_s: float, bounds: Optional[Bounds] = None, fps: int = TIMELINE_FPS) -> Track:
+    """Keyframes for a camera path; cached by (path, duration, fps, rounded bounds)."""
+    key = (
+        path,
+        round(float(duration_s), 3),
+        int(fps),
+        tuple(round(float(v), 3) for b in bounds for v in b) if bounds else None,
+    )
+    track = _tracks.get(key)
+    if track is not None:
+        _tracks.move_to_end(key)
+        return track
+    centre, r = _frame(bounds)
+    try:
+        import numpy as np
+        track = _sample_numpy(np, path, float(duration_s), int(fps), centre, r)
+    except ImportError:
+        track = _sample_python(path, float(duration_s), int(fps), centre, r)
+    _tracks[key] = track
+    if len(_tracks) > _CACHE_SIZE:
+        _tracks.popitem(last=False)
+    return track
+
+
+def beat_markers(tempo: float, duration_s: float, beats_per_bar: int = 4) -> Dict[str, List[float]]:
+    step = 60.0 / max(float(tempo), 1.0)
+    beats = [round(i * step, 4) for i in range(int(duration_s / step) + 1)]
+    return {"beats_s": beats, "bars_s": beats[::beats_per_bar]}
+
+
+def add_timeline(writer: GLBWriter, camera: Optional[Dict[str, Any]], audio: Optional[Dict[str, Any]] = None,
+                 fps: int = TIMELINE_FPS) -> int:
+    """Add the animated camera and sync markers to ``writer``; returns the camera node."""
+    camera = camera or {}
+    path = camera.get("path", "dolly")
+    duration_s = float(camera.get("duration_s", 8))
+    times, translations, rotations = camera_track(path, duration_s, writer.scene_bounds(), fps)
+    node = writer.add_camera(translations[0], rotations[0], name="camera")
+    if len(times) > 1:
+        writer.add_animation(
+            [(node, "translation", times, translations), (node, "rotation", times, rotations)],
+            name=f"camera_{path}",
+        )
+    timeline: Dict[str, Any] = {"duration_s": duration_s, "fps": int(fps), "camera_path": path}
+    if audio and audio.get("tempo"):
+        timeline.update(tempo=int(audio["tempo"]), **beat_markers(audio["tempo"], duration_s))
+    writer.scene_extras["timeline"] = timeline
+    return node
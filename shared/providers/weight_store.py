@@ -0,0 +1,112 @@
+"""Process-wide store for heavy model pipelines.
+
+Keeps one pipeline per (model, dtype, device, quantization) per process, and
+lets Celery prefork workers share the weights instead of each child holding
+its own copy:
+
+- ``WEIGHTS_MMAP=1`` rebinds parameters to read-only, mmap-backed safetensors
+  tensors, so every process on the host shares the same page-cache pages.
+  Only possible when the in-memory dtype matches the file (fp32 on CPU).
+- ``preload()`` loads pipelines in the worker parent before the pool forks;
+  children inherit them copy-on-write. ``gc.freeze()`` keeps the collector
+  from dirtying those pages. CPU only: CUDA contexts do not survive fork.
+"""
+import gc
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+WEIGHTS_MMAP = os.getenv("WEIGHTS_MMAP", "0") == "1"
+
+# Component folders of a diffusers SDXL snapshot that carry most of the bytes
+_MMAP_COMPONENTS = {
+    "unet": "unet/diffusion_pytorch_model.safetensors",
+    "vae": "vae/diffusion_pytorch_model.safetensors",
+    "text_encoder": "text_encoder/model.safetensors",
+    "text_encoder_2": "text_encoder_2/model.safetensors",
+}
+
+StoreKey = Tuple[str, str, str, str]
+
+_pipelines: Dict[StoreKey, Any] = {}
+_lock = threading.Lock()
+
+
+def get_or_load(key: StoreKey, loader: Callable[[], Any]) -> Any:
+    """Return the pipeline for ``key``, building it with ``loader`` on first use."""
+    pipe = _pipelines.get(key)
+    if pipe is not None:
+        return pipe
+    with _lock:
+        pipe = _pipelines.get(key)
+        if pipe is None:
+            pipe = loader()
+            _pipelines[key] = pipe
+    return pipe
+
+
+def loaded_keys() -> Iterable[StoreKey]:
+    return list(_pipelines)
+
+
+def mmap_weights(pipe: Any, model_id: str) -> Dict[str, bool]:
+    """
+    Point each component's parameters at mmap-backed safetensors tensors.
+    Components whose dtype differs from the file are left as loaded.
+    """
+    import torch
+    from safetensors.torch import load_file
+
+    snapshot = _local_snapshot(model_id)
+    result: Dict[str, bool] = {}
+    for name, rel in _MMAP_COMPONENTS.items():
+        module = getattr(pipe, name, None)
+        path = os.path.join(snapshot, rel) if snapshot else None
+        if module is None or not path or not os.path.exists(path):
+            result[name] = False
+            continue
+        state = load_file(path, device="cpu")
+        first = next(iter(module.parameters()), None)
+        if first is None or first.device.type != "cpu" or any(t.dtype != first.dtype for t in state.values()):
+            result[name] = False
+            continue
+        # assign=True keeps the mmap'd storage instead of copying into existing params;
+        # grad mode stays scoped here, inference call sites run under inference_mode
+        with torch.no_grad():
+            module.load_state_dict(state, strict=False, assign=True)
+        module.requires_grad_(False)
+        result[name] = True
+    return result
+
+
+def _local_snapshot(model_id: str) -> Optional[str]:
+    if os.path.isdir(model_id):
+        return model_id
+    try:
+        from huggingface_hub import snapshot_download
+        return snapshot_download(model_id, local_files_only=True)
+    except Exception:
+        return None
+
+
+def preload(cfgs: Iterable[Dict[str, Any]]) -> int:
+    """
+    Load env provider pipelines for each provider cfg in this (parent) process.
+    Returns the number of pipelines resident afterwards.
+    """
+    from shared.providers.env_triposr_fast import Env_TripoSR_Fast
+
+    try:
+        import torch
+        if torch.cuda.is_available():
+            # Initialising CUDA in the parent would break every forked child
+            return 0
+    except ImportError:
+        return 0
+    for cfg in cfgs:
+        Env_TripoSR_Fast(cfg=cfg)._ensure_initialized()
+    # Move everything allocated so far out of the GC's reach so collections in
+    # the children do not write to (and un-share) the inherited pages
+    gc.collect()
+    gc.freeze()
+    return len(_pipelines)
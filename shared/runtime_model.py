@@ -0,0 +1,383 @@
+"""Runtime/memory predictor that right-sizes SageMaker processing jobs.
+
+Every job manifest carries a ``runtime`` block (features computed in the
+container, instance type, wall time, peak RSS). ``collect`` gathers them from
+S3 into JSON lines, plus censored samples for jobs that timed out or were
+stopped before writing a manifest (their true runtime is at least what they
+ran). ``fit`` solves a small ridge regression per instance type for wall time
+(censored samples are imputed up to the model's prediction) and one for peak
+memory. ``choose`` picks the cheapest candidate instance with enough memory,
+and a ``MaxRuntimeInSeconds`` of the prediction plus its p95 error times
+``RUNTIME_SAFETY``, never below ``SM_MAX_SEC``. ``replay`` scores a model
+trained on the older part of the history against the newer part.
+
+Submitters plan the scene first and call ``for_submission(plan, SM_ENV_CFG)``;
+the features it returns travel in the job payload, so the manifest (or the
+censored sample of a job that never wrote one) records exactly what sized it.
+Without a fitted model, or without a plan, jobs keep ``SM_INSTANCE_TYPE`` and
+``SM_MAX_SEC``.
+
+    python -m shared.runtime_model collect --bucket s3://bucket --out history.jsonl
+    python -m shared.runtime_model fit history.jsonl --out runtime_model.json
+    python -m shared.runtime_model replay history.jsonl
+"""
+import argparse
+import math
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from shared.serialization import dumpb, dumps, loads
+
+RUNTIME_MODEL_PATH = os.getenv("RUNTIME_MODEL_PATH", "")
+SM_INSTANCE_TYPE = os.getenv("SM_INSTANCE_TYPE", "ml.m5.xlarge")
+SM_MAX_SEC = int(os.getenv("SM_MAX_SEC", "1800"))
+SM_MAX_SEC_CAP = int(os.getenv("SM_MAX_SEC_CAP", "7200"))
+RUNTIME_SAFETY = float(os.getenv("RUNTIME_SAFETY", "1.5"))
+MEM_HEADROOM = float(os.getenv("RUNTIME_MEM_HEADROOM", "1.25"))
+MIN_SAMPLES = int(os.getenv("RUNTIME_MIN_SAMPLES", "5"))
+# type:memory_gb:usd_per_hour
+# Env provider cfg for the SageMaker container (num_refs, steps, turbo, zero123); sent with every job
+SM_ENV_CFG: Dict[str, Any] = loads(os.getenv("SM_ENV_CFG") or "{}")
+SM_INSTANCE_CANDIDATES = os.getenv(
+    "SM_INSTANCE_CANDIDATES",
+    "ml.m5.xlarge:16:0.23,ml.m5.2xlarge:32:0.461,ml.g4dn.xlarge:16:0.736,ml.g5.xlarge:16:1.408",
+)
+
+TERMS = ("bias", "objects", "instances", "num_refs", "ref_steps", "zero123_refs")
+_RIDGE = 1e-3
+_CENSOR_ITERS = 5
+
+
+def candidates(spec: str = SM_INSTANCE_CANDIDATES) -> Dict[str, Dict[str, float]]:
+    out = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        name, mem_gb, price = item.split(":")
+        out[name] = {"mem_mb": float(mem_gb) * 1024, "usd_per_hr": float(price)}
+    return out
+
+
+def features(plan: Optional[Dict[str, Any]] = None, cfg: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+    """Job features known at submission, with Env_TripoSR_Fast's defaults."""
+    cfg = cfg or {}
+    objects = (plan or {}).get("objects") or []
+    turbo = bool(cfg.get("turbo", os.getenv("SDXL_TURBO", "0") == "1"))
+    return {
+        "objects": len(objects),
+        "instances": sum(int(o.get("instances", 1)) for o in objects),
+        "num_refs": int(cfg.get("num_refs", 2)),
+        "steps": int(cfg.get("steps", 4 if turbo else 24)),
+        "zero123": int(bool(cfg.get("zero123", False))),
+    }
+
+
+def _row(f: Dict[str, Any]) -> List[float]:
+    refs = float(f.get("num_refs", 0))
+    return [1.0, float(f.get("objects", 0)), float(f.get("instances", 0)), refs,
+            refs * float(f.get("steps", 0)), refs * float(f.get("zero123", 0))]
+
+
+def _solve(a: List[List[float]], b: List[float]) -> List[float]:
+    """Gaussian elimination with partial pivoting (the systems are 6x6)."""
+    n = len(b)
+    m = [row[:] + [b[i]] for i, row in enumerate(a)]
+    for col in range(n):
+        piv = max(range(col, n), key=lambda r: abs(m[r][col]))
+        m[col], m[piv] = m[piv], m[col]
+        if abs(m[col][col]) < 1e-12:
+            continue
+        for r in range(n):
+            if r != col:
+                k = m[r][col] / m[col][col]
+                m[r] = [x - k * y for x, y in zip(m[r], m[col])]
+    return [m[i][n] / m[i][i] if abs(m[i][i]) >= 1e-12 else 0.0 for i in range(n)]
+
+
+def _fit_censored(rows: Sequence[List[float]], ys: Sequence[float], censored: Sequence[bool]) -> Dict[str, Any]:
+    """Refit with each censored target raised to the current prediction when that is higher."""
+    model = _fit_linear(rows, ys)
+    if not any(censored):
+        return model
+    for _ in range(_CENSOR_ITERS):
+        ys_hat = [max(y, _dot(model["coef"], r)) if c else y for r, y, c in zip(rows, ys, censored)]
+        model = _fit_linear(rows, ys_hat)
+    return model
+
+
+def _fit_linear(rows: Sequence[List[float]], ys: Sequence[float]) -> Dict[str, Any]:
+    k = len(TERMS)
+    xtx = [[sum(r[i] * r[j] for r in rows) + (_RIDGE if i == j and i else 0.0) for j in range(k)] for i in range(k)]
+    xty = [sum(r[i] * y for r, y in zip(rows, ys)) for i in range(k)]
+    coef = _solve(xtx, xty)
+    residuals = sorted(y - _dot(coef, r) for r, y in zip(rows, ys))
+    return {"coef": [round(c, 6) for c in coef], "margin": round(max(0.0, _quantile(residuals, 0.95)), 3), "n": len(ys)}
+
+
+def _dot(coef: Sequence[float], row: Sequence[float]) -> float:
+    return sum(c * x for c, x in zip(coef, row))
+
+
+def _quantile(sorted_vals: Sequence[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(math.ceil(q * len(sorted_vals))) - 1)]
+
+
+def fit(samples: Sequence[Dict[str, Any]], min_samples: int = MIN_SAMPLES) -> Dict[str, Any]:
+    """Fit wall-time models per instance type (with enough samples) and one memory model."""
+    by_type: Dict[str, List[Dict[str, Any]]] = {}
+    for s in samples:
+        by_type.setdefault(s["instance_type"], []).append(s)
+    runtime = {
+        itype: _fit_censored([_row(s["features"]) for s in ss], [float(s["wall_s"]) for s in ss],
+                             [bool(s.get("censored")) for s in ss])
+        for itype, ss in by_type.items() if sum(not s.get("censored") for s in ss) >= min_samples
+    }
+    mem = [s for s in samples if s.get("peak_rss_mb") and not s.get("censored")]
+    memory = _fit_linear([_row(s["features"]) for s in mem], [float(s["peak_rss_mb"]) for s in mem]) if mem else None
+    return {"version": 1, "terms": list(TERMS), "fitted_at": time.time(), "runtime": runtime, "memory": memory}
+
+
+def predict(model: Dict[str, Any], feats: Dict[str, Any], instance_type: str) -> Optional[Tuple[float, float]]:
+    """(predicted wall seconds, p95 error) on ``instance_type``, or None if unfitted."""
+    m = (model.get("runtime") or {}).get(instance_type)
+    if m is None:
+        return None
+    return max(1.0, _dot(m["coef"], _row(feats))), m["margin"]
+
+
+def _timeout(secs: float, margin: float) -> int:
+    # Never below the static timeout: tighter limits would censor more of the history
+    return int(min(SM_MAX_SEC_CAP, max(SM_MAX_SEC, (secs + margin) * RUNTIME_SAFETY)))
+
+
+def choose(feats: Optional[Dict[str, Any]], model: Optional[Dict[str, Any]] = None,
+           pool: Optional[Dict[str, Dict[str, float]]] = None) -> Dict[str, Any]:
+    """Instance type and MaxRuntimeInSeconds for a job with ``feats``."""
+    default = {"instance_type": SM_INSTANCE_TYPE, "max_runtime_s": SM_MAX_SEC, "source": "default"}
+    if not model or feats is None:
+        return default
+    pool = pool if pool is not None else candidates()
+    mem = model.get("memory")
+    need_mb = (_dot(mem["coef"], _row(feats)) + mem["margin"]) * MEM_HEADROOM if mem else 0.0
+    best = None
+    for itype, spec in pool.items():
+        pred = predict(model, feats, itype)
+        if pred is None or spec["mem_mb"] < need_mb:
+            continue
+        cost = spec["usd_per_hr"] * pred[0] / 3600.0
+        if best is None or cost < best[0]:
+            best = (cost, itype, pred)
+    if best is None:
+        return default
+    cost, itype, (secs, margin) = best
+    timeout = _timeout(secs, margin)
+    return {
+        "instance_type": itype,
+        "max_runtime_s": timeout,
+        "predicted_s": round(secs, 1),
+        "predicted_mem_mb": round(need_mb, 1),
+        "est_usd": round(cost, 4),
+        "source": "model",
+    }
+
+
+def for_submission(plan: Optional[Dict[str, Any]] = None, cfg: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Resources for a job about to run ``plan`` with env provider ``cfg``, plus
+    the ``features`` they were chosen from. Without a plan every job would
+    look the same, so the static settings are returned.
+    """
+    if plan is None:
+        return choose(None)
+    feats = features(plan, cfg)
+    return {**choose(feats, load_model()), "features": feats}
+
+
+_cached: Tuple[Optional[str], float, Optional[Dict[str, Any]]] = (None, 0.0, None)
+
+
+def load_model(path: str = RUNTIME_MODEL_PATH) -> Optional[Dict[str, Any]]:
+    """The fitted model at ``path``; re-read when the file changes, None if absent."""
+    global _cached
+    if not path:
+        return None
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    if _cached[0] != path or _cached[1] != mtime:
+        try:
+            _cached = (path, mtime, loads(Path(path).read_bytes()))
+        except ValueError as e:
+            print(f"Runtime model unreadable ({e}), using SM_INSTANCE_TYPE/SM_MAX_SEC")
+            _cached = (path, mtime, None)
+    return _cached[2]
+
+
+def sample_from_manifest(manifest: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    rt = manifest.get("runtime") or {}
+    if not (rt.get("features") and rt.get("instance_type") and rt.get("wall_s")):
+        return None
+    return {
+        "job_id": manifest.get("job_id"),
+        "instance_type": rt["instance_type"],
+        "features": rt["features"],
+        "wall_s": rt["wall_s"],
+        "peak_rss_mb": rt.get("peak_rss_mb"),
+        "stages_s": (manifest.get("timings") or {}).get("stages_s"),
+        "finished_at": rt.get("finished_at", 0.0),
+    }
+
+
+def sample_from_processing_job(desc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    A censored sample from ``describe_processing_job`` for a job that was
+    stopped or cut off at ``MaxRuntimeInSeconds``; None for anything else.
+    """
+    status = desc.get("ProcessingJobStatus")
+    start, end = desc.get("ProcessingStartTime"), desc.get("ProcessingEndTime")
+    if status not in ("Stopped", "Failed") or not (start and end):
+        return None
+    wall = (end - start).total_seconds()
+    limit = (desc.get("StoppingCondition") or {}).get("MaxRuntimeInSeconds") or 0
+    if status == "Failed" and not (limit and wall >= limit * 0.99):
+        return None  # crashed: its runtime says nothing about how long the job needed
+    payload = loads((desc.get("Environment") or {}).get("PROMPT_JSON") or "{}")
+    return {
+        "job_id": desc.get("ProcessingJobName"),
+        "instance_type": desc["ProcessingResources"]["ClusterConfig"]["InstanceType"],
+        "features": payload.get("features") or features(),
+        "wall_s": round(wall, 3),
+        "peak_rss_mb": None,
+        "finished_at": end.timestamp(),
+        "censored": True,
+    }
+
+
+def collect_censored(sm: Any, skip: Sequence[str] = (), prefix: str = "envgen-") -> List[Dict[str, Any]]:
+    """Censored samples for stopped or timed-out processing jobs named ``<prefix>*``."""
+    skip = set(skip)
+    samples = []
+    for status in ("Stopped", "Failed"):
+        kwargs: Dict[str, Any] = {"StatusEquals": status, "NameContains": prefix, "MaxResults": 100}
+        while True:
+            resp = sm.list_processing_jobs(**kwargs)
+            for summary in resp.get("ProcessingJobSummaries") or []:
+                name = summary["ProcessingJobName"]
+                if name in skip:
+                    continue
+                sample = sample_from_processing_job(sm.describe_processing_job(ProcessingJobName=name))
+                if sample is not None:
+                    samples.append(sample)
+            if not resp.get("NextToken"):
+                break
+            kwargs["NextToken"] = resp["NextToken"]
+    return samples
+
+
+def collect(s3: Any, bucket: str, root: str = "", sm: Any = None) -> List[Dict[str, Any]]:
+    """
+    Samples from every job manifest under ``<root>/jobs/`` and, given a
+    SageMaker client, censored samples for jobs without one; oldest first.
+    """
+    from shared.blob_store import _list
+
+    jobs = f"{root.strip('/')}/jobs/" if root.strip("/") else "jobs/"
+    samples = []
+    for obj in _list(s3, bucket, jobs):
+        if obj["Key"].endswith("manifest.json"):
+            sample = sample_from_manifest(loads(s3.get_object(Bucket=bucket, Key=obj["Key"])["Body"].read()))
+            if sample is not None:
+                samples.append(sample)
+    if sm is not None:
+        samples += collect_censored(sm, skip=[s["job_id"] for s in samples])
+    return sorted(samples, key=lambda s: s["finished_at"])
+
+
+def replay(samples: Sequence[Dict[str, Any]], train_frac: float = 0.7,
+           pool: Optional[Dict[str, Dict[str, float]]] = None) -> Dict[str, Any]:
+    """Fit on the oldest ``train_frac`` of ``samples`` and score on the rest."""
+    pool = pool if pool is not None else candidates()
+    split = int(len(samples) * train_frac)
+    model, test = fit(samples[:split]), samples[split:]
+    errors, timeouts, baseline_timeouts, oom = [], 0, 0, 0
+    spent = chosen = 0.0
+    censored = sum(1 for s in test if s.get("censored"))
+    for s in test:
+        if s.get("censored"):
+            continue  # true runtime unknown
+        actual = float(s["wall_s"])
+        baseline_timeouts += actual > SM_MAX_SEC
+        pred = predict(model, s["features"], s["instance_type"])
+        if pred is None:
+            continue
+        errors.append(abs(pred[0] - actual))
+        timeouts += actual > _timeout(*pred)
+        pick = choose(s["features"], model, pool)
+        spec = pool.get(pick["instance_type"])
+        if spec and s.get("peak_rss_mb"):
+            oom += float(s["peak_rss_mb"]) > spec["mem_mb"]
+        if s["instance_type"] in pool and spec:
+            spent += pool[s["instance_type"]]["usd_per_hr"] * actual / 3600.0
+            chosen += pick.get("est_usd", spec["usd_per_hr"] * actual / 3600.0)
+    scored = len(errors)
+    return {
+        "train": split,
+        "test": len(test),
+        "censored": censored,
+        "scored": scored,
+        "mae_s": round(sum(errors) / scored, 2) if scored else None,
+        "p95_abs_err_s": round(_quantile(sorted(errors), 0.95), 2) if scored else None,
+        "timeout_rate": round(timeouts / scored, 4) if scored else None,
+        "baseline_timeout_rate": round(baseline_timeouts / (len(test) - censored), 4) if len(test) > censored else None,
+        "oom_rate": round(oom / scored, 4) if scored else None,
+        "usd_actual": round(spent, 4),
+        "usd_chosen_est": round(chosen, 4),
+    }
+
+
+def _read_history(path: str) -> List[Dict[str, Any]]:
+    with open(path, "rb") as f:
+        return [loads(line) for line in f if line.strip()]
+
+
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m shared.runtime_model")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("collect", help="gather runtime samples from job manifests")
+    c.add_argument("--bucket", default=os.getenv("S3_BUCKET", ""), help="s3://bucket[/root] (default: $S3_BUCKET)")
+    c.add_argument("--out", required=True)
+    c.add_argument("--no-censored", action="store_true", help="skip stopped/timed-out jobs (needs SageMaker access)")
+    f = sub.add_parser("fit", help="fit the predictor on a history file")
+    f.add_argument("history")
+    f.add_argument("--out", default=RUNTIME_MODEL_PATH or "runtime_model.json")
+    r = sub.add_parser("replay", help="score the predictor on held-out history")
+    r.add_argument("history")
+    r.add_argument("--train-frac", type=float, default=0.7)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "collect":
+        bucket, _, root = args.bucket.replace("s3://", "", 1).partition("/")
+        if not bucket:
+            ap.error("--bucket or S3_BUCKET is required")
+        import boto3
+        s3 = boto3.client("s3", region_name=os.getenv("AWS_REGION", "us-east-1"))
+        sm = None if args.no_censored else boto3.client("sagemaker", region_name=os.getenv("AWS_REGION", "us-east-1"))
+        samples = collect(s3, bucket, root, sm)
+        with open(args.out, "wb") as fh:
+            fh.writelines(dumpb(s) + b"\n" for s in samples)
+        print(f"collected {len(samples)} sample(s) -> {args.out}")
+    elif args.cmd == "fit":
+        model = fit(_read_history(args.history))
+        Path(args.out).write_bytes(dumpb(model))
+        print(f"fitted {sorted(model['runtime'])} -> {args.out}")
+    else:
+        print(dumps(replay(_read_history(args.history), args.train_frac)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""Queue depth and worker saturation, the signals for scaling the worker fleet.
+
+Workers publish to the status Redis:
+
+- ``sat:node:<hostname>``: the queues a worker consumes and its pool size,
+  refreshed every ``SATURATION_HEARTBEAT_SEC`` by ``start_heartbeat`` (a dead
+  node drops out after three missed beats);
+- ``sat:task:<task_id>`` while a task runs (``task_started``/``task_finished``
+  from Celery's prerun/postrun signals);
+- ``sat:runtime:<queue>``: an EWMA of task wall time per queue.
+
+``snapshot`` joins those with broker queue lengths (and optionally in-progress
+SageMaker jobs) into per-queue depth, busy/total slots, utilization and an
+estimated drain time. ``exposition`` renders a snapshot in the Prometheus text
+format for the API's ``/metrics``. A node consuming several queues counts its
+slots toward each of them.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from shared.serialization import dumps, loads
+
+try:
+    import prometheus_client as _prom  # type: ignore
+except ImportError:  # pragma: no cover
+    _prom = None  # type: ignore
+
+SAT_PREFIX = "sat:"
+SATURATION_QUEUES = [q.strip() for q in os.getenv("SATURATION_QUEUES", "orchestrator,env,env_batch").split(",") if q.strip()]
+SATURATION_HEARTBEAT_SEC = float(os.getenv("SATURATION_HEARTBEAT_SEC", "15"))
+# A task marker outlives any legitimate task, so a killed worker stops counting as busy
+SATURATION_TASK_TTL_SEC = int(os.getenv("SATURATION_TASK_TTL_SEC", os.getenv("SM_MAX_SEC", "1800")))
+RUNTIME_EWMA_ALPHA = float(os.getenv("RUNTIME_EWMA_ALPHA", "0.2"))
+SM_JOB_PREFIX = os.getenv("SM_JOB_PREFIX", "envgen-")
+SM_INFLIGHT_CACHE_SEC = float(os.getenv("SM_INFLIGHT_CACHE_SEC", "30"))
+
+# kombu's Redis transport keeps priorities 3/6/9 in sibling lists "<queue>\x06\x16<n>"
+_PRIORITY_SEP = "\x06\x16"
+_PRIORITY_STEPS = (3, 6, 9)
+
+if _prom is not None:
+    BUSY_SLOTS = _prom.Gauge(
+        "mmf_worker_busy_slots", "Tasks executing in this worker", ["queue"], multiprocess_mode="livesum",
+    )
+    TASK_SECONDS = _prom.Histogram(
+        "mmf_task_seconds", "Wall time of a Celery task", ["queue", "task"],
+        buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800),
+    )
+
+_started: Dict[str, float] = {}
+_sm_cache: Dict[str, Any] = {"at": None, "value": None}
+
+
+def _str(value: Any) -> Optional[str]:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _float(value: Any) -> Optional[float]:
+    try:
+        return float(_str(value))
+    except (TypeError, ValueError):
+        return None
+
+
+# --- worker side ---
+
+def register_node(r, hostname: str, queues: Iterable[str], concurrency: int, ttl: Optional[float] = None) -> None:
+    ttl = ttl or SATURATION_HEARTBEAT_SEC * 3
+    payload = {"queues": sorted(queues), "concurrency": int(concurrency), "ts": time.time()}
+    r.set(f"{SAT_PREFIX}node:{hostname}", dumps(payload), ex=max(1, int(ttl)))
+
+
+def _worker_queues(worker: Any) -> List[str]:
+    try:
+        return sorted(worker.app.amqp.queues.consume_from)
+    except (AttributeError, TypeError):
+        return []
+
+
+def _worker_slots(worker: Any) -> int:
+    # The live pool size follows autoscaling; before the pool starts use the configured size
+    pool = getattr(worker, "pool", None)
+    return int(getattr(pool, "num_processes", None) or getattr(worker, "concurrency", None) or 1)
+
+
+def start_heartbeat(client: Callable[[], Any], worker: Any, interval: float = SATURATION_HEARTBEAT_SEC) -> Optional[threading.Thread]:
+    """Publish ``worker``'s (a Celery WorkController) capacity from a daemon thread."""
+    hostname = getattr(worker, "hostname", None)
+    if not hostname or interval <= 0:
+        return None
+
+    def beat() -> None:
+        failing = False
+        while True:
+            try:
+                register_node(client(), hostname, _worker_queues(worker), _worker_slots(worker))
+                failing = False
+            except Exception as e:
+                if not failing:
+                    print(f"saturation heartbeat failed: {e}")
+                failing = True
+            time.sleep(interval)
+
+    thread = threading.Thread(target=beat, name="mmf-saturation-heartbeat", daemon=True)
+    thread.start()
+    return thread
+
+
+def task_queue(task: Any) -> str:
+    """The queue a running Celery task was delivered from."""
+    info = getattr(getattr(task, "request", None), "delivery_info", None) or {}
+    return info.get("routing_key") or getattr(task, "queue", None) or "celery"
+
+
+def task_started(r, task_id: str, queue: str, name: str) -> None:
+    _started[task_id] = time.monotonic()
+    if _prom is not None:
+        BUSY_SLOTS.labels(queue=queue).inc()
+    try:
+        r.set(f"{SAT_PREFIX}task:{task_id}", dumps({"queue": queue, "task": name, "started": time.time()}),
+              ex=SATURATION_TASK_TTL_SEC)
+    except Exception as e:  # metrics must never fail the task
+        print(f"saturation: could not mark {task_id} busy: {e}")
+
+
+def task_finished(r, task_id: str, queue: str, name: str) -> Optional[float]:
+    """Clear the busy marker and fold the runtime into the queue's EWMA; returns seconds."""
+    t0 = _started.pop(task_id, None)
+    seconds = time.monotonic() - t0 if t0 is not None else None
+    if _prom is not None and t0 is not None:
+        BUSY_SLOTS.labels(queue=queue).dec()
+        TASK_SECONDS.labels(queue=queue, task=name).observe(seconds)
+    try:
+        r.delete(f"{SAT_PREFIX}task:{task_id}")
+        if seconds is not None:
+            key = f"{SAT_PREFIX}runtime:{queue}"
+            # Read-modify-write without a lock: a lost update barely moves an average
+            prev = _float(r.get(key))
+            avg = seconds if prev is None else prev + RUNTIME_EWMA_ALPHA * (seconds - prev)
+            r.set(key, f"{avg:.6f}")
+    except Exception as e:
+        print(f"saturation: could not record {task_id}: {e}")
+    return seconds
+
+
+# --- API side ---
+
+def queue_depth(broker, queue: str) -> int:
+    names = [queue] + [f"{queue}{_PRIORITY_SEP}{p}" for p in _PRIORITY_STEPS]
+    return sum(int(broker.llen(n) or 0) for n in names)
+
+
+def drain_time(depth: int, busy: int, slots: int, avg_runtime_s: Optional[float]) -> Optional[float]:
+    """
+    Seconds to clear the queue at current capacity: the backlog plus running
+    tasks (half done on average) spread over ``slots``. None when unknown or
+    when nothing is consuming a non-empty queue.
+    """
+    if depth <= 0 and busy <= 0:
+        return 0.0
+    if avg_runtime_s is None or slots <= 0:
+        return None
+    return round((depth + 0.5 * busy) * avg_runtime_s / slots, 3)
+
+
+def sagemaker_in_flight(sm, prefix: str = SM_JOB_PREFIX, max_age: float = SM_INFLIGHT_CACHE_SEC) -> int:
+    """In-progress processing jobs named ``<prefix>*``; cached to stay clear of API throttling."""
+    now = time.monotonic()
+    if _sm_cache["at"] is not None and now - _sm_cache["at"] < max_age:
+        return _sm_cache["value"]
+    count, token = 0, None
+    while True:
+        kwargs: Dict[str, Any] = {"StatusEquals": "InProgress", "NameContains": prefix, "MaxResults": 100}
+        if token:
+            kwargs["NextToken"] = token
+        resp = sm.list_processing_jobs(**kwargs)
+        count += len(resp.get("ProcessingJobSummaries") or [])
+        token = resp.get("NextToken")
+        if not token:
+            break
+    _sm_cache.update(at=now, value=count)
+    return count
+
+
+def _scan(r, pattern: str) -> Iterable[Dict[str, Any]]:
+    for key in r.scan_iter(match=pattern, count=500):
+        raw = r.get(key)
+        if raw:
+            yield loads(raw)
+
+
+def snapshot(broker, r, queues: Optional[Iterable[str]] = None, sm=None) -> Dict[str, Any]:
+    """Per-queue depth, busy/total slots, utilization, average runtime and drain time."""
+    queues = list(queues or SATURATION_QUEUES)
+    slots = dict.fromkeys(queues, 0)
+    busy = dict.fromkeys(queues, 0)
+    for node in _scan(r, f"{SAT_PREFIX}node:*"):
+        for q in node.get("queues") or []:
+            if q in slots:
+                slots[q] += int(node.get("concurrency") or 0)
+    for task in _scan(r, f"{SAT_PREFIX}task:*"):
+        if task.get("queue") in busy:
+            busy[task["queue"]] += 1
+
+    out: Dict[str, Any] = {"queues": {}}
+    for q in queues:
+        depth = queue_depth(broker, q)
+        avg = _float(r.get(f"{SAT_PREFIX}runtime:{q}"))
+        out["queues"][q] = {
+            "depth": depth,
+            "busy": busy[q],
+            "slots": slots[q],
+            "utilization": round(min(busy[q] / slots[q], 1.0), 4) if slots[q] else None,
+            "avg_runtime_s": round(avg, 3) if avg is not None else None,
+            "drain_s": drain_time(depth, busy[q], slots[q], avg),
+        }
+    if sm is not None:
+        out["sagemaker_in_flight"] = sagemaker_in_flight(sm)
+    return out
+
+
+_SERIES = (
+    ("depth", "mmf_queue_depth", "Messages waiting in a Celery queue"),
+    ("busy", "mmf_queue_busy_slots", "Tasks from the queue currently executing"),
+    ("slots", "mmf_queue_slots", "Worker slots consuming the queue"),
+    ("utilization", "mmf_queue_utilization", "Busy slots over total slots"),
+    ("avg_runtime_s", "mmf_task_runtime_avg_seconds", "Moving average of task wall time"),
+    ("drain_s", "mmf_queue_drain_seconds", "Estimated time to empty the queue at current capacity"),
+)
+
+
+def exposition(snap: Dict[str, Any]) -> str:
+    """Render a ``snapshot`` as Prometheus text-format gauges (unknown values are omitted)."""
+    lines: List[str] = []
+    for field, metric, help_text in _SERIES:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+        for q, stats in snap.get("queues", {}).items():
+            if stats.get(field) is not None:
+                lines.append(f'{metric}{{queue="{q}"}} {stats[field]}')
+    if "sagemaker_in_flight" in snap:
+        lines += [
+            "# HELP mmf_sagemaker_jobs_in_flight In-progress SageMaker processing jobs",
+            "# TYPE mmf_sagemaker_jobs_in_flight gauge",
+            f"mmf_sagemaker_jobs_in_flight {snap['sagemaker_in_flight']}",
+        ]
+    return "\n".join(lines) + "\n"
@@ -1,6 +1,6 @@
 
 from pydantic import BaseModel
-from typing import Optional, Dict
+from typing import Any, Optional, Dict, List
 
 class Artifact(BaseModel):
     path: str  # local path or URL
@@ -8,6 +8,34 @@ class Artifact(BaseModel):
     format: str  # e.g., "glb", "splat"
     provenance: Dict[str, str]
 
+class LodEntry(BaseModel):
+    name: str  # "scene_lod0", "scene_glb", "chunk_<i>"
+    file: str  # relative to the job prefix, e.g. "scene_lod0.glb"
+    lod: int
+    bytes: int
+    object: Optional[str] = None  # set on per-object chunks
+    sha256: Optional[str] = None  # blob holding the bytes (content-addressed layout)
+
+class BlobRef(BaseModel):
+    sha256: str
+    key: str  # "blobs/<sha256>", under the bucket root
+    bytes: int
+
+class RuntimeSample(BaseModel):
+    features: Dict[str, int]  # see shared.runtime_model.features
+    instance_type: Optional[str] = None
+    wall_s: float
+    peak_rss_mb: Optional[float] = None
+    finished_at: Optional[float] = None
+
 class JobManifest(BaseModel):
     job_id: str
     artifacts: Dict[str, Artifact] = {}
+    # Scene files ordered coarse -> full; viewers render the first, then swap up
+    lods: List[LodEntry] = []
+    # File relative to the job prefix -> blob; empty for the legacy per-job layout
+    blobs: Dict[str, BlobRef] = {}
+    # {"stages_s": {stage: seconds}, "artifact_bytes": {...}, "queue_wait_s": float}
+    timings: Dict[str, Any] = {}
+    # Observed cost of this job, the training data for the runtime predictor
+    runtime: Optional[RuntimeSample] = None
@@ -0,0 +1,69 @@
+"""JSON serialization used by the API, workers and manifests.
+
+orjson when installed, stdlib ``json`` otherwise. Both backends emit compact
+UTF-8 so payloads written by one can be read by the other.
+"""
+import json
+from typing import Any
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+BACKEND = "orjson" if orjson is not None else "json"
+KOMBU_SERIALIZER = "orjson"
+KOMBU_CONTENT_TYPE = "application/x-orjson"
+
+
+def dumpb(obj: Any, indent: bool = False, sort_keys: bool = False) -> bytes:
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option)
+    return json.dumps(
+        obj,
+        ensure_ascii=False,
+        indent=2 if indent else None,
+        separators=None if indent else (",", ":"),
+        sort_keys=sort_keys,
+    ).encode("utf-8")
+
+
+def dumps(obj: Any, indent: bool = False, sort_keys: bool = False) -> str:
+    return dumpb(obj, indent=indent, sort_keys=sort_keys).decode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode("utf-8")
+    return json.loads(data)
+
+
+def response_class():
+    """Default FastAPI response class for the configured backend."""
+    if orjson is not None:
+        from fastapi.responses import ORJSONResponse
+        return ORJSONResponse
+    from fastapi.responses import JSONResponse
+    return JSONResponse
+
+
+def register_kombu() -> bool:
+    """Register the ``orjson`` Celery/kombu serializer. Returns False without orjson."""
+    if orjson is None:
+        return False
+    from kombu.serialization import register
+    register(
+        KOMBU_SERIALIZER,
+        dumps,
+        loads,
+        content_type=KOMBU_CONTENT_TYPE,
+        content_encoding="utf-8",
+    )
+    return True
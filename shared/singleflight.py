@@ -0,0 +1,133 @@
+"""Single-flight registration of in-flight generation jobs in Redis.
+
+Identical submissions hash to one key (``flight:<kind>:<sha256>``). The first
+job to ``SET NX`` it leads; later submissions get the leader's job id back
+and attach to it instead of starting their own generation, but keep their
+own job id: ``leader_of`` maps it to the job doing the work. Followers that
+need status fan-out register under ``<key>:followers``; ``<key>:members``
+is the set of attached submissions, so ``detach`` (cancellation) drops each
+submission once and only stops the shared work when nobody is left.
+
+``settle`` runs when the leader finishes: on success the key is kept for
+``SINGLEFLIGHT_DONE_TTL_SEC`` so retried clients still land on the finished
+job; on failure it is dropped at once so the next submission starts fresh.
+Only the owning job may settle a key (compare-and-act in Lua), and every key
+carries a TTL, so a crashed leader blocks identical work for at most
+``SINGLEFLIGHT_TTL_SEC``. ``SINGLEFLIGHT_TTL_SEC=0`` disables deduplication.
+"""
+import hashlib
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from shared.messaging import encode_plan
+
+# Defaults to SM_MAX_SEC: a leader cannot legitimately run longer than that
+SINGLEFLIGHT_TTL_SEC = int(os.getenv("SINGLEFLIGHT_TTL_SEC", os.getenv("SM_MAX_SEC", "1800")))
+SINGLEFLIGHT_DONE_TTL_SEC = int(os.getenv("SINGLEFLIGHT_DONE_TTL_SEC", "60"))
+FLIGHT_PREFIX = "flight:"
+
+# KEYS: flight key, followers list, members set; ARGV: job id, ttl (0 = drop)
+_SETTLE = """
+if redis.call('get', KEYS[1]) ~= ARGV[1] then
+  return {}
+end
+local followers = redis.call('lrange', KEYS[2], 0, -1)
+if tonumber(ARGV[2]) > 0 then
+  for i = 1, 3 do redis.call('expire', KEYS[i], ARGV[2]) end
+else
+  redis.call('del', KEYS[1], KEYS[2], KEYS[3])
+end
+return followers
+"""
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def prompt_key(prompt: str, kind: str = "prompt") -> str:
+    """Case- and whitespace-insensitive key for a raw prompt."""
+    canonical = " ".join(prompt.lower().split())
+    return f"{FLIGHT_PREFIX}{kind}:{_digest(canonical.encode('utf-8'))}"
+
+
+def plan_key(plan: Dict[str, Any], kind: str = "plan") -> str:
+    """Key for a scene plan; key order does not matter."""
+    return f"{FLIGHT_PREFIX}{kind}:{_digest(encode_plan(plan))}"
+
+
+def _owner_key(job_id: str) -> str:
+    return f"{FLIGHT_PREFIX}job:{job_id}"
+
+
+def _leader_key(job_id: str) -> str:
+    return f"{FLIGHT_PREFIX}leader:{job_id}"
+
+
+def _str(value: Any) -> Optional[str]:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def join(r, key: str, job_id: str, follow: bool = False, ttl: Optional[int] = None) -> Optional[str]:
+    """
+    Register ``job_id`` under ``key``. Returns None when it leads (or
+    deduplication is off), else the leader's job id. With ``follow`` the
+    job is added to the leader's followers for ``settle``.
+    """
+    ttl = SINGLEFLIGHT_TTL_SEC if ttl is None else ttl
+    if ttl <= 0:
+        return None
+    members = f"{key}:members"
+    for _ in range(2):
+        if r.set(key, job_id, ex=ttl, nx=True):
+            r.set(_owner_key(job_id), key, ex=ttl)
+            r.delete(_leader_key(job_id))  # rejoining after a dead leader was settled
+            r.sadd(members, job_id)
+            r.expire(members, ttl)
+            return None
+        leader = _str(r.get(key))
+        if leader is None:
+            continue  # expired or released between SET and GET: try to lead
+        if leader == job_id:
+            return None
+        r.set(_owner_key(job_id), key, ex=ttl)
+        r.set(_leader_key(job_id), leader, ex=ttl)
+        r.sadd(members, job_id)
+        r.expire(members, ttl)
+        if follow:
+            r.rpush(f"{key}:followers", job_id)
+            r.expire(f"{key}:followers", ttl)
+        return leader
+    return None
+
+
+def leader_of(r, job_id: str) -> Optional[str]:
+    """The job doing the work for attached submission ``job_id``; None for leaders and unknown ids."""
+    return _str(r.get(_leader_key(job_id)))
+
+
+def detach(r, job_id: str) -> Tuple[Optional[str], int]:
+    """
+    Drop submission ``job_id`` from its flight. Returns (leader, attached
+    submissions left); leader is None when the job is not in a flight.
+    Detaching the same submission again changes nothing.
+    """
+    key = _str(r.get(_owner_key(job_id)))
+    if key is None:
+        return None, 0
+    leader = leader_of(r, job_id) or _str(r.get(key))
+    r.srem(f"{key}:members", job_id)
+    if leader != job_id:
+        r.lrem(f"{key}:followers", 0, job_id)
+    return leader, int(r.scard(f"{key}:members"))
+
+
+def settle(r, job_id: str, ok: bool, done_ttl: Optional[int] = None) -> List[str]:
+    """Finish ``job_id``'s flight (if it led one); returns its followers."""
+    key = _str(r.get(_owner_key(job_id)))
+    if key is None:
+        return []
+    r.delete(_owner_key(job_id))
+    ttl = (SINGLEFLIGHT_DONE_TTL_SEC if done_ttl is None else done_ttl) if ok else 0
+    followers = r.eval(_SETTLE, 3, key, f"{key}:followers", f"{key}:members", job_id, max(int(ttl), 0))
+    return [_str(f) for f in followers or []]
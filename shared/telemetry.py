@@ -0,0 +1,168 @@
+"""Per-stage latency spans for the generation pipeline.
+
+``span()`` always feeds the job's active ``Recorder`` (see ``recording()``) so
+stage timings can be embedded in manifests and status payloads. When
+installed, spans are also exported to OpenTelemetry (``OTEL_ENABLED=1``) and
+Prometheus; without them every exporter is a no-op.
+"""
+import os
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+try:
+    import prometheus_client as _prom  # type: ignore
+except ImportError:  # pragma: no cover
+    _prom = None  # type: ignore
+
+_tracer = None
+if os.getenv("OTEL_ENABLED", "0") == "1":
+    try:
+        from opentelemetry import trace as _otel_trace  # type: ignore
+        _tracer = _otel_trace.get_tracer("mmf.pipeline")
+    except ImportError:  # pragma: no cover
+        _tracer = None
+
+if _prom is not None:
+    STAGE_SECONDS = _prom.Histogram(
+        "mmf_stage_seconds", "Duration of a pipeline stage", ["stage"],
+        buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900, 1800),
+    )
+    QUEUE_WAIT_SECONDS = _prom.Histogram(
+        "mmf_queue_wait_seconds", "Time a task spent queued before a worker picked it up", ["queue"],
+        buckets=(0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900),
+    )
+    ARTIFACT_BYTES = _prom.Histogram(
+        "mmf_artifact_bytes", "Size of produced artifacts", ["artifact"],
+        buckets=(1e3, 1e4, 1e5, 1e6, 1e7, 5e7, 1e8, 5e8),
+    )
+
+
+class Recorder:
+    """Collects stage timings and artifact sizes for one job."""
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, float] = {}
+        self.artifact_bytes: Dict[str, int] = {}
+        self.attrs: Dict[str, Any] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        # Repeated stages (one span per ref image, say) accumulate
+        self.stages[stage] = round(self.stages.get(stage, 0.0) + seconds, 6)
+
+    def as_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"stages_s": dict(self.stages)}
+        if self.artifact_bytes:
+            out["artifact_bytes"] = dict(self.artifact_bytes)
+        if self.attrs:
+            out.update(self.attrs)
+        return out
+
+
+_current: ContextVar[Optional[Recorder]] = ContextVar("mmf_recorder", default=None)
+
+
+def current() -> Optional[Recorder]:
+    return _current.get()
+
+
+@contextmanager
+def recording() -> Iterator[Recorder]:
+    """Make a fresh ``Recorder`` active for the duration of the block."""
+    rec = Recorder()
+    token = _current.set(rec)
+    try:
+        yield rec
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[None]:
+    t0 = time.perf_counter()
+    if _tracer is not None:
+        with _tracer.start_as_current_span(name, attributes=attrs or None):
+            try:
+                yield
+            finally:
+                _finish(name, time.perf_counter() - t0)
+    else:
+        try:
+            yield
+        finally:
+            _finish(name, time.perf_counter() - t0)
+
+
+def _finish(name: str, seconds: float) -> None:
+    rec = _current.get()
+    if rec is not None:
+        rec.add(name, seconds)
+    if _prom is not None:
+        STAGE_SECONDS.labels(stage=name).observe(seconds)
+
+
+def observe_queue_wait(queue: str, enqueued_at: Optional[float]) -> Optional[float]:
+    """Record how long a task waited in ``queue``; ``enqueued_at`` is a ``time.time()`` stamp."""
+    if not enqueued_at:
+        return None
+    waited = max(0.0, time.time() - float(enqueued_at))
+    rec = _current.get()
+    if rec is not None:
+        rec.attrs["queue_wait_s"] = round(waited, 6)
+    if _prom is not None:
+        QUEUE_WAIT_SECONDS.labels(queue=queue).observe(waited)
+    return waited
+
+
+def record_artifact(name: str, path: Any) -> int:
+    """Record the on-disk size of an artifact; returns 0 when it does not exist."""
+    try:
+        size = Path(path).stat().st_size
+    except (OSError, TypeError):
+        return 0
+    rec = _current.get()
+    if rec is not None:
+        rec.artifact_bytes[name] = size
+    if _prom is not None:
+        ARTIFACT_BYTES.labels(artifact=name).observe(size)
+    return size
+
+
+def peak_rss_mb() -> float:
+    """High-water resident set size of this process in MiB (0.0 where unsupported)."""
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - Windows
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+def _registry():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # Prefork workers: every child writes to the shared dir, collect across all of them
+        from prometheus_client import CollectorRegistry
+        from prometheus_client.multiprocess import MultiProcessCollector
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        return registry
+    return _prom.REGISTRY
+
+
+def metrics_payload() -> Tuple[bytes, str]:
+    """Prometheus exposition body and content type (empty when prometheus_client is missing)."""
+    if _prom is None:
+        return b"", "text/plain; version=0.0.4; charset=utf-8"
+    return _prom.generate_latest(_registry()), _prom.CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port: int) -> bool:
+    """Serve /metrics from a background thread (worker processes). False when unavailable."""
+    if _prom is None or not port:
+        return False
+    _prom.start_http_server(int(port), registry=_registry())
+    return True
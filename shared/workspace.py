@@ -0,0 +1,255 @@
+"""Per-job scratch directories under ``JOB_TMP_DIR`` with a bounded footprint.
+
+``allocate`` creates ``<root>/<prefix>_<random hex>`` with a ``.workspace`` marker.
+Inside ``scope()`` every allocated directory is either marked done (job
+succeeded: its files stay servable as cached artifacts) or removed (job
+failed, was cancelled or preempted). Providers call ``finish`` when they
+return, which marks directories allocated outside any scope done. ``release``
+removes a directory once its files are uploaded.
+
+``sweep`` (run at most every ``WORKSPACE_SWEEP_INTERVAL_SEC`` from
+``allocate``) removes done directories older than ``WORKSPACE_TTL_SEC`` and
+active ones whose job died, then evicts done directories least recently used
+first until the root fits in ``WORKSPACE_QUOTA_MB``. Active directories are
+never evicted for quota. An active directory's job is dead when its process
+is gone, which is checked when it was allocated under the running kernel (same
+boot id) and the pid still names the same process (same start time, so a
+restarted container reusing the pid does not keep it alive). Otherwise its
+lease decides: ``scope()`` renews the lease of the directories it owns while
+the block runs; unscoped directories are never renewed and age out.
+
+``scratch`` gives a throwaway directory for small intermediates, on tmpfs
+(``WORKSPACE_TMPFS``) when it has room, deleted when the block exits.
+"""
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from shared.serialization import dumpb, loads
+
+JOB_TMP_DIR = os.getenv("JOB_TMP_DIR", "/app/tmp")
+WORKSPACE_QUOTA_MB = int(os.getenv("WORKSPACE_QUOTA_MB", "10240"))
+WORKSPACE_TTL_SEC = int(os.getenv("WORKSPACE_TTL_SEC", str(24 * 3600)))
+WORKSPACE_LEASE_SEC = int(os.getenv("WORKSPACE_LEASE_SEC", "3600"))
+WORKSPACE_SWEEP_INTERVAL_SEC = float(os.getenv("WORKSPACE_SWEEP_INTERVAL_SEC", "60"))
+WORKSPACE_TMPFS = os.getenv("WORKSPACE_TMPFS", "/dev/shm")
+WORKSPACE_TMPFS_MIN_FREE_MB = int(os.getenv("WORKSPACE_TMPFS_MIN_FREE_MB", "512"))
+
+MARKER = ".workspace"
+
+
+def _boot_id() -> Optional[str]:
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _proc_start(pid: int) -> Optional[int]:
+    """Start time of ``pid`` in clock ticks since boot; None when it does not exist."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+        # comm may contain spaces and parens; fields resume after the last ')'
+        return int(stat[stat.rindex(")") + 2:].split()[19])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+_current: ContextVar[Optional[List[Path]]] = ContextVar("mmf_workspaces", default=None)
+_last_sweep: Dict[str, float] = {}
+
+
+def _write_marker(path: Path, meta: Dict[str, Any]) -> None:
+    (path / MARKER).write_bytes(dumpb(meta))
+
+
+def _read_marker(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return loads((path / MARKER).read_bytes())
+    except (OSError, ValueError):
+        return None
+
+
+def dir_bytes(path: Path) -> int:
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.lstat(os.path.join(dirpath, f)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def allocate(prefix: str, root: Optional[str] = None) -> Path:
+    """A fresh job directory; registered with the active ``scope()``, if any."""
+    base = Path(root or JOB_TMP_DIR)
+    maybe_sweep(base)
+    path = base / f"{prefix}_{os.urandom(16).hex()}"
+    path.mkdir(parents=True, exist_ok=True)
+    dirs = _current.get()
+    pid = os.getpid()
+    _write_marker(path, {
+        "state": "active", "created": time.time(), "scoped": dirs is not None,
+        "pid": pid, "boot": _boot_id(), "started": _proc_start(pid),
+    })
+    if dirs is not None:
+        dirs.append(path)
+    return path
+
+
+def done(path: Path) -> None:
+    """Job finished: keep the files as evictable cached artifacts."""
+    meta = _read_marker(path)
+    if meta is None:
+        return
+    meta.update(state="done", finished=time.time(), bytes=dir_bytes(path))
+    _write_marker(path, meta)
+
+
+def finish(path: Path) -> None:
+    """Provider returned: mark ``path`` done unless a ``scope()`` owns it and decides on exit."""
+    dirs = _current.get()
+    if dirs is None or path not in dirs:
+        done(path)
+
+
+def touch(path: Any, root: Optional[str] = None) -> None:
+    """Mark the workspace containing ``path`` as recently used (LRU)."""
+    base = Path(root or JOB_TMP_DIR).resolve()
+    try:
+        first = Path(path).resolve().relative_to(base).parts[0]
+        os.utime(base / first / MARKER)
+    except (ValueError, IndexError, OSError):
+        pass
+
+
+def release(path: Path) -> None:
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _renew(dirs: List[Path], stop: threading.Event, interval: float) -> None:
+    while not stop.wait(interval):
+        for d in list(dirs):
+            try:
+                os.utime(d / MARKER)
+            except OSError:
+                pass
+
+
+@contextmanager
+def scope() -> Iterator[List[Path]]:
+    """Keep workspaces allocated in the block on success, remove them on any exception."""
+    dirs: List[Path] = []
+    token = _current.set(dirs)
+    stop = threading.Event()
+    keeper = threading.Thread(target=_renew, args=(dirs, stop, max(1.0, WORKSPACE_LEASE_SEC / 4)),
+                              name="mmf-workspace-lease", daemon=True)
+    keeper.start()
+    try:
+        yield dirs
+    except BaseException:
+        for d in dirs:
+            release(d)
+        raise
+    else:
+        for d in dirs:
+            done(d)
+    finally:
+        stop.set()
+        _current.reset(token)
+
+
+def _owner_alive(meta: Dict[str, Any]) -> Optional[bool]:
+    """
+    Whether the allocating scope's process still runs; None when that cannot
+    be told here (another host or boot, no /proc, or an unscoped directory).
+    """
+    if not meta.get("scoped") or not meta.get("boot") or meta["boot"] != _boot_id():
+        return None
+    if meta.get("pid") is None or meta.get("started") is None:
+        return None
+    return _proc_start(int(meta["pid"])) == meta["started"]
+
+
+def sweep(root: Optional[str] = None, quota_mb: int = WORKSPACE_QUOTA_MB, ttl_sec: int = WORKSPACE_TTL_SEC,
+          lease_sec: int = WORKSPACE_LEASE_SEC) -> Dict[str, int]:
+    """Apply TTLs and the quota to ``root``; returns counts and bytes."""
+    base = Path(root or JOB_TMP_DIR)
+    now = time.time()
+    removed = freed = usage = 0
+    evictable = []
+    try:
+        children = list(base.iterdir())
+    except OSError:
+        children = []
+    for d in children:
+        meta = _read_marker(d) if d.is_dir() else None
+        if meta is None:
+            continue  # not ours (caches, indexes, files from older releases)
+        try:
+            last_used = (d / MARKER).stat().st_mtime
+        except OSError:
+            continue
+        size = int(meta["bytes"]) if meta.get("state") == "done" and "bytes" in meta else dir_bytes(d)
+        if meta.get("state") == "done":
+            expired = now - last_used > ttl_sec
+        else:
+            alive = _owner_alive(meta)
+            expired = not alive if alive is not None else now - last_used > lease_sec
+        if expired:
+            release(d)
+            removed, freed = removed + 1, freed + size
+            continue
+        usage += size
+        if meta.get("state") == "done":
+            evictable.append((last_used, size, d))
+    quota = quota_mb * 1024 * 1024
+    for _, size, d in sorted(evictable, key=lambda e: e[0]):
+        if usage <= quota:
+            break
+        release(d)
+        removed, freed, usage = removed + 1, freed + size, usage - size
+    return {"removed": removed, "freed_bytes": freed, "usage_bytes": usage}
+
+
+def maybe_sweep(base: Path) -> None:
+    key = str(base)
+    now = time.monotonic()
+    if now - _last_sweep.get(key, -WORKSPACE_SWEEP_INTERVAL_SEC) < WORKSPACE_SWEEP_INTERVAL_SEC:
+        return
+    _last_sweep[key] = now
+    stats = sweep(key)
+    if stats["removed"]:
+        print(f"workspace sweep: removed {stats['removed']} dir(s), {stats['freed_bytes'] / 1e6:.1f} MB")
+
+
+def _tmpfs_ok() -> bool:
+    try:
+        st = os.statvfs(WORKSPACE_TMPFS)
+    except (OSError, AttributeError):
+        return False
+    return os.access(WORKSPACE_TMPFS, os.W_OK) and st.f_bavail * st.f_frsize >= WORKSPACE_TMPFS_MIN_FREE_MB * 1024 * 1024
+
+
+@contextmanager
+def scratch(prefix: str, root: Optional[str] = None) -> Iterator[Path]:
+    """A throwaway directory for small intermediates; tmpfs when it has room."""
+    import tempfile
+    if _tmpfs_ok():
+        base = Path(WORKSPACE_TMPFS)
+    else:
+        base = Path(root or JOB_TMP_DIR) / ".scratch"
+        base.mkdir(parents=True, exist_ok=True)
+    path = Path(tempfile.mkdtemp(prefix=f"{prefix}_", dir=str(base)))
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,71 @@
+import hashlib
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from apps.api.routes import artifacts
+from benchmarks._fakes import FakeRedis
+
+
+def test_parse_range():
+    assert artifacts.parse_range("", 100) is None
+    assert artifacts.parse_range("bytes=0-9", 100) == (0, 9)
+    assert artifacts.parse_range("bytes=90-", 100) == (90, 99)
+    assert artifacts.parse_range("bytes=-10", 100) == (90, 99)
+    assert artifacts.parse_range("bytes=50-500", 100) == (50, 99)
+    assert artifacts.parse_range("bytes=0-1,5-6", 100) is None
+    with pytest.raises(ValueError):
+        artifacts.parse_range("bytes=100-", 100)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    glb = tmp_path / "env_x" / "scene.glb"
+    glb.parent.mkdir()
+    glb.write_bytes(bytes(range(256)) * 4)
+    fake = FakeRedis(decode_responses=True)
+    fake.set("job1", json.dumps({"status": "env_done", "detail": {"scene_glb": str(glb)}}))
+    fake.set("evil", json.dumps({"status": "env_done", "detail": {"scene_glb": "/etc/passwd"}}))
+    fake.set("odd", json.dumps(["not", "a", "dict"]))
+    monkeypatch.setattr(artifacts, "JOB_TMP_DIR", str(tmp_path))
+    monkeypatch.setattr(artifacts, "_status_client", lambda: fake)
+    app = FastAPI()
+    app.include_router(artifacts.router)
+    return TestClient(app)
+
+
+def test_full_range_and_conditional(client):
+    full = client.get("/v1/artifacts/job1/scene.glb")
+    assert full.status_code == 200 and len(full.content) == 1024
+    assert full.headers["accept-ranges"] == "bytes"
+    etag = full.headers["etag"]
+
+    part = client.get("/v1/artifacts/job1/scene.glb", headers={"Range": "bytes=10-19"})
+    assert part.status_code == 206 and part.content == bytes(range(10, 20))
+    assert part.headers["content-range"] == "bytes 10-19/1024"
+
+    assert client.get("/v1/artifacts/job1/scene.glb", headers={"If-None-Match": etag}).status_code == 304
+    stale = client.get("/v1/artifacts/job1/scene.glb", headers={"Range": "bytes=0-1", "If-Range": '"old"'})
+    assert stale.status_code == 200
+    assert client.get("/v1/artifacts/job1/scene.glb", headers={"Range": "bytes=5000-"}).status_code == 416
+
+
+def test_pinned_url_is_immutable(client):
+    digest = client.get("/v1/artifacts/job1/scene.glb").headers["etag"].strip('"')
+    assert digest == hashlib.sha256(bytes(range(256)) * 4).hexdigest()
+    assert "immutable" not in client.get("/v1/artifacts/job1/scene.glb").headers["cache-control"]
+    pinned = client.get(f"/v1/artifacts/job1/scene.glb?v={digest}")
+    assert "immutable" in pinned.headers["cache-control"]
+    assert "immutable" not in client.get("/v1/artifacts/job1/scene.glb?v=stale").headers["cache-control"]
+
+
+def test_refuses_paths_outside_job_root(client):
+    assert client.get("/v1/artifacts/evil/scene.glb").status_code == 404
+    assert client.get("/v1/artifacts/missing/scene.glb").status_code == 404
+    assert client.get("/v1/artifacts/odd/scene.glb").status_code == 404
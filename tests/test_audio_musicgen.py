@@ -0,0 +1,29 @@
+import wave
+
+from shared.providers.audio_musicgen_small import Audio_MusicGen_Small
+
+
+def test_procedural_audio_is_chunked_and_sfx_cached(tmp_path):
+    cfg = {"job_root": str(tmp_path), "cache_dir": str(tmp_path / "sfx"), "load_models": False, "chunk_s": 2}
+    provider = Audio_MusicGen_Small(cfg=cfg)
+    result = provider.generate({"tempo": 120, "mood": ["minor"], "sfx": ["rain"], "duration_s": 5})
+    art = result["artifacts"]
+    assert len(art["music_segments"]) == 3
+    with wave.open(art["music_wav"]) as w:
+        assert w.getnframes() == 5 * w.getframerate()
+    assert open(art["music_playlist"]).read().count("#EXTINF") == 3
+    assert result["provenance"]["backend"] == "procedural"
+
+    loop = art["sfx_loops"]["rain"]
+    again = Audio_MusicGen_Small(cfg=cfg).generate({"sfx": ["Rain"], "duration_s": 2})
+    assert again["artifacts"]["sfx_loops"]["Rain"] == loop
+
+
+def test_length_follows_the_camera_duration(tmp_path):
+    cfg = {"job_root": str(tmp_path), "cache_dir": str(tmp_path / "sfx"), "load_models": False}
+    provider = Audio_MusicGen_Small(cfg=cfg)
+    plan = {"camera": {"path": "orbit", "duration_s": 3}, "audio": {"tempo": 90, "mood": ["lofi"], "sfx": []}}
+    for result in (provider.generate(plan), provider.generate(plan["audio"], duration_s=3)):
+        assert result["provenance"]["duration_s"] == 3
+        with wave.open(result["artifacts"]["music_wav"]) as w:
+            assert w.getnframes() == 3 * w.getframerate()
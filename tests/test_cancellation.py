@@ -0,0 +1,48 @@
+import pytest
+
+from benchmarks._fakes import FakeRedis
+from shared import cancellation, singleflight
+from shared.providers.env_stub import Env_Stub
+from shared.providers.env_triposr_fast import Env_TripoSR_Fast
+
+
+def test_checkpoints_raise_only_inside_a_watch():
+    cancellation.checkpoint("anything")  # no watch: no-op
+    r = FakeRedis(decode_responses=True)
+    with cancellation.watching(lambda: cancellation.requested(r, "job-1"), interval=0):
+        cancellation.checkpoint("env.refs")
+        cancellation.request(r, "job-1")
+        assert cancellation.interrupted() == "cancelled"
+        with pytest.raises(cancellation.JobCancelled):
+            cancellation.checkpoint("env.export")
+
+
+def test_batch_work_is_preempted():
+    with cancellation.watching(lambda: False, preempt=lambda: True, interval=0):
+        with pytest.raises(cancellation.JobPreempted):
+            cancellation.checkpoint("env.refs")
+
+
+def test_provider_stops_between_stages(tmp_path):
+    provider = Env_TripoSR_Fast(cfg={"job_root": str(tmp_path), "load_models": False, "scene_reuse": False})
+    with cancellation.watching(lambda: True, interval=0), pytest.raises(cancellation.JobCancelled):
+        provider.generate({"environment": {"theme": "alley"}})
+    assert not list(tmp_path.rglob("*.glb"))
+
+
+def test_shared_job_survives_until_last_submitter_detaches():
+    r = FakeRedis(decode_responses=True)
+    key = singleflight.prompt_key("neon alley")
+    singleflight.join(r, key, "job-a", follow=True)
+    singleflight.join(r, key, "job-b", follow=True)
+    assert singleflight.detach(r, "job-b") == ("job-a", 1)
+    assert singleflight.detach(r, "job-a") == ("job-a", 0)
+    # The detached follower no longer receives the leader's result
+    assert singleflight.settle(r, "job-a", ok=False) == []
+
+
+def test_stub_provider_honours_cancellation(tmp_path):
+    provider = Env_Stub(cfg={"job_root": str(tmp_path)})
+    with cancellation.watching(lambda: True, interval=0), pytest.raises(cancellation.JobCancelled):
+        provider.generate({"environment": {"theme": "alley"}})
+    assert not list(tmp_path.rglob("*.glb"))
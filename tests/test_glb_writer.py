@@ -0,0 +1,126 @@
+import json
+import struct
+
+from shared.providers.glb_writer import GLBWriter, S3MultipartSink
+from shared.providers.mesh_utils import box_proxy, placeholder_mesh, write_glb, write_scene_lods
+
+
+def _parse(data: bytes):
+    magic, version, total = struct.unpack_from("<III", data, 0)
+    assert magic == 0x46546C67 and version == 2 and total == len(data)
+    json_len, json_type = struct.unpack_from("<II", data, 12)
+    assert json_type == 0x4E4F534A and json_len % 4 == 0
+    doc = json.loads(data[20:20 + json_len])
+    rest = data[20 + json_len:]
+    bin_chunk = b""
+    if rest:
+        bin_len, bin_type = struct.unpack_from("<II", rest, 0)
+        assert bin_type == 0x004E4942 and bin_len % 4 == 0
+        bin_chunk = rest[8:8 + bin_len]
+    return doc, bin_chunk
+
+
+def test_empty_scene_is_valid_glb():
+    doc, bin_chunk = _parse(GLBWriter().to_bytes())
+    assert doc["asset"]["version"] == "2.0"
+    assert bin_chunk == b"" and "buffers" not in doc
+
+
+def test_meshes_stream_into_one_aligned_buffer(tmp_path):
+    meshes = [placeholder_mesh(), placeholder_mesh(), {"vertices": [[0, 0, 0], [2, 0, 0], [0, 3, 1]], "faces": [[0, 1, 2]]}]
+    out = tmp_path / "scene.glb"
+    written = write_glb(meshes, out)
+    data = out.read_bytes()
+    assert written == len(data)
+    doc, bin_chunk = _parse(data)
+    assert len(doc["nodes"]) == 3 and doc["scenes"][0]["nodes"] == [0, 1, 2]
+    assert doc["nodes"][1]["translation"] == [0.5, 0.0, 0.0]
+    assert doc["buffers"][0]["byteLength"] <= len(bin_chunk)
+    for view in doc["bufferViews"]:
+        assert view["byteOffset"] % 4 == 0
+    pos = doc["accessors"][doc["meshes"][2]["primitives"][0]["attributes"]["POSITION"]]
+    assert pos["count"] == 3 and pos["max"] == [2.0, 3.0, 1.0]
+    view = doc["bufferViews"][pos["bufferView"]]
+    floats = struct.unpack_from("<9f", bin_chunk, view["byteOffset"])
+    assert floats[3] == 2.0
+
+
+def test_byte_length_known_before_writing():
+    w = GLBWriter()
+    w.add_mesh([[0, 0, 0], [1, 0, 0], [0, 1, 0]], [[0, 1, 2]])
+    assert w.byte_length() == len(w.to_bytes())
+
+
+class _FakeS3:
+    def __init__(self):
+        self.parts, self.completed, self.aborted = [], None, False
+
+    def create_multipart_upload(self, **kw):
+        return {"UploadId": "u1"}
+
+    def upload_part(self, PartNumber, Body, **kw):
+        self.parts.append(Body)
+        return {"ETag": f"e{PartNumber}"}
+
+    def complete_multipart_upload(self, MultipartUpload, **kw):
+        self.completed = MultipartUpload["Parts"]
+
+    def abort_multipart_upload(self, **kw):
+        self.aborted = True
+
+
+def test_s3_multipart_sink_bounds_parts():
+    s3 = _FakeS3()
+    payload = b"x" * (S3MultipartSink.MIN_PART * 2 + 10)
+    with S3MultipartSink(s3, "b", "k", part_size=1) as sink:
+        sink.write(payload[:7])
+        sink.write(payload[7:])
+    assert [len(p) for p in s3.parts] == [S3MultipartSink.MIN_PART, S3MultipartSink.MIN_PART, 10]
+    assert [p["PartNumber"] for p in s3.completed] == [1, 2, 3]
+    assert b"".join(s3.parts) == payload
+
+
+def _grid(n):
+    verts = [[x / n, y / n, 0.0] for y in range(n + 1) for x in range(n + 1)]
+    faces = []
+    for y in range(n):
+        for x in range(n):
+            a = y * (n + 1) + x
+            faces += [[a, a + 1, a + n + 2], [a, a + n + 2, a + n + 1]]
+    return {"vertices": verts, "faces": faces}
+
+
+def test_box_proxy_spans_bounds():
+    box = box_proxy({"vertices": [[-1, 0, 2], [3, 5, 4]], "faces": [[0, 1, 1]]})
+    assert len(box["faces"]) == 12
+    assert min(v[0] for v in box["vertices"]) == -1 and max(v[1] for v in box["vertices"]) == 5
+
+
+def test_scene_lods_coarse_first_and_smaller(tmp_path):
+    meshes = [_grid(20), placeholder_mesh()]
+    lods = write_scene_lods(meshes, tmp_path, coarse_faces=64, chunks=True)
+    assert [e["name"] for e in lods] == ["scene_lod0", "scene_glb", "chunk_0", "chunk_1"]
+    for e in lods:
+        assert (tmp_path / e["file"]).stat().st_size == e["bytes"]
+        _parse((tmp_path / e["file"]).read_bytes())
+    assert lods[0]["lod"] == 0 and lods[0]["bytes"] < lods[1]["bytes"] / 10
+    assert lods[2]["object"] == "asset_0"
+
+
+def test_timeline_adds_cached_camera_animation(tmp_path):
+    from shared.providers.timeline import camera_track
+
+    timeline = {"camera": {"path": "orbit", "duration_s": 4}, "audio": {"tempo": 120}, "fps": 10}
+    lods = write_scene_lods([_grid(4)], tmp_path, timeline=timeline)
+    doc, _ = _parse((tmp_path / lods[1]["file"]).read_bytes())
+    anim = doc["animations"][0]
+    assert {c["target"]["path"] for c in anim["channels"]} == {"translation", "rotation"}
+    times = doc["accessors"][anim["samplers"][0]["input"]]
+    assert times["count"] == 41 and times["max"] == [4.0]
+    # Both channels share the one input accessor
+    assert anim["samplers"][0]["input"] == anim["samplers"][1]["input"]
+    extras = doc["scenes"][0]["extras"]["timeline"]
+    assert extras["camera_path"] == "orbit" and extras["bars_s"] == [0.0, 2.0, 4.0]
+    bounds = ([0.0, 0.0, 0.0], [1.0, 1.0, 0.0])
+    assert camera_track("orbit", 4, bounds, 10) is camera_track("orbit", 4.0, bounds, 10)
+    assert len(camera_track("static", 4, bounds, 10)[0]) == 1
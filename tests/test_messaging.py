@@ -0,0 +1,52 @@
+from shared.messaging import encode_plan, pack_plan, unpack_plan
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.store:
+            return None
+        self.store[key] = value
+        return True
+
+    def expire(self, key, ttl):
+        return key in self.store
+
+    def get(self, key):
+        return self.store.get(key)
+
+
+def test_small_plan_is_inlined():
+    plan = {"environment": {"theme": "alley"}}
+    env = pack_plan(plan, _FakeRedis())
+    assert env == {"plan": plan}
+    assert unpack_plan(env) == plan
+
+
+def test_large_plan_spills_to_content_addressed_key(monkeypatch):
+    import shared.messaging as messaging
+    monkeypatch.setattr(messaging, "PLAN_INLINE_MAX_BYTES", 16)
+    r = _FakeRedis()
+    plan = {"environment": {"theme": "a long cyberpunk alley"}, "objects": []}
+    first = pack_plan(plan, r)
+    second = pack_plan(dict(reversed(list(plan.items()))), r)
+    assert first == second and "plan_ref" in first
+    assert len(r.store) == 1
+    assert unpack_plan(first, r) == plan
+
+
+def test_encode_plan_is_canonical():
+    assert encode_plan({"b": 1, "a": 2}) == encode_plan({"a": 2, "b": 1})
+
+
+def test_sagemaker_plan_round_trips_through_s3(tmp_path):
+    from benchmarks._fakes import LocalS3
+    from shared.messaging import get_plan_s3, put_plan_s3
+
+    s3 = LocalS3(tmp_path)
+    plan = {"objects": [{"type": "crate", "instances": 2}]}
+    key = put_plan_s3(s3, "bucket", "envgen-1", plan, root="prefix/")
+    assert key == "prefix/jobs/envgen-1/plan.json"
+    assert get_plan_s3(s3, "bucket", key) == plan
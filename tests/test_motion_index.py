@@ -0,0 +1,36 @@
+import os
+
+from shared.providers.motion_index import MotionIndex
+from shared.providers.motion_mdm_base import Motion_MDM_Base
+
+
+def test_library_clip_matches_rephrasings(tmp_path):
+    lib = tmp_path / "lib"
+    lib.mkdir()
+    (lib / "walk_cautiously.bvh").write_text("HIERARCHY\n")
+    index = MotionIndex(root=str(tmp_path / "idx"), library=str(lib))
+    entry, score = index.lookup("Walking cautiously")
+    assert entry["source"] == "library" and score == 1.0
+    assert index.lookup("cautious walk")[0]["id"] == entry["id"]
+    assert index.lookup("run") is None
+    assert index.lookup("walk cautiously", rig="quadruped") is None
+
+    # A clip dropped in later is picked up without touching index.json
+    clip = lib / "jump_over_fence.bvh"
+    clip.write_text("HIERARCHY\n")
+    os.utime(lib, (lib.stat().st_atime, lib.stat().st_mtime + 1))
+    assert index.lookup("jump over fence")[0]["path"] == str(clip)
+
+
+def test_miss_generates_and_is_stored(tmp_path):
+    cfg = {"job_root": str(tmp_path), "index_dir": str(tmp_path / "idx")}
+    first = Motion_MDM_Base(cfg=cfg).generate({"motion_text": "run"})
+    assert first["provenance"]["cache"]["status"] == "miss"
+    # A fresh provider (another worker) sees the stored clip
+    second = Motion_MDM_Base(cfg=cfg).generate({"motion_text": "running"})
+    assert second["provenance"]["cache"]["status"] == "hit"
+    assert second["artifacts"]["motion_clip"] == first["artifacts"]["motion_clip"]
+
+    # Once MDM is configured, procedural placeholders are not reused
+    index = MotionIndex(root=cfg["index_dir"])
+    assert index.lookup("run", sources=("library", "generated")) is None
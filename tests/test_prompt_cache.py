@@ -0,0 +1,48 @@
+import pytest
+
+from shared.providers.prompt_cache import PromptEmbedCache
+
+
+class _Pipe:
+    def __init__(self):
+        self.calls = 0
+
+    def encode_prompt(self, prompt, device, num_images_per_prompt, do_classifier_free_guidance):
+        self.calls += 1
+        neg = f"neg:{prompt}" if do_classifier_free_guidance else None
+        return f"emb:{prompt}", neg, f"pooled:{prompt}", neg
+
+
+def test_repeated_prompts_skip_the_text_encoders():
+    cache, pipe = PromptEmbedCache(size=4, root=None), _Pipe()
+    first, src1 = cache.get(pipe, "sdxl", "alley, night, light_rain, cinematic", "cpu")
+    second, src2 = cache.get(pipe, "sdxl", "alley, night, light_rain, cinematic", "cpu")
+    assert (src1, src2) == ("miss", "hit") and pipe.calls == 1
+    assert first == second and first["pooled_prompt_embeds"] == "pooled:alley, night, light_rain, cinematic"
+    # Model id and CFG are part of the key; no-CFG calls carry no negative embeds
+    turbo, _ = cache.get(pipe, "sdxl-turbo", "alley, night, light_rain, cinematic", "cpu", do_cfg=False)
+    assert pipe.calls == 2 and "negative_prompt_embeds" not in turbo
+
+
+def test_lru_evicts_least_recently_used():
+    cache, pipe = PromptEmbedCache(size=2, root=None), _Pipe()
+    for p in ("a", "b", "a", "c"):
+        cache.get(pipe, "m", p, "cpu")
+    assert cache.get(pipe, "m", "a", "cpu")[1] == "hit"
+    assert cache.get(pipe, "m", "b", "cpu")[1] == "miss"
+
+
+def test_embeddings_persist_as_safetensors(tmp_path):
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("safetensors")
+
+    class _TensorPipe(_Pipe):
+        def encode_prompt(self, prompt, **_):
+            self.calls += 1
+            return torch.ones(1, 77, 8), torch.zeros(1, 77, 8), torch.ones(1, 8), torch.zeros(1, 8)
+
+    pipe = _TensorPipe()
+    PromptEmbedCache(root=str(tmp_path)).get(pipe, "m", "fog", "cpu")
+    embeds, source = PromptEmbedCache(root=str(tmp_path)).get(pipe, "m", "fog", "cpu")
+    assert source == "disk" and pipe.calls == 1
+    assert torch.equal(embeds["prompt_embeds"], torch.ones(1, 77, 8))
@@ -0,0 +1,90 @@
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+from shared import runtime_model
+
+POOL = runtime_model.candidates("ml.m5.xlarge:16:0.23,ml.g5.xlarge:16:1.408,ml.m5.4xlarge:64:0.922")
+
+
+def _history(n=60, seed=0):
+    rng = random.Random(seed)
+    samples = []
+    for i in range(n):
+        f = {"objects": rng.randint(0, 6), "instances": 0, "num_refs": rng.choice([1, 2, 4]),
+             "steps": rng.choice([4, 24]), "zero123": rng.randint(0, 1)}
+        f["instances"] = f["objects"] * rng.randint(1, 4)
+        work = 5 * f["instances"] + 3 * f["num_refs"] * f["steps"] + 60 * f["zero123"] * f["num_refs"]
+        for itype, speed in (("ml.m5.xlarge", 1.0), ("ml.g5.xlarge", 0.1)):
+            samples.append({"instance_type": itype, "features": f, "wall_s": 40 + work * speed + rng.uniform(0, 5),
+                            "peak_rss_mb": 3000 + 900 * f["num_refs"], "finished_at": i})
+    return samples
+
+
+def test_no_model_keeps_static_settings():
+    assert runtime_model.choose(runtime_model.features(), None)["source"] == "default"
+
+
+def test_choose_trades_runtime_against_price():
+    model = runtime_model.fit(_history())
+    light = runtime_model.features(cfg={"turbo": True, "num_refs": 1})
+    heavy = {"objects": 6, "instances": 24, "num_refs": 4, "steps": 24, "zero123": 1}
+    assert runtime_model.choose(light, model, POOL)["instance_type"] == "ml.m5.xlarge"
+    pick = runtime_model.choose(heavy, model, POOL)
+    assert pick["instance_type"] == "ml.g5.xlarge"
+    assert pick["max_runtime_s"] >= pick["predicted_s"]
+
+
+def test_replay_scores_held_out_jobs(capsys, tmp_path):
+    history = tmp_path / "h.jsonl"
+    history.write_text("".join(json.dumps(s) + "\n" for s in _history()))
+    assert runtime_model.main(["replay", str(history)]) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert report["scored"] == report["test"] > 0
+    assert report["timeout_rate"] == 0 and report["mae_s"] < 10
+
+
+def test_submissions_without_a_plan_keep_static_settings_and_timeouts_never_drop_below_them():
+    assert runtime_model.for_submission()["source"] == "default"
+    model = runtime_model.fit(_history())
+    light = runtime_model.features(cfg={"turbo": True, "num_refs": 1})
+    assert runtime_model.choose(light, model, POOL)["max_runtime_s"] >= runtime_model.SM_MAX_SEC
+
+
+def test_censored_jobs_are_lower_bounds():
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    desc = {
+        "ProcessingJobName": "envgen-1", "ProcessingJobStatus": "Failed",
+        "ProcessingStartTime": start, "ProcessingEndTime": start + timedelta(seconds=1800),
+        "StoppingCondition": {"MaxRuntimeInSeconds": 1800},
+        "ProcessingResources": {"ClusterConfig": {"InstanceType": "ml.m5.xlarge"}},
+        "Environment": {"PROMPT_JSON": json.dumps({"prompt": "x"})},
+    }
+    sample = runtime_model.sample_from_processing_job(desc)
+    assert sample["censored"] and sample["wall_s"] == 1800 and sample["job_id"] == "envgen-1"
+    crashed = {**desc, "ProcessingEndTime": start + timedelta(seconds=60)}
+    assert runtime_model.sample_from_processing_job(crashed) is None
+
+    # Heavy jobs cut off well short of their true runtime still pull predictions up
+    history = [s for s in _history() if s["instance_type"] == "ml.m5.xlarge"]
+    heavy = [s for s in history if s["wall_s"] > 200]
+    cut = [{**s, "wall_s": 150.0, "censored": True} for s in heavy]
+    light = [s for s in history if s["wall_s"] <= 200]
+    naive = runtime_model.fit(light + [{**s, "censored": False} for s in cut])
+    aware = runtime_model.fit(light + cut)
+    feats = heavy[0]["features"]
+    assert runtime_model.predict(aware, feats, "ml.m5.xlarge")[0] > runtime_model.predict(naive, feats, "ml.m5.xlarge")[0]
+    assert runtime_model.replay(light + cut)["censored"] >= 0
+
+
+def test_submission_is_sized_from_its_plan(monkeypatch):
+    model = runtime_model.fit(_history())
+    monkeypatch.setattr(runtime_model, "load_model", lambda: model)
+    monkeypatch.setattr(runtime_model, "candidates", lambda: POOL)
+    small = {"objects": [{"type": "crate", "instances": 1}]}
+    big = {"objects": [{"type": "tree", "instances": 4}] * 6}
+    light = runtime_model.for_submission(small, {"turbo": True, "num_refs": 1})
+    heavy = runtime_model.for_submission(big, {"num_refs": 4, "zero123": True})
+    assert light["source"] == heavy["source"] == "model"
+    assert heavy["features"]["instances"] == 24 and light["features"]["instances"] == 1
+    assert (light["instance_type"], heavy["instance_type"]) == ("ml.m5.xlarge", "ml.g5.xlarge")
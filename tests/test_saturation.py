@@ -0,0 +1,100 @@
+import types
+
+from benchmarks._fakes import FakeRedis
+from shared import autotune, saturation
+
+
+def test_snapshot_reports_depth_utilization_and_drain_time():
+    broker, r = FakeRedis(), FakeRedis(decode_responses=True)
+    broker.rpush("env", *[b"msg"] * 3)
+    broker.rpush("env\x06\x163", b"msg")  # priority sibling list
+    saturation.register_node(r, "env@a", ["env", "env_batch"], 2)
+    saturation.register_node(r, "orch@a", ["orchestrator"], 4)
+    saturation.task_started(r, "t1", "env", "run_env")
+    saturation.task_started(r, "t2", "env", "run_env")
+    r.set("sat:runtime:env", "60")
+
+    snap = saturation.snapshot(broker, r, queues=["env", "orchestrator"])
+    env = snap["queues"]["env"]
+    assert (env["depth"], env["busy"], env["slots"], env["utilization"]) == (4, 2, 2, 1.0)
+    assert env["drain_s"] == (4 + 0.5 * 2) * 60 / 2
+    idle = snap["queues"]["orchestrator"]
+    assert (idle["depth"], idle["busy"], idle["slots"], idle["drain_s"]) == (0, 0, 4, 0.0)
+
+    text = saturation.exposition(snap)
+    assert 'mmf_queue_depth{queue="env"} 4' in text
+    assert 'mmf_queue_drain_seconds{queue="env"} 150.0' in text
+    assert 'mmf_task_runtime_avg_seconds{queue="orchestrator"}' not in text  # unknown yet
+
+
+def test_finished_tasks_free_their_slot_and_feed_the_runtime_average():
+    r = FakeRedis(decode_responses=True)
+    saturation.task_started(r, "t1", "env", "run_env")
+    seconds = saturation.task_finished(r, "t1", "env", "run_env")
+    assert not r.exists("sat:task:t1")
+    assert abs(float(r.get("sat:runtime:env")) - seconds) < 1e-5
+    r.set("sat:runtime:env", "100")
+    saturation.task_started(r, "t2", "env", "run_env")
+    saturation.task_finished(r, "t2", "env", "run_env")
+    assert float(r.get("sat:runtime:env")) < 100 * (1 - saturation.RUNTIME_EWMA_ALPHA) + 1
+
+
+def test_backlog_without_consumers_has_no_drain_estimate():
+    assert saturation.drain_time(5, 0, 0, 30.0) is None
+    assert saturation.drain_time(5, 0, 2, None) is None
+
+
+def test_sagemaker_in_flight_pages_and_caches():
+    calls = []
+
+    def list_processing_jobs(**kwargs):
+        calls.append(kwargs)
+        if "NextToken" not in kwargs:
+            return {"ProcessingJobSummaries": [{}] * 100, "NextToken": "p2"}
+        return {"ProcessingJobSummaries": [{}] * 7}
+
+    sm = types.SimpleNamespace(list_processing_jobs=list_processing_jobs)
+    saturation._sm_cache.update(at=None, value=None)
+    assert saturation.sagemaker_in_flight(sm) == 107
+    assert saturation.sagemaker_in_flight(sm) == 107
+    assert len(calls) == 2 and calls[0]["StatusEquals"] == "InProgress"
+
+
+def test_autotuner_grows_only_with_headroom_and_sheds_when_hot():
+    limits = {"cpu": 0.9, "mem": 0.85}
+    cool, warm, hot = {"cpu": 0.3, "mem": 0.4}, {"cpu": 0.85, "mem": 0.4}, {"cpu": 0.5, "mem": 0.9}
+    assert autotune.decide(2, 5, 1, 8, cool, limits) == 3  # one step at a time
+    assert autotune.decide(2, 5, 1, 8, warm, limits) == 2  # inside the margin: hold
+    assert autotune.decide(2, 5, 1, 8, hot, limits) == 1
+    assert autotune.decide(1, 5, 1, 8, hot, limits) == 1  # never below the floor
+    assert autotune.decide(8, 9, 1, 8, cool, limits) == 8
+    assert autotune.decide(4, 0, 1, 8, cool, limits) == 3  # idle: shrink a step at a time
+    assert set(autotune.sample()) <= {"cpu", "mem", "gpu", "gpu_mem"}
+
+
+def test_autoscaler_rate_limits_growth_and_leaves_idle_shrinking_to_keepalive(monkeypatch):
+    calls = []
+
+    class Scaler(autotune.ResourceAutoscaler):
+        processes, qty, min_concurrency, max_concurrency = 2, 6, 1, 8
+
+        def scale_up(self, n):
+            calls.append(("up", n))
+
+        def scale_down(self, n):  # Celery's version is a no-op inside keepalive
+            calls.append(("down", n))
+
+        def _shrink(self, n):
+            calls.append(("shrink", n))
+
+    monkeypatch.setattr(autotune, "sample", lambda: {"cpu": 0.2, "mem": 0.3})
+    scaler = Scaler()
+    scaler._maybe_scale()
+    scaler._maybe_scale()  # inside AUTOTUNE_GROW_INTERVAL_SEC: hold
+    assert calls == [("up", 1)]
+    scaler.qty = 0
+    scaler._maybe_scale()
+    monkeypatch.setattr(autotune, "sample", lambda: {"cpu": 0.2, "mem": 0.95})
+    scaler._maybe_scale()
+    assert calls[1:] == [("down", 1), ("shrink", 1)]
+    assert autotune._cpu() is None or 0.0 <= autotune._cpu() <= 1.0
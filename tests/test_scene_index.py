@@ -0,0 +1,62 @@
+from pathlib import Path
+
+from shared.providers.env_triposr_fast import Env_TripoSR_Fast
+from shared.providers.scene_index import SceneIndex
+
+PLAN = {
+    "environment": {"theme": "misty cyberpunk alley", "time_of_day": "night", "weather": "light_rain"},
+    "objects": [{"type": "neon_sign", "instances": 2, "tags": ["pink"]}],
+    "camera": {"path": "dolly", "duration_s": 4},
+    "audio": {"tempo": 80},
+}
+
+
+class _Img:
+    def save(self, path):
+        Path(path).write_bytes(b"png")
+
+
+def test_identical_plan_reuses_stored_scene(tmp_path):
+    cfg = {"job_root": str(tmp_path / "jobs"), "scene_index_dir": str(tmp_path / "idx"), "load_models": False}
+    provider = Env_TripoSR_Fast(cfg=cfg)
+    first = provider.generate(PLAN)
+    assert first["provenance"]["cache"]["status"] == "miss"
+    provider.runtime_stats = {"s_per_image": 9.9}  # as a previous SDXL job would leave it
+    second = provider.generate(PLAN)
+    assert second["provenance"]["cache"]["status"] == "reuse"
+    assert "runtime" not in second["provenance"]
+    assert second["artifacts"]["scene_glb"] != first["artifacts"]["scene_glb"]
+    for lod in second["artifacts"]["lods"]:
+        assert Path(lod["path"]).read_bytes() == Path(next(
+            e["path"] for e in first["artifacts"]["lods"] if e["file"] == lod["file"])).read_bytes()
+    # A different camera changes the baked timeline: no verbatim reuse
+    orbit = Env_TripoSR_Fast(cfg=cfg).generate({**PLAN, "camera": {"path": "orbit", "duration_s": 4}})
+    assert orbit["provenance"]["cache"]["status"] == "miss"
+
+
+def test_near_duplicate_bands(tmp_path):
+    lod = tmp_path / "scene.glb"
+    lod.write_bytes(b"glTF")
+    index = SceneIndex(root=str(tmp_path / "idx"), reuse_threshold=0.95, seed_threshold=0.6)
+    index.add(PLAN, [{"name": "scene_glb", "file": "scene.glb", "path": str(lod), "lod": 1}], [_Img()], model_id="m")
+    foggy = {**PLAN, "environment": {**PLAN["environment"], "theme": "foggy cyberpunk alley"}}
+    entry, score, mode = index.match(foggy, model_id="m")
+    assert mode == "reuse" and score > 0.95
+    # Same scene, new soundtrack: only the refs can be reused
+    assert index.match({**foggy, "audio": {"tempo": 120}}, model_id="m")[2] == "seed"
+    harbour = {**PLAN, "environment": {"theme": "sunny harbour", "time_of_day": "day", "weather": "clear"}}
+    assert index.match(harbour, model_id="m") is None
+    assert index.match(PLAN, model_id="other") is None
+
+
+def test_scene_evicted_after_lookup_is_regenerated(tmp_path):
+    import shutil
+    cfg = {"job_root": str(tmp_path / "jobs"), "scene_index_dir": str(tmp_path / "idx"), "load_models": False}
+    provider = Env_TripoSR_Fast(cfg=cfg)
+    provider.generate(PLAN)
+    # Another worker removes the stored files while this one still sees the entry
+    entry = provider.scene_index.entries()[0]
+    shutil.rmtree(provider.scene_index._scene_dir(entry["id"]))
+    again = provider.generate(PLAN)
+    assert again["provenance"]["cache"]["status"] == "miss"
+    assert Path(again["artifacts"]["scene_glb"]).exists()
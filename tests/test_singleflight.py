@@ -0,0 +1,59 @@
+import time
+
+from benchmarks._fakes import FakeRedis
+from shared import singleflight
+
+
+def test_prompt_key_ignores_case_and_whitespace():
+    assert singleflight.prompt_key("Neon  alley at night") == singleflight.prompt_key(" neon alley AT night ")
+    assert singleflight.prompt_key("a") != singleflight.prompt_key("a", kind="envgen")
+
+
+def test_plan_key_ignores_key_order():
+    plan = {"environment": {"theme": "alley"}, "camera": {"path": "dolly"}}
+    assert singleflight.plan_key(plan) == singleflight.plan_key(dict(reversed(list(plan.items()))))
+
+
+def test_followers_attach_and_are_released_on_success():
+    r = FakeRedis(decode_responses=True)
+    key = singleflight.prompt_key("rainy alley")
+    assert singleflight.join(r, key, "job-a", follow=True, ttl=60) is None
+    assert singleflight.join(r, key, "job-b", follow=True, ttl=60) == "job-a"
+    assert singleflight.join(r, key, "job-c", follow=True, ttl=60) == "job-a"
+    # Only the leader can settle
+    assert singleflight.settle(r, "job-b", ok=True) == []
+    assert singleflight.settle(r, "job-a", ok=True, done_ttl=60) == ["job-b", "job-c"]
+    # Retried clients still land on the finished job until the done TTL lapses
+    assert singleflight.join(r, key, "job-d", ttl=60) == "job-a"
+
+
+def test_failure_and_expiry_free_the_key():
+    r = FakeRedis(decode_responses=True)
+    key = singleflight.prompt_key("foggy pier")
+    singleflight.join(r, key, "job-a", ttl=60)
+    singleflight.settle(r, "job-a", ok=False)
+    assert singleflight.join(r, key, "job-b", ttl=1) is None
+    time.sleep(1.05)  # leader crashed without settling
+    assert singleflight.join(r, key, "job-c", ttl=60) is None
+
+
+def test_zero_ttl_disables_dedup():
+    r = FakeRedis(decode_responses=True)
+    key = singleflight.prompt_key("x")
+    assert singleflight.join(r, key, "job-a", ttl=0) is None
+    assert singleflight.join(r, key, "job-b", ttl=0) is None
+
+
+def test_detach_is_per_submission_and_idempotent():
+    r = FakeRedis(decode_responses=True)
+    key = singleflight.prompt_key("rainy pier")
+    assert singleflight.join(r, key, "A", ttl=60) is None
+    assert singleflight.join(r, key, "B", ttl=60) == "A"
+    assert singleflight.join(r, key, "C", ttl=60) == "A"
+    assert singleflight.leader_of(r, "B") == "A" and singleflight.leader_of(r, "A") is None
+    # Repeated cancels from one client only ever remove that client
+    assert singleflight.detach(r, "A") == ("A", 2)
+    assert singleflight.detach(r, "A") == ("A", 2)
+    assert singleflight.detach(r, "B") == ("A", 1)
+    assert singleflight.detach(r, "B") == ("A", 1)
+    assert singleflight.detach(r, "C") == ("A", 0)
@@ -0,0 +1,27 @@
+from shared import telemetry
+
+
+def test_spans_accumulate_into_active_recorder():
+    with telemetry.recording() as rec:
+        for _ in range(3):
+            with telemetry.span("env.sdxl_infer"):
+                pass
+        with telemetry.span("env.export"):
+            pass
+    timings = rec.as_dict()
+    assert set(timings["stages_s"]) == {"env.sdxl_infer", "env.export"}
+    assert telemetry.current() is None
+
+
+def test_span_without_recorder_is_noop():
+    with telemetry.span("orphan"):
+        pass
+
+
+def test_record_artifact_size(tmp_path):
+    p = tmp_path / "scene.glb"
+    p.write_bytes(b"x" * 42)
+    with telemetry.recording() as rec:
+        assert telemetry.record_artifact("scene_glb", p) == 42
+        assert telemetry.record_artifact("missing", tmp_path / "nope") == 0
+    assert rec.as_dict()["artifact_bytes"] == {"scene_glb": 42}
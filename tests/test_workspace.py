@@ -0,0 +1,88 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from shared import workspace
+
+
+def _age(path, seconds):
+    t = time.time() - seconds
+    os.utime(path / workspace.MARKER, (t, t))
+
+
+def test_scope_keeps_successful_and_removes_failed_workspaces(tmp_path):
+    with workspace.scope():
+        kept = workspace.allocate("env", str(tmp_path))
+        (kept / "scene.glb").write_bytes(b"x" * 10)
+    assert workspace._read_marker(kept)["state"] == "done"
+    assert workspace._read_marker(kept)["bytes"] >= 10
+
+    with pytest.raises(RuntimeError), workspace.scope():
+        failed = workspace.allocate("env", str(tmp_path))
+        raise RuntimeError("boom")
+    assert not failed.exists()
+
+
+def _owner(path, **meta):
+    workspace._write_marker(path, {**workspace._read_marker(path), **meta})
+
+
+def test_sweep_applies_ttl_and_lease(tmp_path):
+    with workspace.scope():
+        old = workspace.allocate("env", str(tmp_path))
+        fresh = workspace.allocate("env", str(tmp_path))
+    unscoped = workspace.allocate("audio", str(tmp_path))  # nobody renews it: ages out
+    (tmp_path / "scenes").mkdir()  # not a workspace: left alone
+    with workspace.scope():
+        running = workspace.allocate("env", str(tmp_path))  # this process: kept however old
+        crashed = workspace.allocate("env", str(tmp_path))
+        reused = workspace.allocate("env", str(tmp_path))  # same pid, but a different process started it
+        remote = workspace.allocate("env", str(tmp_path))  # another host or boot: only the lease tells
+        gone = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+        _owner(crashed, pid=int(gone.stdout))
+        _owner(reused, started=-1)
+        _owner(remote, boot="elsewhere")
+        for d in (old, unscoped, running, remote):
+            _age(d, 100)
+        stats = workspace.sweep(str(tmp_path), ttl_sec=50, lease_sec=50)
+        assert fresh.exists() and running.exists() and (tmp_path / "scenes").exists()
+        assert not any(d.exists() for d in (old, unscoped, crashed, reused, remote))
+        assert stats["removed"] == 5
+
+
+@pytest.mark.skipif(workspace._boot_id() is None, reason="needs /proc")
+def test_owner_identity_survives_only_the_same_process():
+    meta = {"scoped": True, "pid": os.getpid(), "boot": workspace._boot_id(), "started": workspace._proc_start(os.getpid())}
+    assert workspace._owner_alive(meta) is True
+    assert workspace._owner_alive({**meta, "started": meta["started"] + 1}) is False
+    assert workspace._owner_alive({**meta, "scoped": False}) is None
+
+
+def test_finish_marks_unscoped_workspaces_done(tmp_path):
+    d = workspace.allocate("audio", str(tmp_path))
+    workspace.finish(d)
+    assert workspace._read_marker(d)["state"] == "done"
+    with workspace.scope():
+        owned = workspace.allocate("env", str(tmp_path))
+        workspace.finish(owned)  # the scope decides on exit
+        assert workspace._read_marker(owned)["state"] == "active"
+
+
+def test_quota_evicts_least_recently_used_done_dirs_only(tmp_path):
+    active = workspace.allocate("env", str(tmp_path))
+    (active / "big.bin").write_bytes(b"x" * 600_000)
+    with workspace.scope():
+        a = workspace.allocate("env", str(tmp_path))
+        b = workspace.allocate("env", str(tmp_path))
+    for d in (a, b):
+        (d / "scene.glb").write_bytes(b"x" * 300_000)
+        workspace.done(d)
+    _age(a, 20)
+    _age(b, 30)
+    workspace.touch(b / "scene.glb", str(tmp_path))  # served just now
+    stats = workspace.sweep(str(tmp_path), quota_mb=1)
+    assert stats["removed"] == 1
+    assert active.exists() and b.exists() and not a.exists()
@@ -1,12 +1,15 @@
 
 from celery import Celery
-import json
+from celery.signals import task_postrun, task_prerun, worker_init
 import redis
 from shared.providers.factory import get_provider
+from shared.messaging import celery_conf, put_plan_s3, unpack_plan
+from shared.serialization import dumps
+from shared import cancellation, runtime_model, saturation, singleflight, telemetry, workspace
 
 import os
+import time
 import uuid
-import boto3
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,6 +19,12 @@ REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_BROKER_DB = os.getenv("REDIS_BROKER_DB", "0")
 REDIS_BACKEND_DB = os.getenv("REDIS_BACKEND_DB", "1")
 REDIS_STATUS_DB = int(os.getenv("REDIS_STATUS_DB", "0"))
+# Batch jobs run from their own queue and yield once this many interactive jobs wait on "env"
+ENV_BATCH_QUEUE = os.getenv("ENV_BATCH_QUEUE", "env_batch")
+PREEMPT_QUEUE_DEPTH = int(os.getenv("PREEMPT_QUEUE_DEPTH", "1"))
+PREEMPT_BACKOFF_SEC = int(os.getenv("PREEMPT_BACKOFF_SEC", "30"))
+# Provider the orchestrator dispatches; weights are only worth preloading for SDXL
+ENV_PROVIDER = os.getenv("ENV_PROVIDER", "stub")
 
 broker_url = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_BROKER_DB}"
 backend_url = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_BACKEND_DB}"
@@ -28,31 +37,130 @@ app.conf.update(
     result_backend=backend_url,
     task_default_queue="env",
     broker_connection_retry_on_startup=True,
+    **celery_conf(),
 )
+if os.getenv("WORKER_AUTOTUNE", "0") == "1":
+    # Takes effect with --autoscale=MAX,MIN: grow only while CPU, memory and GPU have headroom
+    app.conf.worker_autoscaler = "shared.autotune:ResourceAutoscaler"
+
+
+@worker_init.connect
+def _start_metrics(**_):
+    port = int(os.getenv("WORKER_METRICS_PORT", "0"))
+    if telemetry.start_metrics_server(port):
+        print(f"Worker metrics on :{port}/metrics")
+
+
+@worker_init.connect
+def _preload_weights(**_):
+    # Runs in the parent before the prefork pool starts, so children share the pages
+    if os.getenv("ENV_PRELOAD_WEIGHTS", "0") != "1":
+        return
+    if ENV_PROVIDER != "sdxl_triposr":
+        print(f"ENV_PRELOAD_WEIGHTS ignored: ENV_PROVIDER={ENV_PROVIDER} has no weights to preload")
+        return
+    from shared.providers import weight_store
+    n = weight_store.preload([{}])
+    print(f"Preloaded {n} pipeline(s) before fork")
+
+
+def _status_client():
+    return redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_STATUS_DB, decode_responses=True)
+
+
+@worker_init.connect
+def _start_heartbeat(sender=None, **_):
+    saturation.start_heartbeat(_status_client, sender)
+
+
+@task_prerun.connect
+def _task_started(task_id=None, task=None, **_):
+    # Signals are process-wide: skip tasks of the orchestrator app when both are loaded
+    if task is not None and task.app is app:
+        saturation.task_started(_status_client(), task_id, saturation.task_queue(task), task.name)
+
+
+@task_postrun.connect
+def _task_finished(task_id=None, task=None, **_):
+    if task is not None and task.app is app:
+        saturation.task_finished(_status_client(), task_id, saturation.task_queue(task), task.name)
 
 
 def set_status(job_id, status, detail=None):
-    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_STATUS_DB, decode_responses=True)
+    r = _status_client()
     payload = {"status": status}
     if detail:
         payload["detail"] = detail
-    r.set(job_id, json.dumps(payload))
+    r.set(job_id, dumps(payload))
+
+
+def _finish(job_id, status, detail, ok):
+    """Write the final status for ``job_id`` and every job attached to it."""
+    if ok and cancellation.requested(_status_client(), job_id):
+        # Cancelled after the last checkpoint: keep the API's "cancelled" rather than reporting success
+        status, detail, ok = "cancelled", {"stage": "env_done", "message": "cancelled after generation"}, False
+    set_status(job_id, status, detail)
+    for follower in singleflight.settle(_status_client(), job_id, ok):
+        set_status(follower, status, {**detail, "attached_to": job_id})
+
+
+def _interactive_backlog():
+    # Kombu keeps each Redis queue as a list named after the queue, in the broker DB
+    broker = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=int(REDIS_BROKER_DB))
+    return broker.llen("env") >= PREEMPT_QUEUE_DEPTH
 
 
 @app.task(queue="env")
-def run_env(job_id, plan_path, provider_name="stub", version="0.1.0"):
+def run_env(job_id, plan, provider_name="stub", version="0.1.0", enqueued_at=None, lane="interactive"):
     from shared.schemas.scene_plan import ScenePlan
-    with open(plan_path) as f:
-        raw = json.load(f)
-    plan = ScenePlan(**raw)
-
-    provider = get_provider("env", provider_name, version)
-    result = provider.generate(plan.dict())
+    r = _status_client()
+    if cancellation.requested(r, job_id):
+        _finish(job_id, "cancelled", {"stage": "env_queued"}, ok=False)
+        return None
+    envelope = plan
+    # Provider checkpoints raise once the job is cancelled (or, for batch work, preempted)
+    watch = cancellation.watching(
+        lambda: cancellation.requested(r, job_id), _interactive_backlog if lane == "batch" else None
+    )
+    try:
+        # Job dirs are kept as servable artifacts on success and removed on any failure
+        with telemetry.recording() as rec, watch, workspace.scope():
+            telemetry.observe_queue_wait("env", enqueued_at)
+            # Inline plans resolve without a round trip; only spilled plans need Redis
+            needs_redis = isinstance(plan, dict) and "plan_ref" in plan
+            with telemetry.span("env.plan_load"):
+                raw = unpack_plan(plan, r if needs_redis else None)
+                plan = ScenePlan(**raw)
+
+            with telemetry.span("env.provider_init"):
+                provider = get_provider("env", provider_name, version)
+            with telemetry.span("env.generate"):
+                result = provider.generate(plan.dict())
+    except cancellation.JobCancelled as e:
+        _finish(job_id, "cancelled", {"stage": "env_gen", "message": str(e)}, ok=False)
+        return None
+    except cancellation.JobPreempted as e:
+        # Still the single-flight leader: followers keep waiting for the re-run
+        run_env.apply_async(
+            args=(job_id, envelope, provider_name, version),
+            kwargs={"enqueued_at": time.time(), "lane": lane},
+            queue=ENV_BATCH_QUEUE,
+            countdown=PREEMPT_BACKOFF_SEC,
+        )
+        set_status(job_id, "preempted", {"message": str(e), "retry_in_s": PREEMPT_BACKOFF_SEC})
+        return None
+    except Exception as e:
+        # Release the single-flight key so the next identical submission retries
+        _finish(job_id, "error", {"stage": "env_gen", "message": str(e)}, ok=False)
+        raise
 
     out_path = result["artifacts"]["scene_glb"]
     prov = result["provenance"]
 
-    set_status(job_id, "env_done", {"scene_glb": out_path, "prov": prov})
+    detail = {"scene_glb": out_path, "prov": prov, "timings": rec.as_dict()}
+    if result["artifacts"].get("lods"):
+        detail["lods"] = result["artifacts"]["lods"]
+    _finish(job_id, "env_done", detail, ok=True)
     return out_path
 
 
@@ -64,7 +172,8 @@ ROLE_ARN = os.getenv("SAGEMAKER_ROLE_ARN", "arn:aws:iam::398341427473:role/SageM
 
 
 @app.task(bind=True, autoretry_for=(Exception,), retry_backoff=True, max_retries=3, queue="env")
-def run_env_cloud(self, prompt: str, job_id: str | None = None) -> dict:
+def run_env_cloud(self, prompt: str, job_id: str | None = None, plan: dict | None = None) -> dict:
+    """Submit ``plan`` as a SageMaker job; without one the container plans from ``prompt`` at the static size."""
     job_id = job_id or f"envgen-{uuid.uuid4().hex[:8]}"
     # Normalize out_bucket to the bucket root (strip any suffix like /jobs or other prefixes)
     out_bucket = S3_BUCKET or ""
@@ -72,23 +181,32 @@ def run_env_cloud(self, prompt: str, job_id: str | None = None) -> dict:
         bucket_part = out_bucket.replace("s3://", "", 1)
         bucket_name = bucket_part.split("/", 1)[0]
         out_bucket = f"s3://{bucket_name}"
-    payload = {"prompt": prompt, "out_bucket": out_bucket, "job_id": job_id}
+    resources = runtime_model.for_submission(plan, runtime_model.SM_ENV_CFG)
+    payload = {
+        "prompt": prompt, "out_bucket": out_bucket, "job_id": job_id, "submitted_at": time.time(),
+        "instance_type": resources["instance_type"], "env_cfg": runtime_model.SM_ENV_CFG,
+    }
+    import boto3
+    if plan is not None:
+        bucket, _, root = out_bucket.replace("s3://", "", 1).partition("/")
+        s3 = boto3.client("s3", region_name=AWS_REGION)
+        payload.update(plan_key=put_plan_s3(s3, bucket, job_id, plan, root), features=resources["features"])
     sm = boto3.client("sagemaker", region_name=AWS_REGION)
     sm.create_processing_job(
         ProcessingJobName=job_id,
         RoleArn=ROLE_ARN,
         AppSpecification={"ImageUri": ECR_IMAGE_URI},
         Environment={
-            "PROMPT_JSON": json.dumps(payload),
+            "PROMPT_JSON": dumps(payload),
             "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", ""),
         },
         ProcessingResources={
             "ClusterConfig": {
                 "InstanceCount": 1,
-                "InstanceType": os.getenv("SM_INSTANCE_TYPE", "ml.m5.xlarge"),
+                "InstanceType": resources["instance_type"],
                 "VolumeSizeInGB": int(os.getenv("SM_VOL_GB", "50")),
             }
         },
-        StoppingCondition={"MaxRuntimeInSeconds": int(os.getenv("SM_MAX_SEC", "1800"))},
+        StoppingCondition={"MaxRuntimeInSeconds": resources["max_runtime_s"]},
     )
-    return {"job_id": job_id, "status": "submitted"}
+    return {"job_id": job_id, "status": "submitted", "resources": resources}
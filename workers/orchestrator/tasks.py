@@ -1,11 +1,14 @@
 from celery import Celery
+from celery.signals import task_postrun, task_prerun, worker_init
 import time
 import os
-import json
 import asyncio
 import redis
 from dotenv import load_dotenv
 from shared.schemas.scene_plan import ScenePlan
+from shared.messaging import celery_conf, pack_plan
+from shared.serialization import dumps, loads
+from shared import cancellation, saturation, singleflight, telemetry
 # Planner service not implemented yet - using fallback
 PlannerOrchestrator = None
 PlannerProviderError = Exception
@@ -19,24 +22,72 @@ REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_BROKER_DB = os.getenv("REDIS_BROKER_DB", "0")
 REDIS_BACKEND_DB = os.getenv("REDIS_BACKEND_DB", "1")
 REDIS_STATUS_DB = int(os.getenv("REDIS_STATUS_DB", "0"))
+# Provider run_env uses; "sdxl_triposr" needs the GPU image, "stub" runs anywhere
+ENV_PROVIDER = os.getenv("ENV_PROVIDER", "stub")
 
 broker_url = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_BROKER_DB}"
 backend_url = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_BACKEND_DB}"
 
 app = Celery("orchestrator", broker=broker_url, backend=backend_url)
 app.conf.task_default_queue = "orchestrator"
+app.conf.update(**celery_conf())
+if os.getenv("WORKER_AUTOTUNE", "0") == "1":
+    # Takes effect with --autoscale=MAX,MIN
+    app.conf.worker_autoscaler = "shared.autotune:ResourceAutoscaler"
+
+
+@worker_init.connect
+def _start_metrics(**_):
+    port = int(os.getenv("WORKER_METRICS_PORT", "0"))
+    if telemetry.start_metrics_server(port):
+        print(f"Worker metrics on :{port}/metrics")
+
+
+def _status_client() -> redis.Redis:
+    return redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_STATUS_DB, decode_responses=True)
+
+
+@worker_init.connect
+def _start_heartbeat(sender=None, **_):
+    saturation.start_heartbeat(_status_client, sender)
+
+
+@task_prerun.connect
+def _task_started(task_id=None, task=None, **_):
+    # Signals are process-wide: run_pipeline imports the env_gen app, which has its own hooks
+    if task is not None and task.app is app:
+        saturation.task_started(_status_client(), task_id, saturation.task_queue(task), task.name)
+
+
+@task_postrun.connect
+def _task_finished(task_id=None, task=None, **_):
+    if task is not None and task.app is app:
+        saturation.task_finished(_status_client(), task_id, saturation.task_queue(task), task.name)
 
 
 def _set_status(r: redis.Redis, job_id: str, status: str, detail: dict | None = None) -> None:
     payload = {"status": status}
     if detail:
         payload["detail"] = detail
-    r.set(job_id, json.dumps(payload))
+    r.set(job_id, dumps(payload))
+
+
+def _attach(r: redis.Redis, job_id: str, leader: str) -> None:
+    # A leader that already finished is copied now; otherwise run_env fans its result out
+    raw = r.get(leader)
+    state = loads(raw) if raw else {}
+    if state.get("status") in ("env_done", "error"):
+        _set_status(r, job_id, state["status"], detail={**(state.get("detail") or {}), "attached_to": leader})
+    else:
+        _set_status(r, job_id, "env_attached", detail={"attached_to": leader})
 
 
 @app.task(queue="orchestrator")
-def run_pipeline(job_id: str, prompt: str) -> None:
-    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_STATUS_DB, decode_responses=True)
+def run_pipeline(job_id: str, prompt: str, lane: str = "interactive") -> None:
+    """``lane="batch"`` queues env work behind interactive jobs and lets it be preempted."""
+    r = _status_client()
+    if cancellation.requested(r, job_id):
+        return  # cancelled while queued; the API already recorded it
     _set_status(r, job_id, "planning")
     # Fallback to naive plan if no providers configured or provider failure
     def _naive_plan_from_prompt(text: str) -> dict:
@@ -60,26 +111,36 @@ def run_pipeline(job_id: str, prompt: str) -> None:
         return base
 
     try:
-        plan = ScenePlan(**_naive_plan_from_prompt(prompt))
+        with telemetry.span("orchestrator.planning"):
+            plan = ScenePlan(**_naive_plan_from_prompt(prompt))
     except Exception as e:
         _set_status(r, job_id, "error", detail={"stage": "planning", "message": str(e)})
         return
-    base_tmp_dir = os.getenv("JOB_TMP_DIR", "/app/tmp")
-    try:
-        os.makedirs(base_tmp_dir, exist_ok=True)
-    except Exception:
-        pass
-    plan_path = f"{base_tmp_dir}/{job_id}_plan.json"
-    with open(plan_path, "w") as f:
-        f.write(plan.json())
-    _set_status(r, job_id, "planned", detail={"plan_path": plan_path})
-    _set_status(r, job_id, "env_gen", detail={"plan_path": plan_path})
+    if cancellation.requested(r, job_id):
+        _set_status(r, job_id, "cancelled", detail={"stage": "planning"})
+        return
+    # Identical plans in flight share one env generation
+    leader = singleflight.join(r, singleflight.plan_key(plan.dict(), "env"), job_id, follow=True)
+    if leader is not None:
+        _attach(r, job_id, leader)
+        return
+    envelope = pack_plan(plan.dict(), r)
+    plan_detail = {"plan_ref": envelope["plan_ref"]} if "plan_ref" in envelope else {"plan": "inline"}
+    _set_status(r, job_id, "planned", detail=plan_detail)
+    _set_status(r, job_id, "env_gen", detail=plan_detail)
     try:
         # Lazy import to avoid circular dependencies
-        from workers.env_gen.tasks import run_env
-        async_result = run_env.delay(job_id, plan_path, "stub", "0.1.0")
+        from workers.env_gen.tasks import ENV_BATCH_QUEUE, run_env
+        async_result = run_env.apply_async(
+            args=(job_id, envelope, ENV_PROVIDER, "0.1.0"),
+            kwargs={"enqueued_at": time.time(), "lane": lane},
+            queue=ENV_BATCH_QUEUE if lane == "batch" else "env",
+        )
         # Do not block within task; env worker will update status to env_done
         _set_status(r, job_id, "env_queued", detail={"task_id": async_result.id})
     except Exception as e:
-        _set_status(r, job_id, "error", detail={"stage": "env_gen", "message": str(e)})
+        detail = {"stage": "env_gen", "message": str(e)}
+        _set_status(r, job_id, "error", detail=detail)
+        for follower in singleflight.settle(r, job_id, ok=False):
+            _set_status(r, follower, "error", detail={**detail, "attached_to": job_id})
         return